@@ -5,13 +5,23 @@ Licensed under the BSD 3-clause License. See LICENSE.txt or
 <http://opensource.org/licenses/BSD-3-Clause>.
 """
 import argparse
+import asyncio
+import cProfile
 import csv
+import json
 import logging
 import os
 import itertools
+import sys
+from lib import bench
 from lib.deck import Deck
+from lib.deck_cache import deck_cache
 from lib.flashcard import Flashcard
+from lib.library import DeckEntry, Library
+from lib.loadgen import run_load
+from lib.metrics import metrics
 from lib.quiz import QuizTypes, Quiz
+from lib.server import QuizServer
 
 _logger = logging.getLogger(__name__)
 
@@ -36,12 +46,52 @@ def natural_number(string):
     return val
 
 
-def parse_command_line():
+def parse_command_line(argv=None):
     """
     Parse arguments from the command line.
 
+    :param argv: arguments to parse, instead of sys.argv[1:].
     :return args:
     """
+    def setup_bench_parser():
+        bp = subparsers.add_parser(
+            'bench',
+            help='Benchmark on synthetic decks, and print the results as JSON.'
+        )
+        bp.add_argument(
+            '-n', '--cards',
+            dest='sizes',
+            type=natural_number,
+            nargs='+',
+            default=[10 ** 3, 10 ** 4, 10 ** 5],
+            help='Number of cards of each synthetic deck.'
+        )
+        bp.add_argument(
+            '-r', '--repeat',
+            type=natural_number,
+            default=3,
+            help='Timed runs of each benchmark.'
+        )
+        bp.add_argument('--seed', type=int, default=0)
+        bp.add_argument(
+            '--stats',
+            dest='distribution',
+            choices=sorted(bench.Distributions.all()),
+            default=bench.Distributions.uniform,
+            help='Distribution of the synthetic card statistics.'
+        )
+        bp.add_argument(
+            '-o', '--output',
+            type=str,
+            help='File to write the results to.'
+        )
+        bp.add_argument(
+            '-c', '--compare',
+            type=str,
+            help='Results of an earlier run to compare with.'
+        )
+        bp.set_defaults(func=run_bench)
+
     def setup_create_parser():
         cp = subparsers.add_parser('create', help='Create a new deck.')
         cp.add_argument(
@@ -68,6 +118,166 @@ def parse_command_line():
         )
         cp.set_defaults(func=swap)
 
+    def setup_convert_parser():
+        cp = subparsers.add_parser(
+            'convert',
+            help='Copy a deck to another format (.deck.csv or .deck.db).'
+        )
+        cp.add_argument(
+            'deck',
+            type=str,
+            help='Filename of source flashcard deck.'
+        )
+        cp.add_argument(
+            'dest',
+            type=str,
+            help='Filename of destination flashcard deck.'
+        )
+        cp.set_defaults(func=convert)
+
+    def setup_compact_parser():
+        cp = subparsers.add_parser(
+            'compact',
+            help='Fold answers journaled by quizzes into the deck file.'
+        )
+        cp.add_argument(
+            'deck',
+            type=str,
+            help='Filename of flashcard deck.'
+        )
+        cp.set_defaults(func=compact)
+
+    def setup_import_parser():
+        ip = subparsers.add_parser(
+            'import',
+            help='Validate decks and copy them into a decks directory.'
+        )
+        ip.add_argument(
+            'source',
+            type=str,
+            help='Directory of decks to import.'
+        )
+        ip.add_argument(
+            '-d', '--dir',
+            dest='directory',
+            type=str,
+            default='.',
+            help='Decks directory.'
+        )
+        ip.add_argument(
+            '-j', '--jobs',
+            type=natural_number,
+            help='Number of worker processes (default: one per CPU).'
+        )
+        ip.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Replace decks that are already in the decks directory.'
+        )
+        ip.set_defaults(func=import_decks)
+
+    def setup_list_parser():
+        lp = subparsers.add_parser(
+            'list',
+            help='List the decks in a directory.'
+        )
+        lp.add_argument(
+            'name',
+            type=str,
+            nargs='?',
+            help='List only decks whose names contain this.'
+        )
+        lp.add_argument(
+            '-d', '--dir',
+            dest='directory',
+            type=str,
+            default='.',
+            help='Decks directory.'
+        )
+        lp.set_defaults(func=list_decks)
+
+    def setup_serve_parser():
+        sp = subparsers.add_parser(
+            'serve',
+            help='Serve quizzes over HTTP/JSON.'
+        )
+        sp.add_argument(
+            '-d', '--dir',
+            dest='directory',
+            type=str,
+            default='.',
+            help='Decks directory.'
+        )
+        sp.add_argument('--host', type=str, default='127.0.0.1')
+        sp.add_argument('--port', type=natural_number, default=8080)
+        sp.set_defaults(func=serve)
+
+    def setup_loadgen_parser():
+        lp = subparsers.add_parser(
+            'loadgen',
+            help='Measure a quiz server with many concurrent sessions.'
+        )
+        lp.add_argument(
+            'deck_file',
+            type=str,
+            help='Deck file in the server\'s decks directory.'
+        )
+        lp.add_argument('--host', type=str, default='127.0.0.1')
+        lp.add_argument('--port', type=natural_number, default=8080)
+        lp.add_argument(
+            '-s', '--sessions',
+            type=natural_number,
+            default=1000,
+            help='Number of concurrent sessions.'
+        )
+        lp.add_argument(
+            '-t', '--time',
+            dest='duration',
+            type=float,
+            default=10.0,
+            help='Seconds to run for.'
+        )
+        lp.add_argument(
+            '-n', '--number',
+            dest='cards',
+            type=natural_number,
+            default=20,
+            help='Questions per session.'
+        )
+        lp.add_argument(
+            '-m', '--multiple', '--multiple-choice',
+            dest='game_type',
+            action='store_const',
+            const=QuizTypes.multiple_choice,
+            default=QuizTypes.fill_in_the_blank
+        )
+        lp.set_defaults(func=loadgen)
+
+    def setup_stats_parser():
+        sp = subparsers.add_parser(
+            'stats',
+            help='Show how many cards of each difficulty a deck has.'
+        )
+        sp.add_argument(
+            'deck',
+            type=str,
+            nargs='?',
+            help='Filename of flashcard deck.'
+        )
+        sp.add_argument(
+            '--all',
+            action='store_true',
+            help='Show every deck in the decks directory.'
+        )
+        sp.add_argument(
+            '-d', '--dir',
+            dest='directory',
+            type=str,
+            default='.',
+            help='Decks directory.'
+        )
+        sp.set_defaults(func=stats)
+
     def setup_quiz_parser():
         qp = subparsers.add_parser('quiz', help='Run a quiz.')
         qp.add_argument(
@@ -111,6 +321,26 @@ def parse_command_line():
             help='Number of multiple choice answers to offer.'
         )
 
+        qp.add_argument(
+            '--near-miss',
+            action='store_true',
+            help='Offer multiple choice answers close to the correct answer.'
+        )
+
+        qp.add_argument(
+            '--typos',
+            type=natural_number,
+            default=0,
+            help='Accept fill in the blank answers with up to this many typos '
+                 '(one per 4 characters of the answer).'
+        )
+
+        qp.add_argument(
+            '--spaced',
+            action='store_true',
+            help='Quiz the cards that are due for spaced repetition.'
+        )
+
         qp.add_argument(
             '--hard',
             type=natural_number,
@@ -153,19 +383,43 @@ def parse_command_line():
         default=0,
         help='Verbosity of logging.'
     )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Time the hot paths, and write the breakdown as JSON at exit.'
+    )
+    parser.add_argument(
+        '--profile-output',
+        default='-',
+        metavar='FILE',
+        help='File to write the --profile breakdown to (default stderr).'
+    )
+    parser.add_argument(
+        '--cprofile',
+        metavar='FILE',
+        help='Profile with cProfile, and write the stats to FILE at exit.'
+    )
     subparsers = parser.add_subparsers()
 
+    setup_bench_parser()
     setup_create_parser()
+    setup_compact_parser()
+    setup_convert_parser()
+    setup_import_parser()
+    setup_list_parser()
+    setup_loadgen_parser()
     setup_quiz_parser()
+    setup_serve_parser()
+    setup_stats_parser()
     setup_swap_parser()
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if not hasattr(args, 'func'):
         parser.print_help()
         exit()
 
-    if hasattr(args, 'deck'):
+    if getattr(args, 'deck', None):
         args.deck = os.path.abspath(os.path.expanduser(args.deck))
 
     if hasattr(args, 'dest'):
@@ -186,13 +440,55 @@ def setup_logging(logfile, level):
     logging.basicConfig(filename=logfile, level=log_level)
 
 
+def run_bench(args):
+    """Benchmark on synthetic decks.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+    """
+    results = bench.run(
+        args.sizes,
+        max(1, args.repeat),
+        args.seed,
+        args.distribution
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        print(
+            '{:>9} {:>11} {:>11} {:>7}  {}'.format(
+                'Cards', 'Before (s)', 'After (s)', 'Ratio', 'Benchmark'
+            )
+        )
+        for name, cards, before, after, ratio in bench.compare(
+            baseline,
+            results
+        ):
+            print(
+                '{:9d} {:11.6f} {:11.6f} {:>7}  {}'.format(
+                    cards,
+                    before,
+                    after,
+                    '-' if ratio is None else '{:.2f}'.format(ratio),
+                    name
+                )
+            )
+
+
 def create(args):
     """Create a new flashcard deck.
 
     Args:
         args (argparse.Namespace): command line arguments.
     """
-    _logger.info('Creating deck {}.'.format(args.deck))
+    _logger.info('Creating deck %s.', args.deck)
 
     if os.path.exists(args.deck):
         raise ValueError('{} already exists.'.format(args.deck))
@@ -225,12 +521,169 @@ def swap(args):
             args.dest
         )
     )
-    src = Deck.load(args.deck)
-    dest = Deck(src.name)
-    for c in src:
-        dest.add_card(Flashcard(c.answer, c.question))
+    deck = deck_cache.load(args.deck)
+    Deck.write_file(
+        args.dest,
+        deck.name,
+        (Flashcard(c.answer, c.question) for c in deck)
+    )
 
-    dest.save(args.dest)
+
+def convert(args):
+    """Copy a flashcard deck, converting between csv and SQLite deck files.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+    """
+    print('Converting {} to {}.'.format(args.deck, args.dest))
+    Deck.write_file(
+        args.dest,
+        Deck.read_name(args.deck),
+        Deck.iter_file(args.deck)
+    )
+
+
+def compact(args):
+    """Fold a flashcard deck's journal into the deck file.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+    """
+    _logger.info('Compacting deck %s.', args.deck)
+    Deck.compact(args.deck)
+
+
+def import_decks(args):
+    """Import a directory of decks into the library.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+    """
+    library = Library(args.directory)
+    try:
+        result = library.import_decks(
+            args.source,
+            args.jobs or None,
+            args.overwrite
+        )
+    finally:
+        library.close()
+
+    print(
+        'Imported {imported} of {total} decks.'.format(
+            imported=result.imported,
+            total=result.imported + len(result.errors)
+        )
+    )
+
+
+def list_decks(args):
+    """List the decks in a directory, from the library index.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+    """
+    library = Library(args.directory)
+    try:
+        library.refresh()
+        for entry in library.decks(args.name):
+            print(
+                '{name}: {path}'.format(
+                    name=entry.name,
+                    path=os.path.relpath(entry.path)
+                )
+            )
+
+    finally:
+        library.close()
+
+
+def stats(args):
+    """Show the difficulty of a deck's cards, or of every deck's cards.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+    """
+    if args.all:
+        library = Library(args.directory)
+        try:
+            library.refresh()
+            entries = library.decks()
+        finally:
+            library.close()
+
+    elif args.deck:
+        deck = deck_cache.load(args.deck)
+        entries = [
+            DeckEntry(
+                deck.name,
+                args.deck,
+                None,
+                len(deck),
+                *Quiz.tier_counts(*deck.stats())
+            )
+        ]
+
+    else:
+        raise ValueError('Name a deck, or use --all.')
+
+    print(
+        '{:>7} {:>7} {:>7} {:>7}  {}'.format(
+            'Cards', 'Hard', 'Medium', 'Easy', 'Deck'
+        )
+    )
+    for e in entries:
+        print(
+            '{:7d} {:7d} {:7d} {:7d}  {}'.format(
+                e.cards, e.hard, e.medium, e.easy, e.name
+            )
+        )
+
+
+def serve(args):
+    """Serve quizzes over HTTP/JSON until interrupted.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+    """
+    async def run():
+        quiz_server = QuizServer(args.directory)
+        server = await quiz_server.start(args.host, args.port)
+        print('Serving {} on http://{}:{}/'.format(
+            quiz_server.directory,
+            args.host,
+            args.port
+        ))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await quiz_server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+def loadgen(args):
+    """Measure a quiz server, and print the results as JSON.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+    """
+    results = asyncio.run(
+        run_load(
+            args.host,
+            args.port,
+            args.deck_file,
+            args.sessions,
+            args.duration,
+            args.cards,
+            args.game_type
+        )
+    )
+    print(json.dumps(results, indent=2))
 
 
 def quiz(args):
@@ -266,55 +719,101 @@ def quiz(args):
         ans = ord(ans) - ord('a')
         return ans
 
-    _logger.info('Quizzing with deck {}'.format(args.deck))
+    _logger.info('Quizzing with deck %s', args.deck)
 
-    playing = True
-    while playing:
-        # Build quiz.
-        the_quiz = Quiz(args.deck, args.hard, args.med, args.easy)
-        quiz_name = the_quiz.name()
+    # The session keeps the deck in memory between rounds.
+    the_quiz = Quiz(
+        args.deck,
+        args.hard,
+        args.med,
+        args.easy,
+        spaced=args.spaced,
+        typos=args.typos
+    )
+    quiz_name = the_quiz.name()
 
-        # Play quiz.
-        print(quiz_name)
-        print('=' * len(quiz_name))
+    try:
+        playing = True
+        while playing:
+            # Play quiz.
+            print(quiz_name)
+            print('=' * len(quiz_name))
+
+            for idx, q in enumerate(
+                the_quiz.run(
+                    args.cards,
+                    args.game_type,
+                    args.selections,
+                    args.near_miss
+                ),
+                1
+            ):
+                answer = (
+                    fill_in_the_blank_question()
+                    if args.game_type == QuizTypes.fill_in_the_blank else
+                    multiple_choice_question()
+                )
+                result, correct_answer = q.submit(answer)
+                print(
+                    '{affirmation}. The answer is {answer}'.format(
+                        affirmation='Correct' if result else 'Incorrect',
+                        answer=(
+                            correct_answer
+                            if args.game_type == QuizTypes.fill_in_the_blank
+                            else q.answers[correct_answer]
+                        )
+                    )
+                )
 
-        for idx, q in enumerate(
-            the_quiz.run(args.cards, args.game_type, args.selections),
-            1
-        ):
-            answer = (
-                fill_in_the_blank_question()
-                if args.game_type == QuizTypes.fill_in_the_blank else
-                multiple_choice_question()
-            )
-            result, correct_answer = q.submit(answer)
+            # End of quiz.
+            correct, attempts = the_quiz.score()
             print(
-                '{affirmation}. The answer is {answer}'.format(
-                    affirmation='Correct' if result else 'Incorrect',
-                    answer=(
-                        correct_answer
-                        if args.game_type == QuizTypes.fill_in_the_blank else
-                        q.answers[correct_answer]
-                    )
+                'You got {correct} out of {total} correct.'.format(
+                    correct=correct,
+                    total=attempts
                 )
             )
+            playing = input('Play again (y/n)? ').lower().startswith('y')
 
-        # End of quiz.
-        correct, attempts = the_quiz.score()
-        print(
-            'You got {correct} out of {total} correct.'.format(
-                correct=correct,
-                total=attempts
-            )
-        )
-        playing = input('Play again (y/n)? ').lower().startswith('y')
+    finally:
+        the_quiz.close()
+
+
+def write_profile(args, profiler):
+    """Write the metrics and cProfile stats of the run.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+        profiler (cProfile.Profile): the run's profiler, if any.
+    """
+    if args.profile and args.profile_output == '-':
+        json.dump(metrics.report(), sys.stderr, indent=2)
+        print(file=sys.stderr)
+    elif args.profile:
+        with open(args.profile_output, 'w') as f:
+            json.dump(metrics.report(), f, indent=2)
+
+    if profiler is not None:
+        profiler.dump_stats(args.cprofile)
 
 
 def main():
     args = parse_command_line()
     setup_logging(args.log, args.verbosity)
     _logger.info(args)
-    args.func(args)
+    if not (args.profile or args.cprofile):
+        args.func(args)
+        return
+
+    metrics.enable(args.profile)
+    profiler = cProfile.Profile() if args.cprofile else None
+    try:
+        if profiler is None:
+            args.func(args)
+        else:
+            profiler.runcall(args.func, args)
+    finally:
+        write_profile(args, profiler)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,283 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import itertools
+import logging
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from lib.data_types import Const
+from lib.deck import Deck
+from lib.flashcard import Flashcard
+from lib.quiz import Quiz, QuizTypes
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_logger = logging.getLogger(__name__)
+
+
+class Distributions(Const):
+    """Card statistics distributions of synthetic decks."""
+    new = 'new'  # Never shown.
+    uniform = 'uniform'  # Attempts and correct answers uniformly at random.
+    learned = 'learned'  # Mostly easy, with a long tail of hard cards.
+
+
+def synthetic_cards(
+    n_cards,
+    seed=0,
+    distribution=Distributions.uniform,
+    max_attempts=20
+):
+    """Generate the cards of a synthetic deck.
+
+    The same arguments always generate the same cards. Answers repeat, so
+    multiple choice questions have distractors to choose from.
+
+    Args:
+        n_cards (int): Number of cards.
+        seed (int): Random seed.
+        distribution (Distributions): Distribution of the card statistics.
+        max_attempts (int): Most attempts of any card.
+
+    Yields:
+        card (Flashcard): each card.
+    """
+    rng = random.Random(seed)
+    n_answers = max(10, n_cards // 10)
+    start = 1420070400 * 10 ** 6  # 2015-01-01, in microseconds.
+    for idx in range(n_cards):
+        card = Flashcard(
+            'question {}'.format(idx),
+            'answer {}'.format(rng.randrange(n_answers))
+        )
+        if distribution == Distributions.uniform:
+            card.n_attempts = rng.randint(0, max_attempts)
+            card.n_correct = rng.randint(0, card.n_attempts)
+        elif distribution == Distributions.learned:
+            card.n_attempts = min(
+                max_attempts,
+                int(rng.expovariate(4 / max_attempts))
+            )
+            card.n_correct = round(card.n_attempts * rng.betavariate(8, 2))
+
+        if card.n_attempts:
+            card.timestamp = start + rng.randrange(365 * 86400 * 10 ** 6)
+
+        yield card
+
+
+def write_deck(
+    filename,
+    n_cards,
+    seed=0,
+    distribution=Distributions.uniform,
+    max_attempts=20
+):
+    """Write a synthetic deck file, streaming its cards.
+
+    See synthetic_cards().
+
+    Args:
+        filename (str): Path to deck file.
+    """
+    Deck.write_file(
+        filename,
+        'synthetic {} {} {}'.format(n_cards, distribution, seed),
+        synthetic_cards(n_cards, seed, distribution, max_attempts),
+        overwrite=True
+    )
+
+
+def time_call(func, repeat=3):
+    """Time a function.
+
+    Args:
+        func (callable): Function to time, called without arguments.
+        repeat (int): Number of calls.
+
+    Returns:
+        (list): Seconds taken by each call.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def _benchmarks(filename, scratch_filename):
+    """Benchmarks of a deck file.
+
+    Returns:
+        (list): (name, setup, func) of each benchmark. setup() is called once,
+            untimed, before func() is timed.
+    """
+    state = {}
+
+    def load():
+        state['deck'] = Deck.load(filename)
+
+    def quiz():
+        load()
+        state['quiz'] = Quiz(filename, loaded=state['deck'])
+
+    def save():
+        # Saving a deck over the file it was last saved to is skipped if the
+        # deck has not changed, so alternate files to write it every time.
+        state['alternate'] = not state.get('alternate')
+        state['deck'].save(
+            scratch_filename + ('.alt' if state['alternate'] else ''),
+            overwrite=True,
+            cache=False
+        )
+
+    def run_multiple_choice():
+        q = state['quiz']
+        list(q.run(20, QuizTypes.multiple_choice, 4))
+        q.close()
+
+    return [
+        (
+            'Deck.load (parse)',
+            lambda: None,
+            lambda: Deck.load(filename, cache=False)
+        ),
+        ('Deck.load (cached)', load, lambda: Deck.load(filename)),
+        ('Deck.save', load, save),
+        (
+            'Deck.__eq__',
+            lambda: state.update(
+                deck=Deck.load(filename),
+                other=Deck.load(filename)
+            ),
+            lambda: state['deck'] == state['other']
+        ),
+        (
+            'Quiz._sort_deck',
+            quiz,
+            lambda: state['quiz']._sort_deck(state['deck'])
+        ),
+        (
+            'Quiz._deck_runner (20 cards)',
+            quiz,
+            lambda: list(state['quiz']._deck_runner(20))
+        ),
+        (
+            'Quiz._card_generator (1000 cards)',
+            quiz,
+            lambda: list(
+                itertools.islice(state['quiz']._card_generator(), 1000)
+            )
+        ),
+        ('Quiz.run (20 multiple choice)', quiz, run_multiple_choice),
+    ]
+
+
+def run(
+    sizes=(10 ** 3, 10 ** 4, 10 ** 5),
+    repeat=3,
+    seed=0,
+    distribution=Distributions.uniform,
+    directory=None
+):
+    """Run the benchmarks on synthetic decks of each size.
+
+    Args:
+        sizes (sequence): Number of cards of each deck.
+        repeat (int): Timed calls of each benchmark.
+        seed (int): Random seed of the decks.
+        distribution (Distributions): Distribution of the card statistics.
+        directory (str): Directory to write decks to. Defaults to a temporary
+            directory.
+
+    Returns:
+        (dict): JSON-serializable results: the environment, and for each
+            benchmark and deck size, the best and median seconds taken.
+    """
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': numpy is not None,
+        'seed': seed,
+        'distribution': distribution,
+        'repeat': repeat,
+        'results': [],
+    }
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for n_cards in sizes:
+            filename = os.path.join(tmp, 'bench.deck.csv')
+            scratch_filename = os.path.join(tmp, 'scratch.deck.csv')
+            start = time.perf_counter()
+            write_deck(filename, n_cards, seed, distribution)
+            _logger.info(
+                'Generated %d cards in %.3fs.',
+                n_cards,
+                time.perf_counter() - start
+            )
+
+            for name, setup, func in _benchmarks(filename, scratch_filename):
+                setup()
+                times = time_call(func, repeat)
+                _logger.info(
+                    '%s on %d cards: %.6fs.',
+                    name,
+                    n_cards,
+                    min(times)
+                )
+                results['results'].append(
+                    {
+                        'benchmark': name,
+                        'cards': n_cards,
+                        'best': min(times),
+                        'median': statistics.median(times),
+                    }
+                )
+
+            for f in os.listdir(tmp):
+                os.remove(os.path.join(tmp, f))
+
+    return results
+
+
+def compare(baseline, results):
+    """Compare benchmark results with a baseline run.
+
+    Args:
+        baseline (dict): Results of run().
+        results (dict): Results of run().
+
+    Returns:
+        (list): (benchmark, cards, baseline best, best, ratio) of each
+            benchmark in both runs. A ratio above 1 is a slowdown.
+    """
+    before = {
+        (r['benchmark'], r['cards']): r['best']
+        for r in baseline['results']
+    }
+    rows = []
+    for r in results['results']:
+        key = r['benchmark'], r['cards']
+        if key in before:
+            rows.append(
+                (
+                    *key,
+                    before[key],
+                    r['best'],
+                    r['best'] / before[key] if before[key] else None
+                )
+            )
+
+    return rows
@@ -5,10 +5,26 @@ Licensed under the BSD 3-clause License. See LICENSE.txt or
 <http://opensource.org/licenses/BSD-3-Clause>.
 """
 from collections import namedtuple
+import array
 import csv
+import io
+import itertools
+import locale
+import logging
+import marshal
+import mmap
 import os
+import shutil
+import sys
+import tempfile
 from lib.data_types import Const
+from lib.filelock import FileLock
 from lib.flashcard import Flashcard
+from lib.journal import Journal
+from lib.metrics import metrics
+from lib.store import DeckStore, SqliteStore
+
+_logger = logging.getLogger(__name__)
 
 
 CardData = namedtuple(
@@ -17,19 +33,142 @@ CardData = namedtuple(
 )
 
 
+# Rows copied verbatim from a deck file: their bytes (a bytes-like object), and
+# the offsets of each row (and of the end of the last row) in the file.
+_Run = namedtuple('_Run', ['data', 'offsets'])
+
+
+class _OffsetWriter:
+    """Binary file for csv.writer, optionally recording the byte offset of
+    each row."""
+    def __init__(self, f, encoding, record=True):
+        self._f = f
+        self._encoding = encoding
+        self.offset = 0
+        self.offsets = array.array('q') if record else None
+
+    def write(self, s):
+        # csv.writer writes each row with one call.
+        b = s.encode(self._encoding)
+        if self.offsets is not None:
+            self.offsets.append(self.offset)
+        self.offset += len(b)
+        return self._f.write(b)
+
+    def copy(self, run):
+        """Copy a _Run of rows."""
+        if self.offsets is not None:
+            shift = self.offset - run.offsets[0]
+            self.offsets.extend(o + shift for o in run.offsets[:-1])
+        data = run.data
+        self._f.write(data)
+        self.offset += len(data)
+        if data and data[-1:] != b'\n':
+            # The last row of a file need not end its line.
+            self._f.write(b'\r\n')
+            self.offset += 2
+
+
+class _MappedRows:
+    """Rows of a memory-mapped csv deck file, parsed by index on demand."""
+    def __init__(self, mapped, offsets):
+        """
+        Args:
+            mapped (mmap): The deck file.
+            offsets (array): Byte offset of each card's row, and of the end of
+                the last row.
+        """
+        self.map = mapped
+        self.offsets = offsets
+
+    def row(self, idx):
+        """Question and answer of a card."""
+        row = self.map[self.offsets[idx]:self.offsets[idx + 1]]
+        # Not splitlines(), which also splits on characters (e.g. U+2028)
+        # that csv.writer does not quote.
+        row = next(
+            csv.reader(
+                io.StringIO(
+                    row.decode(locale.getpreferredencoding(False)),
+                    newline=''
+                )
+            ),
+            []
+        )
+        row += [''] * (2 - len(row))
+        return row[0], row[1]
+
+    def nbytes(self):
+        """Approximate memory used by the rows, in bytes. The map is paged in
+        and out by the operating system, so it is not counted."""
+        return sys.getsizeof(self.offsets)
+
+
+def _umask():
+    """Current file mode creation mask."""
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
 class Deck:
-    """Collection of Flashcards."""
+    """Collection of Flashcards.
+
+    Loaded decks are lazy. The deck holds the raw question, answer, and last
+    shown cells of each card, plus arrays of the parsed attempt and correct
+    counts. A Flashcard is only built when the card is dealt with card(), or
+    the deck is iterated.
+
+    Decks loaded from the sidecar cache do not even hold the raw cells. The
+    deck file is memory-mapped, and the cache holds the byte offset of each
+    card's row along with the card statistics, so only the rows of the cards
+    that are used are ever parsed. Decks loaded from SQLite deck files read
+    their rows on demand the same way.
+
+    Deck files are read and written through the DeckStore for their format
+    (see store()): csv (see CsvStore), or SQLite (see SqliteStore) if their
+    names end in SqliteStore.extension.
+    """
     class ReservedWords(Const):
         """Reserved words in deck file."""
         name = 'Name:'
         quiz = 'Quiz:'
 
+    # Binary sidecar cache of a parsed deck file.
+    cache_extension = '.cache'
+    cache_version = 3
+
+    _never = -1  # Cached last shown time of cards never shown.
+
     def __init__(self, name):
         self.name = name
+
+        # Each entry is a Flashcard, or a raw (question, answer, last_shown)
+        # tuple that has not been built into a Flashcard yet, or None if the
+        # card's row has not been read from the mapped deck file yet.
         self._cards = []
+        self._attempts = array.array('q')
+        self._correct = array.array('q')
+        self._live = []  # Indices of entries that are Flashcards.
+
+        # Keys of the cards in the deck file, if they are not the cards'
+        # indices, and whether only some of the file's cards were loaded.
+        self._keys = None
+        self._partial = False
+
+        # Rows of the deck file that are read on demand (a _MappedRows, or the
+        # rows of an SQLite deck file), and the last shown time of each card.
+        self._rows = None
+        self._last_shown = None
+
+        # Indices of cards changed since the deck was loaded or saved, and the
+        # path, _file_key(), and name of the deck file it was loaded from or
+        # saved to.
+        self._dirty = set()
+        self._source = None
 
     def __iter__(self):
-        return (c for c in self._cards)
+        return (self.card(idx) for idx in range(len(self._cards)))
 
     def __len__(self):
         return len(self._cards)
@@ -39,53 +178,264 @@ class Deck:
             isinstance(other, self.__class__) and
             self.name == other.name and
             len(self._cards) == len(other) and
-            frozenset(self._cards) == frozenset([c for c in other])
+            frozenset(self) == frozenset([c for c in other])
         )
 
     # File IO
     @classmethod
-    def load(cls, filename):
+    def load(cls, filename, cache=True, journal=True, correct_below=None):
         """Load a deck.
 
+        The first load of a deck file writes a binary sidecar cache next to it.
+        Subsequent loads read the sidecar instead of parsing the csv for as
+        long as the deck file's modification time and size are unchanged.
+
+        Answers recorded in the deck file's journal since it was last saved are
+        replayed on top of the deck file. The deck file is opened and its
+        journal read under a shared FileLock, so they are never torn by a
+        concurrent compaction; parsing happens after the lock is released.
+
         Args:
             filename (str): Path to deck file.
+            cache (bool): Use (and maintain) the sidecar cache.
+            journal (bool): Replay the deck file's journal.
+            correct_below (int): Only load cards with fewer correct answers.
+                A partially loaded deck cannot be saved.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        with metrics.timer('deck.load'):
+            store = cls.store(filename)
+            try:
+                deck = store.load(cls, cache, journal, correct_below)
+            finally:
+                store.close()
+
+        metrics.count('deck.cards_loaded', len(deck))
+        return deck
+
+    @classmethod
+    def store(cls, filename):
+        """Store of a deck file's format.
+
+        Args:
+            filename (str): Path to deck file.
+
+        Returns:
+            (DeckStore): the store, not yet opened.
+        """
+        if SqliteStore.handles(filename):
+            return SqliteStore(filename)
+
+        return CsvStore(filename)
+
+    @classmethod
+    def _lazy(cls, name, rows, attempts, correct, last_shown):
+        """Deck whose rows are read on demand.
+
+        Args:
+            name (str): Deck name.
+            rows (object): Has row(idx), the question and answer of a card.
+            attempts, correct, last_shown (array, array, array): Statistics of
+                each card. last_shown is _never for cards never shown.
+        """
+        deck = cls(name)
+        deck._rows = rows
+        deck._attempts = attempts
+        deck._correct = correct
+        deck._last_shown = last_shown
+        deck._cards = [None] * len(attempts)
+        return deck
+
+    @classmethod
+    def compact(cls, filename):
+        """Fold a csv deck file's journal back into the deck file.
+
+        The deck is rebuilt from the deck file and journal on disk, so answers
+        journaled by other processes are kept. The locks are brief: the deck
+        file is opened and the journal's size() taken under a shared
+        FileLock, the new deck file is built without a lock, and an exclusive
+        FileLock is only held to replace the deck file and discard the
+        folded records from the journal. Answers journaled meanwhile stay in
+        the journal. If the deck file was replaced meanwhile (say, by another
+        compaction), the rebuilt deck is dropped.
+
+        Args:
+            filename (str): Path to deck file.
+        """
+        journal = Journal(filename)
+        with FileLock(filename, shared=True):
+            f = open(filename, mode='rb')
+            end = journal.size()
+
+        with f:
+            if not end:
+                return
+
+            key = cls._file_key(f.fileno())
+            deck = cls._load_cache(filename, f)
+            if deck is None:
+                deck, _ = cls._load_csv(filename, f)
+
+            deck._replay(journal.records(end), journal.filename)
+            temp, offsets = cls._write_temp(
+                filename,
+                deck.name,
+                deck._segments(),
+                offsets=True
+            )
+
+        try:
+            with FileLock(filename):
+                if cls._file_key(filename) != key:
+                    _logger.debug('%s changed while compacting.', filename)
+                    os.remove(temp)
+                    return
+
+                cls._install(temp, filename)
+                journal.discard(end)
+                deck._save_cache(filename, offsets)
+
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    @classmethod
+    def _load_csv(cls, filename, f):
+        """Parse a deck file.
+
+        Args:
+            filename (str): Path to deck file.
+            f (file): The deck file, opened in binary mode.
+
+        Returns:
+            deck, offsets (Deck, array): the deck, and the byte offset of each
+                card's row, and of the end of the file.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        encoding = locale.getpreferredencoding(False)
+        offset = [0]
+
+        def lines(f):
+            """Decoded lines of f, keeping count of the bytes read."""
+            for line in f:
+                offset[0] += len(line)
+                yield line.decode(encoding)
+
+        f.seek(0)
+        csvreader = csv.reader(lines(f))
+        deck = cls(cls._read_header(csvreader, filename))
+        offsets = array.array('q', offset)
+
+        # Quiz data is csv.
+        cards = deck._cards
+        attempts = deck._attempts
+        correct = deck._correct
+        for row in csvreader:
+            row += [None] * (5 - len(row))
+            cards.append((row[0], row[1], row[4]))
+            attempts.append(int(row[2]) if row[2] else 0)
+            correct.append(int(row[3]) if row[3] else 0)
+            offsets.append(offset[0])
+
+        return deck, offsets
+
+    def _select(self, correct_below):
+        """Drop the cards with at least correct_below correct answers.
+
+        Args:
+            correct_below (int): Keep cards with fewer correct answers.
+        """
+        attempts, correct = self.stats()
+        keep = [idx for idx, c in enumerate(correct) if c < correct_below]
+        self._keys = array.array('q', (self.key(idx) for idx in keep))
+        self._cards = [self._entry(idx) for idx in keep]
+        self._attempts = array.array('q', (attempts[idx] for idx in keep))
+        self._correct = array.array('q', (correct[idx] for idx in keep))
+        self._live = [
+            idx for idx, c in enumerate(self._cards)
+            if isinstance(c, Flashcard)
+        ]
+        self._partial = True
+
+    @classmethod
+    def read_name(cls, filename):
+        """Read the name of a deck without loading it.
+
+        Args:
+            filename (str): Path to deck file.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        store = cls.store(filename)
+        try:
+            return store.read_name()
+        finally:
+            store.close()
+
+    @classmethod
+    def read_rows(cls, filename):
+        """Read the raw cells of a csv deck file, checking its format strictly.
+
+        Args:
+            filename (str): Path to deck file.
+
+        Returns:
+            name, rows (str, list): Deck name, and the cells of each card's
+                row, padded to five cells.
 
         Raises:
             ValueError: filename is not a valid deck.
         """
-        name = ''
-        deck = None
         with open(filename, mode='r', newline='') as f:
             csvreader = csv.reader(f)
+            name = cls._read_header(csvreader, filename, strict=True)
+            rows = [row + [''] * (5 - len(row)) for row in csvreader]
 
-            # Parse reserved keywords until we hit the beginning of quiz data.
-            for row in csvreader:
-                cell = row[0]
-                if cls._starts_with_reserved_word(cell):
-                    if cell.startswith(cls.ReservedWords.name):
-                        name = cls._deck_name(cell)
-                    elif cell.startswith(cls.ReservedWords.quiz):
-                        break
+        return name, rows
 
-            else:
-                raise ValueError('{} not a deck file.'.format(filename))
+    @classmethod
+    def iter_file(cls, filename, journal=True):
+        """Stream the cards of a deck file.
 
-            # Quiz data is csv.
-            deck = cls(name)
-            for idx, row in enumerate(csvreader):
-                if idx == 0:
-                    continue
+        Cards are read one at a time, so one pass over a deck needs a bounded
+        amount of memory, however large the deck file is.
 
-                card = Flashcard(*row)
-                deck.add_card(card)
+        Args:
+            filename (str): Path to deck file.
+            journal (bool): Apply answers from the deck file's journal.
 
-        return deck
+        Yields:
+            card (Flashcard): cards of the deck, in order.
 
-    def save(self, filename, overwrite=False):
-        """Save the deck to file.
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        store = cls.store(filename)
+        try:
+            yield from store.iter_cards(journal)
+        finally:
+            store.close()
+
+    @classmethod
+    def write_file(cls, filename, name, cards, overwrite=False):
+        """Stream cards to a deck file.
+
+        The deck is written to a temporary file which then atomically replaces
+        filename, so an interrupted write never leaves a partial deck file. The
+        written file holds the deck's complete state, so it replaces any
+        journal the file had. The file is replaced and the journal cleared
+        under an exclusive FileLock.
 
         Args:
             filename (str): Path to deck file.
+            name (str): Deck name.
+            cards (iterable): Flashcards to write.
             overwrite (bool): Overwrite existing file flag.
                 True -> Overwrite file if it exists.
                 False -> Raise exception if file exists.
@@ -96,20 +446,446 @@ class Deck:
         if os.path.isfile(filename) and not overwrite:
             raise ValueError('{} exists.'.format(filename))
 
-        with open(filename, mode='w', newline='') as f:
-            deckwriter = csv.writer(f)
-            deckwriter.writerow(
-                [
-                    '{keyword} {value}'.format(
-                        keyword=self.ReservedWords.name,
-                        value=self.name
-                    ),
-                ]
+        store = cls.store(filename)
+        try:
+            store.write_cards(name, cards)
+        finally:
+            store.close()
+
+    @classmethod
+    def _write_csv(cls, filename, name, segments, offsets=False):
+        """Write a csv deck file. See write_file().
+
+        Args:
+            filename (str): Path to deck file.
+            name (str): Deck name.
+            segments (iterable): The cards' rows, in order, as iterables of
+                the fields of rows, or _Runs of rows to copy verbatim.
+            offsets (bool): Record the offset of each row, for the sidecar
+                cache. Streamed writes skip it, to keep constant memory.
+
+        Returns:
+            offsets (array): Byte offset of each card's row, and of the end of
+                the file. None unless offsets is True.
+        """
+        temp, offsets = cls._write_temp(filename, name, segments, offsets)
+        try:
+            with FileLock(filename):
+                cls._install(temp, filename)
+                Journal(filename).clear()
+
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+        return offsets
+
+    @classmethod
+    def _write_temp(cls, filename, name, segments, offsets=False):
+        """Write a csv deck file to a temporary file next to filename. See
+        _write_csv().
+
+        Returns:
+            temp, offsets (str, array): Path to the temporary file, and the
+                offsets of its rows, as returned by _write_csv().
+        """
+        f = tempfile.NamedTemporaryFile(
+            mode='wb',
+            dir=os.path.dirname(os.path.abspath(filename)),
+            prefix='.' + os.path.basename(filename),
+            delete=False
+        )
+        try:
+            with f:
+                out = _OffsetWriter(
+                    f,
+                    locale.getpreferredencoding(False),
+                    offsets
+                )
+                deckwriter = csv.writer(out)
+                deckwriter.writerow(
+                    [
+                        '{keyword} {value}'.format(
+                            keyword=cls.ReservedWords.name,
+                            value=name
+                        ),
+                    ]
+                )
+                deckwriter.writerow([cls.ReservedWords.quiz])
+                deckwriter.writerow(Flashcard.headers().split(', '))
+                for segment in segments:
+                    if isinstance(segment, _Run):
+                        out.copy(segment)
+                    else:
+                        deckwriter.writerows(segment)
+
+                if offsets:
+                    # Skip the header rows.
+                    offsets = out.offsets[3:]
+                    offsets.append(out.offset)
+                else:
+                    offsets = None
+
+                f.flush()
+                os.fsync(f.fileno())
+
+        except BaseException:
+            if os.path.exists(f.name):
+                os.remove(f.name)
+            raise
+
+        return f.name, offsets
+
+    @staticmethod
+    def _install(temp, filename):
+        """Atomically replace filename with a temporary file written by
+        _write_temp(), keeping filename's mode. Call under filename's
+        exclusive FileLock."""
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp)
+        else:
+            os.chmod(temp, 0o666 & ~_umask())
+
+        os.replace(temp, filename)
+
+    def save(self, filename, overwrite=False, cache=True):
+        """Save the deck to file.
+
+        See write_file(). Saving a deck over the deck file it was loaded from
+        (or last saved to) is skipped if neither the deck nor the file have
+        changed since. Rows of a mapped deck file (see load()) whose cards
+        have not changed are copied without being parsed.
+
+        Args:
+            filename (str): Path to deck file.
+            overwrite (bool): Overwrite existing file flag.
+                True -> Overwrite file if it exists.
+                False -> Raise exception if file exists.
+            cache (bool): Refresh the sidecar cache for the saved file.
+
+        Raises:
+            ValueError: filename exists, or the deck was partially loaded.
+        """
+        if self._partial:
+            raise ValueError('Cannot save a partially loaded deck.')
+
+        with metrics.timer('deck.save'):
+            store = self.store(filename)
+            try:
+                store.save(self, overwrite, cache)
+            finally:
+                store.close()
+
+    def is_dirty(self):
+        """Have any cards been added, answered, or replayed from the journal
+        since the deck was loaded or saved?"""
+        self.stats()  # Marks answered cards.
+        return bool(self._dirty)
+
+    def _changed_since(self, filename):
+        """Would saving to filename change it?"""
+        if self._source is None or self.is_dirty():
+            return True
+
+        try:
+            key = self._file_key(filename)
+        except OSError:
+            return True
+
+        return self._source != (os.path.abspath(filename), key, self.name)
+
+    def _is_source(self, filename):
+        """Was the deck loaded from (or last saved to) filename?"""
+        return (
+            self._source is not None and
+            self._source[0] == os.path.abspath(filename)
+        )
+
+    def _saved(self, filename, key=None):
+        """Note that the deck now matches filename.
+
+        Args:
+            filename (str): Path to the deck file the deck was loaded from or
+                saved to.
+            key (tuple): _file_key() of the version of filename that was read
+                or written. Defaults to its current version.
+        """
+        self._dirty.clear()
+        self._source = (
+            os.path.abspath(filename),
+            key or self._file_key(filename),
+            self.name
+        )
+
+    def _segments(self):
+        """The cards' rows, as segments for _write_csv().
+
+        Runs of unbuilt and unchanged cards of a mapped deck file are copied
+        from the file, and only the rows of the other cards are formatted.
+        """
+        n = len(self._cards)
+        if not isinstance(self._rows, _MappedRows):
+            yield map(self._row, range(n))
+            return
+
+        # Entries of a mapped deck stay None until the card is built or
+        # changed. Runs are views of the map, so they are not read into
+        # memory all at once.
+        touched = sorted(set(self._live).union(self._dirty))
+        offsets = self._rows.offsets
+        view = memoryview(self._rows.map)
+        start = 0
+        for _, group in itertools.groupby(
+            enumerate(touched),
+            lambda pair: pair[1] - pair[0]
+        ):
+            indices = [idx for _, idx in group]
+            first, last = indices[0], indices[-1]
+            if first > start:
+                yield _Run(
+                    view[offsets[start]:offsets[first]],
+                    offsets[start:first + 1]
+                )
+            yield map(self._row, range(first, last + 1))
+            start = last + 1
+
+        if start < n:
+            yield _Run(
+                view[offsets[start]:offsets[n]],
+                offsets[start:n + 1]
+            )
+
+    def _row(self, idx):
+        """Fields of a card's row in the deck file."""
+        entry = self._entry(idx)
+        if isinstance(entry, Flashcard):
+            return self._card_row(entry)
+
+        question, answer, last_shown = entry
+        return (
+            question,
+            answer,
+            self._attempts[idx],
+            self._correct[idx],
+            (
+                last_shown
+                if isinstance(last_shown, str) else
+                Flashcard.format_timestamp(last_shown)
+            )
+        )
+
+    @staticmethod
+    def _card_row(card):
+        """Fields of a Flashcard's row in the deck file."""
+        return (
+            card.question,
+            card.answer,
+            card.n_attempts,
+            card.n_correct,
+            Flashcard.format_timestamp(card.timestamp)
+        )
+
+    def _replay(self, records, journal_filename):
+        """Apply the answers recorded in a journal.
+
+        Args:
+            records (iterable): journal Records of the file this deck was
+                loaded from.
+            journal_filename (str): Path to the journal, for warnings.
+        """
+        for record in records:
+            idx = record.index
+            if (
+                not 0 <= idx < len(self._cards) or
+                self._question(self._entry(idx)) != record.question
+            ):
+                _logger.warning(
+                    'Journal %s does not match deck. Ignoring %s.',
+                    journal_filename,
+                    record
+                )
+                continue
+
+            self._dirty.add(idx)
+            card = self._entry(idx)
+            if isinstance(card, Flashcard):
+                card.n_attempts += record.attempts
+                card.n_correct += record.correct
+                card.timestamp = record.timestamp
+
+            else:
+                self._attempts[idx] += record.attempts
+                self._correct[idx] += record.correct
+                self._cards[idx] = (card[0], card[1], record.timestamp)
+
+    @classmethod
+    def cache_filename(cls, filename):
+        """Path to the sidecar cache of a deck file."""
+        return filename + cls.cache_extension
+
+    @classmethod
+    def _load_cache(cls, filename, f):
+        """Load a deck from its sidecar cache, mapping the deck file.
+
+        Args:
+            filename (str): Path to deck file.
+            f (file): The deck file, opened in binary mode.
+
+        Returns:
+            deck (Deck): Cached deck, or None if there is no usable cache for
+                the current version of filename.
+        """
+        try:
+            with open(cls.cache_filename(filename), mode='rb') as cache:
+                (
+                    version, cached_key, name,
+                    offsets, attempts, correct, last_shown
+                ) = marshal.load(cache)
+
+            if version != cls.cache_version:
+                return None
+
+            if cls._file_key(f.fileno()) != tuple(cached_key):
+                return None
+
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        arrays = []
+        for data in (offsets, attempts, correct, last_shown):
+            a = array.array('q')
+            a.frombytes(data)
+            arrays.append(a)
+        offsets, attempts, correct, last_shown = arrays
+
+        n = len(attempts)
+        if not (
+            n + 1 == len(offsets) and
+            n == len(correct) == len(last_shown) and
+            offsets[-1] <= len(mapped)
+        ):
+            return None
+
+        return cls._lazy(
+            name,
+            _MappedRows(mapped, offsets),
+            attempts,
+            correct,
+            last_shown
+        )
+
+    def _save_cache(self, filename, offsets, key=None):
+        """Write the sidecar cache for filename.
+
+        The cache is an optimization, so failure to write it is not an error.
+        It is written to a temporary file which then replaces the cache, so
+        concurrent loads never read a partial cache.
+
+        Args:
+            filename (str): Path to the deck file this deck was read from or
+                written to.
+            offsets (array): Byte offset of each card's row in filename, and
+                of the end of the file.
+            key (tuple): _file_key() of the version of filename that was read
+                or written. Defaults to its current version.
+        """
+        cache_filename = self.cache_filename(filename)
+        f = None
+        try:
+            attempts, correct = self.stats()
+            last_shown = array.array(
+                'q',
+                (
+                    self._never if t is None else t
+                    for t in self.timestamps()
+                )
             )
-            deckwriter.writerow([self.ReservedWords.quiz])
-            deckwriter.writerow(Flashcard.headers().split(', '))
-            for c in self._cards:
-                deckwriter.writerow(str(c).split(', '))
+            key = key or self._file_key(filename)
+            f = tempfile.NamedTemporaryFile(
+                mode='wb',
+                dir=os.path.dirname(os.path.abspath(cache_filename)),
+                prefix='.' + os.path.basename(cache_filename),
+                delete=False
+            )
+            with f:
+                marshal.dump(
+                    (
+                        self.cache_version,
+                        key,
+                        self.name,
+                        offsets.tobytes(),
+                        attempts.tobytes(),
+                        correct.tobytes(),
+                        last_shown.tobytes()
+                    ),
+                    f
+                )
+
+            os.chmod(f.name, 0o666 & ~_umask())
+            os.replace(f.name, cache_filename)
+
+        except (OSError, ValueError):
+            stale = [cache_filename] if f is None else [f.name, cache_filename]
+            for name in stale:
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+
+    def _entry(self, idx):
+        """Deck entry of a card, reading its row from the deck file if
+        necessary.
+
+        Args:
+            idx (int): index of card in the deck.
+
+        Returns:
+            (Flashcard or tuple): the entry. Rows read from the deck file are
+                not kept.
+        """
+        entry = self._cards[idx]
+        if entry is not None:
+            return entry
+
+        question, answer = self._rows.row(idx)
+        last_shown = self._last_shown[idx]
+        return (
+            question,
+            answer,
+            None if last_shown == self._never else last_shown
+        )
+
+    @staticmethod
+    def _timestamp(entry):
+        """Last shown time of a deck entry, without building a Flashcard.
+
+        Returns:
+            (int): Microseconds since the epoch, or None if never shown.
+        """
+        if isinstance(entry, Flashcard):
+            return entry.timestamp
+
+        last_shown = entry[2]
+        if isinstance(last_shown, str):
+            return Flashcard.parse_timestamp(last_shown) if last_shown else None
+
+        return last_shown
+
+    @staticmethod
+    def _file_key(filename):
+        """Identify the current version of a file.
+
+        Args:
+            filename (str or int): Path to, or descriptor of, file.
+
+        Returns:
+            mtime, size (int, int): Modification time (ns) and size of file.
+        """
+        st = os.stat(filename)
+        return st.st_mtime_ns, st.st_size
 
     # Deck Creation interfaces.
     def add_card(self, card):
@@ -118,12 +894,147 @@ class Deck:
         Args:
             card (Flashcard): card to add to the deck.
         """
+        self._live.append(len(self._cards))
+        if self._keys is not None:
+            self._keys.append(-1)  # Not in the deck file yet.
+        self._dirty.add(len(self._cards))
         self._cards.append(card)
+        self._attempts.append(0)
+        self._correct.append(0)
 
     # Other interfaces.
+    def key(self, idx):
+        """Key of a card in the deck file, for journaling its answers.
+
+        Args:
+            idx (int): index of card in the deck.
+
+        Returns:
+            (int): the card's key.
+        """
+        return idx if self._keys is None else self._keys[idx]
+
+    def card(self, idx):
+        """Get a card, building it from its raw row if necessary.
+
+        Args:
+            idx (int): index of card in the deck.
+
+        Returns:
+            card (Flashcard): the card.
+        """
+        card = self._cards[idx]
+        if not isinstance(card, Flashcard):
+            question, answer, last_shown = self._entry(idx)
+            if isinstance(last_shown, int):
+                card = Flashcard(
+                    question,
+                    answer,
+                    self._attempts[idx],
+                    self._correct[idx]
+                )
+                card.timestamp = last_shown
+
+            else:
+                card = Flashcard(
+                    question,
+                    answer,
+                    self._attempts[idx],
+                    self._correct[idx],
+                    last_shown
+                )
+
+            self._cards[idx] = card
+            self._live.append(idx)
+
+        return card
+
+    def stats(self):
+        """Card statistics, without building Flashcards.
+
+        Returns:
+            attempts, correct (array, array): Number of attempts and number of
+                correct answers of each card, indexed like card().
+        """
+        attempts, correct = self._attempts, self._correct
+        for idx in self._live:
+            card = self._cards[idx]
+            if (
+                card.n_attempts != attempts[idx] or
+                card.n_correct != correct[idx]
+            ):
+                self._dirty.add(idx)
+                attempts[idx] = card.n_attempts
+                correct[idx] = card.n_correct
+
+        return attempts, correct
+
+    def timestamps(self):
+        """Card last shown times, without building Flashcards.
+
+        Returns:
+            (list): Last shown time of each card in microseconds since the
+                epoch (None if never shown), indexed like card().
+        """
+        last_shown = self._last_shown
+        return [
+            self._timestamp(entry)
+            if entry is not None else
+            None if last_shown[idx] == self._never else last_shown[idx]
+            for idx, entry in enumerate(self._cards)
+        ]
+
+    def nbytes(self):
+        """Approximate memory used by the deck, in bytes.
+
+        Counts the loaded entries and their strings, the statistics arrays,
+        and what is held to read rows on demand.
+        """
+        n = sys.getsizeof(self._cards) + sys.getsizeof(self._live)
+        for a in (
+            self._attempts,
+            self._correct,
+            self._keys,
+            self._last_shown
+        ):
+            if a is not None:
+                n += sys.getsizeof(a)
+
+        if self._rows is not None:
+            n += self._rows.nbytes()
+
+        for entry in self._cards:
+            if entry is None:
+                continue
+
+            n += sys.getsizeof(entry)
+            fields = (
+                (entry.question, entry.answer)
+                if isinstance(entry, Flashcard) else
+                entry
+            )
+            n += sum(sys.getsizeof(f) for f in fields if isinstance(f, str))
+
+        return n
+
+    @staticmethod
+    def _question(entry):
+        """Question of a deck entry, without building a Flashcard."""
+        if isinstance(entry, Flashcard):
+            return entry.question
+
+        return entry[0].strip() if entry[0] else None
+
     def answers(self):
         """Return a set of all answers."""
-        a = frozenset((c.answer for c in self._cards))
+        a = frozenset(
+            (
+                c.answer
+                if isinstance(c, Flashcard) else
+                (c[1].strip() if c[0] else None)
+                for c in map(self._entry, range(len(self._cards)))
+            )
+        )
         return a
 
     @classmethod
@@ -141,6 +1052,56 @@ class Deck:
 
         return False
 
+    @classmethod
+    def _read_header(cls, csvreader, filename, strict=False):
+        """Parse the deck description section of a deck file.
+
+        Leaves csvreader at the first card of the quiz section.
+
+        Args:
+            csvreader (csv.reader): Reader at the start of the deck file.
+            filename (str): Path to deck file.
+            strict (bool): Also require a deck name, and the quiz section's
+                header row to name the Flashcard.headers() columns.
+
+        Returns:
+            name (str): Deck name.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        name = ''
+
+        # Parse reserved keywords until we hit the beginning of quiz data.
+        for row in csvreader:
+            cell = row[0] if row else ''
+            if cls._starts_with_reserved_word(cell):
+                if cell.startswith(cls.ReservedWords.name):
+                    name = cls._deck_name(cell)
+                elif cell.startswith(cls.ReservedWords.quiz):
+                    break
+
+        else:
+            raise ValueError('{} not a deck file.'.format(filename))
+
+        # Skip the quiz section's header row.
+        header = next(csvreader, None)
+
+        if strict:
+            if not name:
+                raise ValueError('{} has no deck name.'.format(filename))
+
+            columns = [c.lower() for c in Flashcard.headers().split(', ')]
+            if [c.strip().lower() for c in header or ()] != columns:
+                raise ValueError(
+                    '{} quiz section header is not {}.'.format(
+                        filename,
+                        Flashcard.headers()
+                    )
+                )
+
+        return name
+
     @classmethod
     def _deck_name(cls, line):
         """Extract deck name from line.
@@ -155,3 +1116,115 @@ class Deck:
         name = tokens[1].strip()
 
         return name
+
+
+class CsvStore(DeckStore):
+    """csv deck file.
+
+    Answers are appended to the deck file's Journal, and checkpoint() folds
+    the journal back into the deck file (see Deck.compact()). Loads read the
+    deck file's sidecar cache when it is current (see Deck.load()).
+    """
+    extension = '.csv'
+
+    def load(self, deck_class, cache=True, journal=True, correct_below=None):
+        """Load a deck. See DeckStore.load()."""
+        filename = self.filename
+        with FileLock(filename, shared=True):
+            f = open(filename, mode='rb')
+            try:
+                records = list(Journal(filename).records()) if journal else []
+            except BaseException:
+                f.close()
+                raise
+
+        with f:
+            key = deck_class._file_key(f.fileno())
+            deck = deck_class._load_cache(filename, f) if cache else None
+            if deck is None:
+                metrics.count('deck.parsed')
+                deck, offsets = deck_class._load_csv(filename, f)
+                if cache:
+                    deck._save_cache(filename, offsets, key)
+
+            if not records:
+                # Saving a deck with a journal clears the journal.
+                deck._saved(filename, key)
+
+        deck._replay(records, Journal.journal_filename(filename))
+
+        if correct_below is not None:
+            deck._select(correct_below)
+
+        return deck
+
+    def read_name(self):
+        """Read the name of the deck. See DeckStore.read_name()."""
+        with open(self.filename, mode='r', newline='') as f:
+            return Deck._read_header(csv.reader(f), self.filename)
+
+    def iter_cards(self, journal=True):
+        """Stream the cards. See DeckStore.iter_cards()."""
+        filename = self.filename
+
+        # The journal is proportional to the answers since the last save, not
+        # to the deck, so it is read up front, with the deck file opened under
+        # the same lock.
+        records = {}
+        with FileLock(filename, shared=True):
+            if journal:
+                for record in Journal(filename).records():
+                    records.setdefault(record.index, []).append(record)
+
+            f = open(filename, mode='r', newline='')
+
+        with f:
+            csvreader = csv.reader(f)
+            Deck._read_header(csvreader, filename)
+            for idx, row in enumerate(csvreader):
+                card = Flashcard(*row)
+                for record in records.get(idx, ()):
+                    if record.question == card.question:
+                        card.n_attempts += record.attempts
+                        card.n_correct += record.correct
+                        card.timestamp = record.timestamp
+
+                yield card
+
+    def write_cards(self, name, cards):
+        """Replace the deck file. See DeckStore.write_cards()."""
+        Deck._write_csv(self.filename, name, [map(Deck._card_row, cards)])
+
+    def save(self, deck, overwrite=False, cache=True):
+        """Save a deck. See DeckStore.save()."""
+        filename = self.filename
+
+        # Lock until the cache is written, so it describes the file written.
+        with FileLock(filename):
+            if os.path.isfile(filename) and not overwrite:
+                raise ValueError('{} exists.'.format(filename))
+
+            if not deck._changed_since(filename):
+                metrics.count('deck.saves_skipped')
+                return
+
+            offsets = deck._write_csv(
+                filename,
+                deck.name,
+                deck._segments(),
+                offsets=cache
+            )
+            deck._keys = None  # Cards are written in order.
+            key = deck._file_key(filename)
+            if cache:
+                deck._save_cache(filename, offsets, key)
+
+            deck._saved(filename, key)
+
+    def journal(self):
+        """The deck file's Journal."""
+        return Journal(self.filename)
+
+    def checkpoint(self):
+        """Fold the journal into the deck file."""
+        Deck.compact(self.filename)
@@ -0,0 +1,182 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+from collections import namedtuple, OrderedDict
+import logging
+import os
+import threading
+from lib.deck import Deck
+from lib.metrics import metrics
+
+_logger = logging.getLogger(__name__)
+
+
+CacheStats = namedtuple(
+    'CacheStats',
+    ['hits', 'misses', 'evictions', 'entries', 'nbytes']
+)
+
+
+class DeckCache:
+    """In-process cache of loaded decks, with LRU eviction.
+
+    Decks are keyed on the absolute path, modification time, and size of
+    their deck files, so a deck file that is edited (or compacted) is loaded
+    again. Answers recorded by quizzes are applied to the cached deck by the
+    quizzes themselves, so they do not invalidate it, and neither do the
+    checkpoints that persist them (see refresh()).
+
+    Cached decks are shared: every caller gets the same Deck. The least
+    recently used decks are evicted when the cache holds more than
+    max_entries decks, or more than max_bytes bytes of decks (see
+    Deck.nbytes()). Thread safe.
+    """
+    def __init__(self, max_entries=8, max_bytes=None):
+        """
+        Args:
+            max_entries (int): Maximum number of cached decks.
+            max_bytes (int): Maximum approximate memory of cached decks. No
+                limit if None.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()  # Path: (file key, Deck, nbytes).
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, filename):
+        """Load a deck, from the cache if its deck file is unchanged.
+
+        Args:
+            filename (str): Path to deck file.
+
+        Returns:
+            (Deck): the deck.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        path = os.path.abspath(filename)
+        try:
+            key = Deck._file_key(path)
+        except OSError:
+            # Let Deck report why it cannot be loaded.
+            with self._lock:
+                self.misses += 1
+            return Deck.load(filename)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                metrics.count('deck_cache.hits')
+                return entry[1]
+
+            self.misses += 1
+
+        metrics.count('deck_cache.misses')
+
+        # Load outside the lock, so other decks can be served meanwhile. The
+        # key is taken first, so an edit during the load invalidates it.
+        deck = Deck.load(filename)
+        nbytes = deck.nbytes()
+        with self._lock:
+            self._discard(path)
+            if self.max_bytes is None or nbytes <= self.max_bytes:
+                self._entries[path] = (key, deck, nbytes)
+                self._nbytes += nbytes
+                self._evict()
+            else:
+                _logger.info(
+                    'Not caching %s: %d bytes is over budget.',
+                    filename,
+                    nbytes
+                )
+
+        return deck
+
+    def refresh(self, filename, key, deck):
+        """Keep a deck cached across a change to its deck file that the deck
+        already reflects, such as a checkpoint of the answers applied to it.
+
+        Args:
+            filename (str): Path to deck file.
+            key (tuple): Deck._file_key() of the deck file before the change.
+                If the deck was cached for another version of the file, the
+                file was also changed by someone else, and the deck is left
+                to be loaded again.
+            deck (Deck): Deck the change was made from.
+        """
+        path = os.path.abspath(filename)
+        try:
+            changed = Deck._file_key(path)
+        except OSError:
+            return
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == key and entry[1] is deck:
+                self._entries[path] = (changed, deck, entry[2])
+
+    def invalidate(self, filename=None):
+        """Drop a deck, or every deck, from the cache.
+
+        Args:
+            filename (str): Path to deck file. None -> all deck files.
+        """
+        with self._lock:
+            if filename is None:
+                self._entries.clear()
+                self._nbytes = 0
+            else:
+                self._discard(os.path.abspath(filename))
+
+    def stats(self):
+        """Cache statistics.
+
+        Returns:
+            (CacheStats): Hits, misses, evictions, number of cached decks, and
+                their approximate memory in bytes.
+        """
+        with self._lock:
+            return CacheStats(
+                self.hits,
+                self.misses,
+                self.evictions,
+                len(self._entries),
+                self._nbytes
+            )
+
+    def _discard(self, path):
+        """Remove an entry. Call with the lock held."""
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._nbytes -= entry[2]
+
+    def _evict(self):
+        """Evict least recently used entries until the cache is within
+        budget. Call with the lock held."""
+        while self._entries and (
+            len(self._entries) > self.max_entries or
+            self.max_bytes is not None and self._nbytes > self.max_bytes
+        ):
+            path, (_, _, nbytes) = self._entries.popitem(last=False)
+            self._nbytes -= nbytes
+            self.evictions += 1
+            _logger.debug('Evicted %s from deck cache.', path)
+
+
+# Cache shared by the quizzes and commands of this process.
+deck_cache = DeckCache()
@@ -0,0 +1,244 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import bisect
+import collections
+import heapq
+import logging
+import marshal
+import math
+import random
+from lib.deck import Deck
+
+_logger = logging.getLogger(__name__)
+
+
+class DistractorIndex:
+    """Index of a deck's answers for picking plausible wrong answers.
+
+    Numeric answers are kept sorted by value, so the answers closest to a
+    numeric answer are found by bisection. Text answers are indexed by their
+    character trigrams, so answers that look alike are found from the posting
+    lists of the answer's trigrams. Neither scans the full answer set.
+    """
+    extension = '.distractors'
+    version = 2
+
+    # Posting lists longer than this are too common to tell answers apart, and
+    # too long to scan for every question.
+    max_postings = 200
+
+    def __init__(self, answers, numeric_ids, numeric_values, ngrams):
+        """Use build() or load() to make an index.
+
+        Args:
+            answers (tuple): Distinct answers.
+            numeric_ids (list): Indices into answers of the numeric answers,
+                sorted by value.
+            numeric_values (list): Values of the numeric answers, sorted.
+            ngrams (dict): Indices into answers of the answers containing each
+                trigram.
+        """
+        self.answers = answers
+        self._numeric_ids = numeric_ids
+        self._numeric_values = numeric_values
+        self._ngrams = ngrams
+
+    @classmethod
+    def build(cls, answers):
+        """Index answers.
+
+        Args:
+            answers (iterable): Distinct answers.
+
+        Returns:
+            (DistractorIndex): the index.
+        """
+        answers = tuple(a for a in answers if a is not None)
+        numeric = []
+        ngrams = collections.defaultdict(list)
+        for idx, a in enumerate(answers):
+            value = cls._value(a)
+            if value is None:
+                for g in cls._trigrams(a):
+                    ngrams[g].append(idx)
+            else:
+                numeric.append((value, idx))
+
+        numeric.sort()
+        return cls(
+            answers,
+            [idx for _, idx in numeric],
+            [value for value, _ in numeric],
+            dict(ngrams)
+        )
+
+    @classmethod
+    def index_filename(cls, deck_filename):
+        """Path to the persisted distractor index of a deck file."""
+        return deck_filename + cls.extension
+
+    @classmethod
+    def load(cls, deck_filename, answers):
+        """Load the persisted index of a deck, building it if necessary.
+
+        The persisted index is used as is if the deck file has not changed
+        (see Deck._file_key()) since the index was saved. Otherwise, it is
+        only used if it indexes exactly the deck's answers, and it is saved
+        again for the current deck file.
+
+        Args:
+            deck_filename (str): Path to deck file.
+            answers (callable): Returns the deck's distinct answers
+                (frozenset). Only called if the deck file changed since the
+                index was saved, since it scans the whole deck.
+
+        Returns:
+            (DistractorIndex): the index.
+        """
+        filename = cls.index_filename(deck_filename)
+        try:
+            key = Deck._file_key(deck_filename)
+        except OSError:
+            key = None
+
+        try:
+            with open(filename, mode='rb') as f:
+                version, saved_key, *fields = marshal.load(f)
+
+            if version != cls.version:
+                fields = None
+
+        except (OSError, EOFError, ValueError, TypeError):
+            fields = None
+
+        if fields is not None and key is not None and saved_key == key:
+            return cls(*fields)
+
+        deck_answers = answers() - frozenset([None])
+        index = (
+            cls(*fields)
+            if fields is not None and frozenset(fields[0]) == deck_answers else
+            cls.build(deck_answers)
+        )
+        try:
+            with open(filename, mode='wb') as f:
+                marshal.dump(
+                    (
+                        cls.version,
+                        key,
+                        index.answers,
+                        index._numeric_ids,
+                        index._numeric_values,
+                        index._ngrams
+                    ),
+                    f
+                )
+
+        except OSError:
+            _logger.warning('Could not save %s.', filename)
+
+        return index
+
+    def distractors(self, answer, k):
+        """Plausible wrong answers.
+
+        Picks at random among the 2k answers nearest to answer, so that the
+        correct answer is not given away by always being in the middle.
+        Answers are padded out at random if there are too few near misses.
+
+        Args:
+            answer (str): Correct answer.
+            k (int): Number of distractors.
+
+        Returns:
+            (list): Up to k distinct answers other than answer.
+        """
+        value = self._value(answer)
+        candidates = (
+            self._text_neighbors(answer, 2 * k)
+            if value is None else
+            self._numeric_neighbors(value, 2 * k)
+        )
+        distractors = (
+            random.sample(candidates, k)
+            if len(candidates) > k else
+            candidates
+        )
+        return self._pad(distractors, answer, k)
+
+    def _numeric_neighbors(self, value, n):
+        """Up to n answers nearest in value, excluding value itself."""
+        ids = self._numeric_ids
+        values = self._numeric_values
+        lo = bisect.bisect_left(values, value) - 1
+        hi = bisect.bisect_right(values, value)
+        neighbors = []
+        while len(neighbors) < n and (lo >= 0 or hi < len(values)):
+            if hi >= len(values) or (
+                lo >= 0 and value - values[lo] <= values[hi] - value
+            ):
+                neighbors.append(self.answers[ids[lo]])
+                lo -= 1
+            else:
+                neighbors.append(self.answers[ids[hi]])
+                hi += 1
+
+        return neighbors
+
+    def _text_neighbors(self, answer, n):
+        """Up to n answers sharing the most trigrams with answer."""
+        shared = collections.Counter()
+        for g in self._trigrams(answer):
+            postings = self._ngrams.get(g, ())
+            if len(postings) <= self.max_postings:
+                shared.update(postings)
+
+        return [
+            self.answers[idx]
+            for idx, _ in heapq.nlargest(
+                n + 1,
+                shared.items(),
+                key=lambda x: x[1]
+            )
+            if self.answers[idx] != answer
+        ][:n]
+
+    def _pad(self, distractors, answer, k):
+        """Pad distractors with random answers, up to k."""
+        n = len(self.answers)
+        chosen = set(distractors)
+        chosen.add(answer)
+        if len(distractors) < k and n < 2 * (k + 1):
+            remaining = [a for a in self.answers if a not in chosen]
+            return distractors + random.sample(
+                remaining,
+                min(k - len(distractors), len(remaining))
+            )
+
+        while len(distractors) < k:
+            a = self.answers[random.randrange(n)]
+            if a not in chosen:
+                chosen.add(a)
+                distractors.append(a)
+
+        return distractors
+
+    @staticmethod
+    def _value(answer):
+        """Numeric value of answer, or None if it is not a finite number."""
+        try:
+            value = float(answer)
+        except (TypeError, ValueError):
+            return None
+
+        return value if math.isfinite(value) else None
+
+    @staticmethod
+    def _trigrams(answer):
+        """Distinct character trigrams of answer, ignoring case."""
+        padded = ' {} '.format(answer.casefold())
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
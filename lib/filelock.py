@@ -0,0 +1,108 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """Advisory lock of a deck file and its journal, shared by processes.
+
+    Readers take a shared lock while they read the deck file and its journal
+    together, and writers take an exclusive lock while they append to the
+    journal or fold it into the deck file, so a reader never sees a compacted
+    deck file with the journal it was compacted from, and answers appended by
+    one process are never lost by another's compaction.
+
+    The lock is an flock() of a sidecar lock file, which is never deleted.
+    Locks are reentrant within a thread. Without fcntl (e.g. on Windows), or
+    if the lock file cannot be created, locking does nothing.
+
+    Usage:
+        with FileLock(deck_filename):
+            ...
+    """
+    extension = '.lock'
+
+    _held = threading.local()  # Per thread, lock filename: [depth, shared].
+
+    def __init__(self, deck_filename, shared=False):
+        """
+        Args:
+            deck_filename (str): Path to the locked deck file.
+            shared (bool): Take a shared (read) lock, instead of an exclusive
+                (write) lock.
+        """
+        self.filename = os.path.abspath(deck_filename + self.extension)
+        self.shared = shared
+        self._fd = None
+        self._nested = False
+
+    def __enter__(self):
+        held = self._held_locks()
+        entry = held.get(self.filename)
+        if entry is not None:
+            if entry[1] and not self.shared:
+                raise RuntimeError(
+                    'Cannot upgrade shared lock of {}.'.format(self.filename)
+                )
+            entry[0] += 1
+            self._nested = True
+            return self
+
+        if fcntl is not None:
+            try:
+                self._fd = os.open(
+                    self.filename,
+                    os.O_RDWR | os.O_CREAT,
+                    0o666
+                )
+            except OSError as e:
+                _logger.debug('Not locking %s: %s', self.filename, e)
+            else:
+                try:
+                    fcntl.flock(
+                        self._fd,
+                        fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+                    )
+                except BaseException:
+                    os.close(self._fd)
+                    self._fd = None
+                    raise
+
+        held[self.filename] = [1, self.shared]
+        return self
+
+    def __exit__(self, *exc):
+        held = self._held_locks()
+        entry = held[self.filename]
+        entry[0] -= 1
+        if self._nested:
+            self._nested = False
+            return
+
+        del held[self.filename]
+        if self._fd is not None:
+            # Closing the descriptor releases the lock.
+            os.close(self._fd)
+            self._fd = None
+
+    @classmethod
+    def _held_locks(cls):
+        """Locks held by the current thread."""
+        try:
+            return cls._held.locks
+        except AttributeError:
+            cls._held.locks = {}
+            return cls._held.locks
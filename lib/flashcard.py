@@ -6,9 +6,18 @@ Licensed under the BSD 3-clause License. See LICENSE.txt or
 """
 import datetime
 
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
 
 class Flashcard:
-    """Question-answer pair."""
+    """Question-answer pair.
+
+    Cards are slotted, and keep the time they were last shown as an integer
+    number of microseconds since the epoch, to keep large decks compact.
+    """
+    __slots__ = ('question', 'answer', 'n_attempts', 'n_correct', 'timestamp')
+
     def __init__(
         self,
         question=None,
@@ -24,10 +33,75 @@ class Flashcard:
         # Card statistics.
         self.n_attempts = int(attempts) if attempts else 0
         self.n_correct = int(correct) if correct else 0
-        self.last_shown = datetime.datetime.strptime(
-            last_shown.strip(),
-            '%Y-%m-%d %H:%M:%S.%f'
-        ) if last_shown else None
+        self.timestamp = (
+            self.parse_timestamp(last_shown)
+            if last_shown else
+            None
+        )
+
+    @staticmethod
+    def parse_timestamp(last_shown):
+        """Parse a last shown time.
+
+        Args:
+            last_shown (str): ISO-format UTC date-time, as in deck files.
+                Whole seconds may leave out the microseconds.
+
+        Returns:
+            (int): Microseconds since the epoch.
+
+        Raises:
+            ValueError: last_shown is not a date-time, or has a time zone.
+        """
+        last_shown = last_shown.strip()
+        try:
+            # Much faster than strptime(), for the timestamps of whole decks.
+            t = datetime.datetime.fromisoformat(last_shown)
+        except ValueError:
+            # Before Python 3.11, fractions of other than 3 or 6 digits.
+            t = datetime.datetime.strptime(
+                last_shown,
+                '%Y-%m-%d %H:%M:%S' + ('.%f' if '.' in last_shown else '')
+            )
+        if t.tzinfo is not None:
+            raise ValueError(
+                'Last shown time has a time zone: {}'.format(last_shown)
+            )
+
+        return (t - _EPOCH) // _MICROSECOND
+
+    @staticmethod
+    def format_timestamp(timestamp):
+        """Format a last shown time, as in deck files.
+
+        Args:
+            timestamp (int): Microseconds since the epoch, or None.
+
+        Returns:
+            (str): ISO-format UTC date-time, with microseconds, or '' if
+                timestamp is None.
+        """
+        if timestamp is None:
+            return ''
+
+        return (_EPOCH + timestamp * _MICROSECOND).isoformat(
+            ' ',
+            'microseconds'
+        )
+
+    @property
+    def last_shown(self):
+        """UTC time the card was last shown (datetime)."""
+        t = self.timestamp
+        return _EPOCH + t * _MICROSECOND if isinstance(t, int) else t
+
+    @last_shown.setter
+    def last_shown(self, value):
+        self.timestamp = (
+            (value - _EPOCH) // _MICROSECOND
+            if isinstance(value, datetime.datetime) else
+            value
+        )
 
     def __eq__(self, other):
         result = (
@@ -36,13 +110,21 @@ class Flashcard:
             self.answer == other.answer and
             self.n_attempts == other.n_attempts and
             self.n_correct == other.n_correct and
-            self.last_shown == other.last_shown
+            self.timestamp == other.timestamp
         )
 
         return result
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(
+            (
+                self.question,
+                self.answer,
+                self.n_attempts,
+                self.n_correct,
+                self.timestamp
+            )
+        )
 
     def __str__(self):
         return '{question}, {answer}, {attempts}, {correct}, {last}'.format(
@@ -66,4 +148,4 @@ class Flashcard:
 
     @staticmethod
     def headers():
-        return 'Question, Answer, Attempts, Correct, Last Shown'
\ No newline at end of file
+        return 'Question, Answer, Attempts, Correct, Last Shown'
@@ -0,0 +1,176 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import unicodedata
+
+
+def normalize(answer):
+    """Normalize an answer for grading.
+
+    Unicode compatibility characters are folded (NFKC), case is folded, and
+    runs of whitespace become single spaces, with none at either end.
+
+    Args:
+        answer (str): answer.
+
+    Returns:
+        (str): normalized answer.
+    """
+    if not answer:
+        return ''
+
+    return ' '.join(unicodedata.normalize('NFKC', answer).casefold().split())
+
+
+class AnswerPattern:
+    """Precompiled fill-in-the-blank answer.
+
+    Answers match if they are equal once normalized (see normalize()), or if
+    typos are allowed, within a bounded edit (Levenshtein) distance. The edit
+    distance is computed with Myers' bit-parallel algorithm, from a bitmask of
+    the positions of each character in the answer that is built once, when
+    the pattern is compiled, so each check is one pass over the submitted
+    answer.
+    """
+    __slots__ = ('text', 'typos', '_peq')
+
+    def __init__(self, answer, max_typos=0):
+        """
+        Args:
+            answer (str): correct answer.
+            max_typos (int): Maximum edit distance of a matching answer. It is
+                reduced for short answers (see allowed_typos()).
+        """
+        self.text = normalize(answer)
+        self.typos = self.allowed_typos(self.text, max_typos)
+        self._peq = self._positions(self.text) if self.typos else None
+
+    @staticmethod
+    def allowed_typos(text, max_typos):
+        """Typos allowed in an answer.
+
+        One typo per 4 characters, up to max_typos, so short answers (like
+        numbers) must be exact.
+
+        Args:
+            text (str): normalized correct answer.
+            max_typos (int): Maximum number of typos.
+
+        Returns:
+            (int): Number of typos allowed.
+        """
+        return min(max_typos, len(text) // 4)
+
+    def match(self, answer):
+        """Does an answer match?
+
+        Args:
+            answer (str): submitted answer.
+
+        Returns:
+            (bool): True -> matches. False -> does not match.
+        """
+        if not isinstance(answer, str):
+            return False
+
+        answer = normalize(answer)
+        if answer == self.text:
+            return True
+
+        if not self.typos or abs(len(answer) - len(self.text)) > self.typos:
+            return False
+
+        return self.distance(answer, self.typos) <= self.typos
+
+    def distance(self, answer, bound=None):
+        """Edit distance from the correct answer.
+
+        Args:
+            answer (str): normalized answer.
+            bound (int): Stop early, and return more than bound, once the
+                distance must exceed it.
+
+        Returns:
+            (int): Levenshtein distance between the normalized correct answer
+                and answer.
+        """
+        m = len(self.text)
+        if m == 0:
+            return len(answer)
+
+        peq = self._peq or self._positions(self.text)
+        mask = (1 << m) - 1
+        high = 1 << (m - 1)
+        pv = mask  # Vertical deltas of +1.
+        mv = 0  # Vertical deltas of -1.
+        score = m
+        remaining = len(answer)
+        for c in answer:
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+            if ph & high:
+                score += 1
+            elif mh & high:
+                score -= 1
+
+            # Shift in the first row of the distance matrix (0, 1, 2, ...).
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+
+            remaining -= 1
+            if bound is not None and score - remaining > bound:
+                return score - remaining
+
+        return score
+
+    @staticmethod
+    def _positions(text):
+        """Bitmask of the positions of each character in text."""
+        peq = {}
+        for i, c in enumerate(text):
+            peq[c] = peq.get(c, 0) | 1 << i
+
+        return peq
+
+
+class AnswerMatcher:
+    """Grades fill-in-the-blank answers to the cards of a deck.
+
+    Each card's answer is compiled into an AnswerPattern the first time the
+    card is graded, and kept for the rest of the session.
+    """
+    def __init__(self, max_typos=0):
+        """
+        Args:
+            max_typos (int): Maximum typos in a correct answer.
+        """
+        self.max_typos = max_typos
+        self._patterns = {}  # Card index: AnswerPattern.
+
+    def match(self, idx, correct_answer, answer):
+        """Grade an answer to a card.
+
+        Args:
+            idx (int): index of the card in the deck.
+            correct_answer (str): the card's answer.
+            answer (str): submitted answer.
+
+        Returns:
+            (bool): True -> correct. False -> incorrect.
+        """
+        pattern = self._patterns.get(idx)
+        if pattern is None:
+            pattern = self._patterns[idx] = AnswerPattern(
+                correct_answer,
+                self.max_typos
+            )
+
+        return pattern.match(answer)
@@ -0,0 +1,181 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+from collections import namedtuple
+import csv
+import locale
+import logging
+import os
+import shutil
+import tempfile
+from lib.filelock import FileLock
+
+_logger = logging.getLogger(__name__)
+
+
+Record = namedtuple(
+    'Record',
+    ['index', 'question', 'attempts', 'correct', 'timestamp']
+)
+
+
+class Journal:
+    """Append-only log of answers to the cards of a deck file.
+
+    Each answer is a small record of the change to a card's statistics, so the
+    cost of persisting a quiz is proportional to the number of answers, not the
+    size of the deck. Deck.load() replays the journal on top of the deck file,
+    and Deck.save() folds it back in.
+
+    Any number of processes may append to the same journal. Each write opens
+    the journal and appends under the deck file's exclusive FileLock, so
+    writes never interleave, and never go to a journal that another process
+    has just folded into the deck file.
+    """
+    extension = '.journal'
+
+    def __init__(self, deck_filename):
+        """
+        Args:
+            deck_filename (str): Path to the journaled deck file.
+        """
+        self.deck_filename = deck_filename
+        self.filename = self.journal_filename(deck_filename)
+
+    @classmethod
+    def journal_filename(cls, deck_filename):
+        """Path to the journal of a deck file."""
+        return deck_filename + cls.extension
+
+    @staticmethod
+    def record(idx, card, correct):
+        """Journal record of an answer.
+
+        Args:
+            idx (int): index of the answered card in the deck.
+            card (Flashcard): the answered card, after tallying the answer.
+            correct (bool): the answer was correct.
+
+        Returns:
+            (Record): the answer's record.
+        """
+        return Record(idx, card.question, 1, int(correct), card.timestamp)
+
+    def append(self, idx, card, correct):
+        """Record an answer.
+
+        Args:
+            idx (int): index of the answered card in the deck.
+            card (Flashcard): the answered card, after tallying the answer.
+            correct (bool): the answer was correct.
+        """
+        self.write([self.record(idx, card, correct)])
+
+    def write(self, records):
+        """Append records to the journal.
+
+        Args:
+            records (iterable): Records to append.
+        """
+        with FileLock(self.deck_filename):
+            with open(self.filename, mode='a', newline='') as f:
+                csv.writer(f).writerows(records)
+
+    def size(self):
+        """Length of the journal, in bytes. Taken under the deck file's
+        FileLock, it marks the end of the records written so far."""
+        try:
+            return os.path.getsize(self.filename)
+        except FileNotFoundError:
+            return 0
+
+    def records(self, end=None):
+        """Read the journal.
+
+        Args:
+            end (int): Only read the records before this size() of the
+                journal. Defaults to the whole journal.
+
+        Yields:
+            record (Record): answers recorded in the journal, oldest first.
+        """
+        try:
+            f = open(self.filename, mode='rb')
+        except FileNotFoundError:
+            return
+
+        encoding = locale.getpreferredencoding(False)
+
+        def lines(f):
+            """Decoded lines of f, up to end."""
+            offset = 0
+            for line in f:
+                offset += len(line)
+                if end is not None and offset > end:
+                    return
+                yield line.decode(encoding)
+
+        with f:
+            for row in csv.reader(lines(f)):
+                try:
+                    idx, question, attempts, correct, timestamp = row
+                    yield Record(
+                        int(idx),
+                        question,
+                        int(attempts),
+                        int(correct),
+                        int(timestamp) if timestamp else None
+                    )
+
+                except ValueError:
+                    # A torn write from an interrupted session.
+                    _logger.warning(
+                        'Ignoring malformed record in %s: %s',
+                        self.filename,
+                        row
+                    )
+
+    def clear(self):
+        """Delete the journal."""
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+
+    def discard(self, end):
+        """Delete the records before a size() of the journal, keeping the
+        records written since. Call under the deck file's exclusive FileLock.
+
+        Args:
+            end (int): size() of the journal when the records to delete were
+                read.
+        """
+        try:
+            with open(self.filename, mode='rb') as f:
+                f.seek(end)
+                rest = f.read()
+        except FileNotFoundError:
+            return
+
+        if not rest:
+            self.clear()
+            return
+
+        f = tempfile.NamedTemporaryFile(
+            mode='wb',
+            dir=os.path.dirname(os.path.abspath(self.filename)),
+            prefix='.' + os.path.basename(self.filename),
+            delete=False
+        )
+        try:
+            with f:
+                f.write(rest)
+            shutil.copymode(self.filename, f.name)
+            os.replace(f.name, self.filename)
+        except BaseException:
+            if os.path.exists(f.name):
+                os.remove(f.name)
+            raise
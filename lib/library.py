@@ -0,0 +1,339 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+from collections import namedtuple
+import concurrent.futures
+import glob
+import itertools
+import logging
+import os
+import sqlite3
+from lib.deck import Deck
+from lib.flashcard import Flashcard
+from lib.journal import Journal
+from lib.quiz import Quiz
+from lib.store import SqliteStore
+
+_logger = logging.getLogger(__name__)
+
+
+DeckEntry = namedtuple(
+    'DeckEntry',
+    ['name', 'path', 'mtime', 'cards', 'hard', 'medium', 'easy']
+)
+ImportResult = namedtuple('ImportResult', ['imported', 'errors'])
+
+
+class Library:
+    """SQLite index of the decks in a directory.
+
+    The index holds each deck's name, path, modification time, and number of
+    cards in each difficulty tier, so decks can be listed and summarized
+    without opening them. refresh() only re-parses the deck files (or
+    journals) that changed since they were indexed.
+    """
+    index_basename = '.flashcards.sqlite'
+    deck_patterns = ('*.deck.csv', '*' + SqliteStore.extension)
+
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS decks (
+            path TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            journal_mtime_ns INTEGER NOT NULL,
+            cards INTEGER NOT NULL,
+            hard INTEGER NOT NULL,
+            medium INTEGER NOT NULL,
+            easy INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS decks_name ON decks (name);
+    '''
+
+    def __init__(self, directory, index_filename=None):
+        """
+        Args:
+            directory (str): Path to decks directory.
+            index_filename (str): Path to index. Defaults to a hidden file in
+                directory.
+        """
+        self.directory = os.path.abspath(directory)
+        self.index_filename = index_filename or os.path.join(
+            self.directory,
+            self.index_basename
+        )
+        self._db = sqlite3.connect(self.index_filename)
+        self._db.executescript(self._schema)
+
+    def close(self):
+        """Close the index."""
+        self._db.close()
+
+    def refresh(self):
+        """Bring the index up to date with the directory.
+
+        Returns:
+            (int): Number of decks that were (re-)indexed.
+        """
+        indexed = {
+            path: key
+            for path, *key in self._db.execute(
+                'SELECT path, mtime_ns, size, journal_mtime_ns FROM decks'
+            )
+        }
+
+        updated = 0
+        with self._db:
+            for path in sorted(
+                path
+                for pattern in self.deck_patterns
+                for path in glob.glob(os.path.join(self.directory, pattern))
+            ):
+                key = self._file_key(path)
+                if key is not None and list(key) == indexed.pop(path, None):
+                    continue
+
+                if key is not None and self._index(path, key):
+                    updated += 1
+                else:
+                    self._db.execute(
+                        'DELETE FROM decks WHERE path = ?',
+                        (path,)
+                    )
+
+            # Decks that are gone.
+            self._db.executemany(
+                'DELETE FROM decks WHERE path = ?',
+                ((path,) for path in indexed)
+            )
+
+        _logger.info('Indexed %d decks in %s.', updated, self.directory)
+        return updated
+
+    def import_decks(
+        self,
+        source,
+        workers=None,
+        overwrite=False,
+        batch_size=100
+    ):
+        """Import the csv decks of another directory into the library.
+
+        Decks are validated and normalized in parallel worker processes (see
+        normalize_deck()), and written to the library directory. The index
+        is updated in batches of batch_size decks, one transaction per
+        batch.
+
+        Args:
+            source (str): Path to directory of decks to import.
+            workers (int): Number of worker processes. Defaults to the number
+                of CPUs.
+            overwrite (bool): Replace decks already in the library.
+            batch_size (int): Decks per index transaction.
+
+        Returns:
+            (ImportResult): Number of decks imported, and an error message for
+                each deck that was not.
+
+        Raises:
+            ValueError: source is the library directory.
+        """
+        source = os.path.abspath(source)
+        if source == self.directory:
+            raise ValueError('Cannot import decks into their own directory.')
+
+        paths = sorted(glob.glob(os.path.join(source, self.deck_patterns[0])))
+        workers = workers or os.cpu_count() or 1
+        imported = 0
+        errors = []
+        batch = []
+
+        def flush():
+            with self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO decks '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    batch
+                )
+            del batch[:]
+
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            for row, error in pool.map(
+                _import_deck,
+                paths,
+                itertools.repeat(self.directory),
+                itertools.repeat(overwrite),
+                chunksize=max(1, len(paths) // (4 * workers))
+            ):
+                if error is not None:
+                    _logger.warning('%s', error)
+                    errors.append(error)
+                    continue
+
+                batch.append(row)
+                imported += 1
+                if len(batch) >= batch_size:
+                    flush()
+
+        if batch:
+            flush()
+
+        _logger.info(
+            'Imported %d decks from %s into %s.',
+            imported,
+            source,
+            self.directory
+        )
+        return ImportResult(imported, errors)
+
+    def decks(self, name=None):
+        """Indexed decks.
+
+        Args:
+            name (str): Only decks whose names contain this, ignoring case.
+
+        Returns:
+            (list): DeckEntry of each deck, sorted by name.
+        """
+        query = (
+            'SELECT name, path, mtime_ns, cards, hard, medium, easy '
+            'FROM decks'
+        )
+        params = ()
+        if name:
+            query += " WHERE name LIKE ? ESCAPE '\\'"
+            params = ('%{}%'.format(self._escape(name)),)
+
+        return [
+            DeckEntry(*row)
+            for row in self._db.execute(query + ' ORDER BY name, path', params)
+        ]
+
+    def _index(self, path, key):
+        """Parse and index a deck file.
+
+        Returns:
+            (bool): True -> indexed. False -> not a deck file.
+        """
+        try:
+            deck = Deck.load(path)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            _logger.warning('Not indexing %s: %s', path, e)
+            return False
+
+        hard, medium, easy = Quiz.tier_counts(*deck.stats())
+        self._db.execute(
+            'INSERT OR REPLACE INTO decks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, deck.name, *key, len(deck), hard, medium, easy)
+        )
+        return True
+
+    @staticmethod
+    def _file_key(path):
+        """Modification key of a deck file and its journal, or None if the
+        deck file is gone."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        try:
+            journal_mtime = os.stat(
+                Journal.journal_filename(path)
+            ).st_mtime_ns
+        except OSError:
+            journal_mtime = 0
+
+        return st.st_mtime_ns, st.st_size, journal_mtime
+
+    @staticmethod
+    def _escape(pattern):
+        """Escape LIKE wildcards."""
+        return (
+            pattern
+            .replace('\\', '\\\\')
+            .replace('%', '\\%')
+            .replace('_', '\\_')
+        )
+
+
+def normalize_deck(filename):
+    """Read a csv deck file, normalizing its cards.
+
+    Rows without a question are dropped. Cells are stripped, attempt and
+    correct counts that are blank or not natural numbers become 0, correct
+    counts are capped at the attempt count, and unreadable last shown times
+    are cleared.
+
+    Args:
+        filename (str): Path to deck file.
+
+    Returns:
+        name, cards (str, list): Deck name, and Flashcards.
+
+    Raises:
+        ValueError: filename is not a valid deck.
+    """
+    def count(cell):
+        try:
+            return max(0, int(cell))
+        except ValueError:
+            return 0
+
+    name, rows = Deck.read_rows(filename)
+    cards = []
+    for question, answer, attempts, correct, last_shown in (
+        row[:5] for row in rows
+    ):
+        if not question.strip():
+            continue
+
+        card = Flashcard(question, answer)
+        card.n_attempts = count(attempts)
+        card.n_correct = min(count(correct), card.n_attempts)
+        try:
+            card.timestamp = (
+                Flashcard.parse_timestamp(last_shown)
+                if last_shown.strip() else
+                None
+            )
+        except ValueError:
+            card.timestamp = None
+
+        cards.append(card)
+
+    return name, cards
+
+
+def _import_deck(filename, directory, overwrite):
+    """Import a deck into a library directory. Runs in a worker process.
+
+    Returns:
+        row, error (tuple, str): The deck's index row, or an error message.
+    """
+    dest = os.path.join(directory, os.path.basename(filename))
+    try:
+        name, cards = normalize_deck(filename)
+        Deck.write_file(dest, name, cards, overwrite)
+        hard, medium, easy = Quiz.tier_counts(
+            [c.n_attempts for c in cards],
+            [c.n_correct for c in cards]
+        )
+        return (
+            (
+                dest,
+                name,
+                *Library._file_key(dest),
+                len(cards),
+                hard,
+                medium,
+                easy
+            ),
+            None
+        )
+
+    except (OSError, ValueError) as e:
+        return None, 'Not importing {}: {}'.format(filename, e)
@@ -0,0 +1,201 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import asyncio
+import json
+import random
+import time
+from lib.quiz import QuizTypes
+
+
+class Client:
+    """Minimal HTTP/JSON client for QuizServer, on one keep-alive
+    connection."""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=None):
+        """Make a request.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Request path.
+            body (object): JSON request body.
+
+        Returns:
+            status, payload (int, object): HTTP status, and JSON response.
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host,
+                self.port
+            )
+
+        data = b'' if body is None else json.dumps(body).encode()
+        self._writer.write(
+            (
+                '{} {} HTTP/1.1\r\n'
+                'Host: {}:{}\r\n'
+                'Content-Type: application/json\r\n'
+                'Content-Length: {}\r\n'
+                '\r\n'
+            ).format(
+                method,
+                path,
+                self.host,
+                self.port,
+                len(data)
+            ).encode('latin-1') + data
+        )
+        await self._writer.drain()
+
+        status = int((await self._reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if not line.strip():
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip().lower()
+
+        payload = json.loads(
+            (
+                await self._reader.readexactly(
+                    int(headers.get('content-length', 0))
+                )
+            ).decode()
+        )
+        if headers.get('connection') == 'close':
+            self.close()
+
+        return status, payload
+
+    def close(self):
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+async def _run_session(client, deck, cards, quiz_type, latencies):
+    """Play one quiz session, answering at random.
+
+    Returns:
+        answered, failed (int, int): Number of questions answered, and of
+            failed requests.
+    """
+    async def timed(method, path, body=None):
+        start = time.perf_counter()
+        status, payload = await client.request(method, path, body)
+        latencies.append(time.perf_counter() - start)
+        return status, payload
+
+    status, state = await timed(
+        'POST',
+        '/sessions',
+        {'deck': deck, 'cards': cards, 'type': quiz_type}
+    )
+    if status != 200:
+        return 0, 1
+
+    answered = 0
+    session = '/sessions/{}'.format(state['session'])
+    while state['question'] is not None:
+        question = state['question']
+        answer = (
+            random.randrange(len(question['answers']))
+            if quiz_type == QuizTypes.multiple_choice else
+            'answer'
+        )
+        status, state = await timed('POST', session + '/answer', {
+            'answer': answer
+        })
+        if status != 200:
+            return answered, 1
+        answered += 1
+
+    # The last answer ended the session.
+    return answered, 0
+
+
+async def run_load(
+    host,
+    port,
+    deck,
+    sessions=1000,
+    duration=10.0,
+    cards=20,
+    quiz_type=QuizTypes.fill_in_the_blank
+):
+    """Play many concurrent quiz sessions against a QuizServer.
+
+    Each simulated user plays sessions back to back on its own connection,
+    until duration has passed.
+
+    Args:
+        host (str): Server host.
+        port (int): Server port.
+        deck (str): Deck file to quiz, in the server's decks directory.
+        sessions (int): Number of concurrent sessions.
+        duration (float): Seconds to run for.
+        cards (int): Questions per session.
+        quiz_type (QuizTypes): Quiz type.
+
+    Returns:
+        (dict): Requests, errors, duration (s), requests per second,
+            questions (answered) per second, and p50, p99, and maximum request
+            latency (ms).
+    """
+    latencies = []
+    answers = [0]
+    errors = [0]
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        client = Client(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                answered, failed = await _run_session(
+                    client,
+                    deck,
+                    cards,
+                    quiz_type,
+                    latencies
+                )
+                answers[0] += answered
+                errors[0] += failed
+
+        except (OSError, EOFError, ValueError, IndexError):
+            errors[0] += 1
+
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return None
+        idx = min(len(latencies) - 1, int(p * len(latencies)))
+        return 1000 * latencies[idx]
+
+    return {
+        'sessions': sessions,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'duration': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'questions_per_second': answers[0] / elapsed,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'max_ms': 1000 * latencies[-1] if latencies else None,
+    }
@@ -0,0 +1,139 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import threading
+import time
+
+
+class _Timer:
+    """Context manager recording the time spent in its block."""
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.record(self._name, time.perf_counter() - self._start)
+
+
+class _NullTimer:
+    """Context manager that does nothing, for disabled metrics."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class Metrics:
+    """Counters and timers of the hot paths.
+
+    Metrics are disabled by default, and then cost an attribute check per
+    call: timer() returns a shared do-nothing context manager, and count()
+    and record() return immediately. Enabled metrics are thread safe.
+
+    Usage:
+        with metrics.timer('deck.load'):
+            ...
+        metrics.count('quiz.questions')
+    """
+    _null_timer = _NullTimer()
+
+    def __init__(self):
+        self.enabled = False
+        self._counters = {}
+        self._timers = {}  # Name: [count, total, min, max] seconds.
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        """Start (or stop) collecting metrics."""
+        self.enabled = enabled
+
+    def reset(self):
+        """Clear all metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def count(self, name, n=1):
+        """Add to a counter.
+
+        Args:
+            name (str): Counter name.
+            n (int): Amount to add.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def timer(self, name):
+        """Time a block.
+
+        Args:
+            name (str): Timer name.
+
+        Returns:
+            (context manager): Records the time spent in the with block.
+        """
+        return _Timer(self, name) if self.enabled else self._null_timer
+
+    def record(self, name, seconds):
+        """Record a time.
+
+        Args:
+            name (str): Timer name.
+            seconds (float): Time taken.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            t = self._timers.get(name)
+            if t is None:
+                self._timers[name] = [1, seconds, seconds, seconds]
+            else:
+                t[0] += 1
+                t[1] += seconds
+                t[2] = min(t[2], seconds)
+                t[3] = max(t[3], seconds)
+
+    def report(self):
+        """Metrics collected so far.
+
+        Returns:
+            (dict): JSON-serializable counters, and the number of calls,
+                total seconds, and mean, minimum, and maximum milliseconds of
+                each timer.
+        """
+        with self._lock:
+            return {
+                'counters': dict(sorted(self._counters.items())),
+                'timers': {
+                    name: {
+                        'count': count,
+                        'total_s': total,
+                        'mean_ms': 1000 * total / count,
+                        'min_ms': 1000 * low,
+                        'max_ms': 1000 * high,
+                    }
+                    for name, (count, total, low, high) in sorted(
+                        self._timers.items()
+                    )
+                },
+            }
+
+
+# Metrics of this process.
+metrics = Metrics()
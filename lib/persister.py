@@ -0,0 +1,222 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from lib.deck import Deck
+from lib.deck_cache import deck_cache
+from lib.journal import Journal, Record
+from lib.metrics import metrics
+
+_logger = logging.getLogger(__name__)
+
+
+class Persister:
+    """Write-behind persistence of quiz answers.
+
+    Answers are queued by record(), so the question/answer path never touches
+    the disk. A background thread merges the queued answers by card, appends
+    them to the deck's journal, and checkpoints the deck -- folds the journal
+    into the deck file -- every checkpoint_answers answers or
+    checkpoint_interval seconds. Pending answers are flushed to the journal by
+    close(), or at exit; the journal is left for the next checkpoint (of this
+    or any other quiz of the deck), or `flashcards.py compact`, to fold.
+
+    Answers are persisted through the deck file's store (see Deck.store()):
+    SQLite deck files need no journal, as the merged answers update the
+    answered cards' rows in place, and their checkpoints do nothing.
+
+    The persister's own writes to the deck file do not evict deck, the deck
+    whose answers it records, from the deck cache (see DeckCache.refresh()).
+    """
+    checkpoint_answers = 50
+    checkpoint_interval = 30.0  # seconds
+
+    _stop = object()  # Queue sentinel.
+
+    def __init__(
+        self,
+        deck_filename,
+        checkpoint_answers=None,
+        checkpoint_interval=None,
+        deck=None,
+        cache=None
+    ):
+        """
+        Args:
+            deck_filename (str): Path to deck file.
+            checkpoint_answers (int): Answers between checkpoints.
+            checkpoint_interval (float): Maximum seconds between an answer and
+                the checkpoint that includes it.
+            deck (Deck): Loaded deck that the recorded answers are applied to.
+            cache (DeckCache): Cache of loaded decks. Defaults to deck_cache.
+        """
+        self._deck_filename = deck_filename
+        self.deck = deck
+        self._cache = deck_cache if cache is None else cache
+        if checkpoint_answers is not None:
+            self.checkpoint_answers = checkpoint_answers
+        if checkpoint_interval is not None:
+            self.checkpoint_interval = checkpoint_interval
+
+        self._store = Deck.store(deck_filename)
+        self._journal = self._store.journal()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name='Persister({})'.format(deck_filename),
+            daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, idx, card, correct):
+        """Queue an answer for persistence.
+
+        Args:
+            idx (int): key of the answered card in the deck file (see
+                Deck.key()).
+            card (Flashcard): the answered card, after tallying the answer.
+            correct (bool): the answer was correct.
+        """
+        self._queue.put([Journal.record(idx, card, correct)])
+
+    def record_many(self, answers):
+        """Queue a batch of answers for persistence, to be written together.
+
+        Args:
+            answers (iterable): (idx, card, correct) of each answer, as taken
+                by record().
+        """
+        records = [Journal.record(*answer) for answer in answers]
+        if records:
+            self._queue.put(records)
+
+    def close(self):
+        """Journal all queued answers, and stop the background thread."""
+        if self._closed:
+            return
+
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(self._stop)
+        self._thread.join()
+
+    def _run(self):
+        """Background thread: journal answers, and checkpoint the deck."""
+        uncheckpointed = 0
+        deadline = None
+        running = True
+        while running:
+            # Wait for answers, or the checkpoint deadline.
+            timeout = (
+                None
+                if deadline is None else
+                max(0.0, deadline - time.monotonic())
+            )
+            try:
+                batches = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                batches = []
+
+            # Take everything else that is waiting.
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self._stop in batches:
+                batches.remove(self._stop)
+                running = False
+
+            records = [r for batch in batches for r in batch]
+
+            try:
+                if records:
+                    with metrics.timer('persister.write'):
+                        self._persist(
+                            self._journal.write,
+                            self._merge(records)
+                        )
+                    metrics.count('persister.answers', len(records))
+                    uncheckpointed += len(records)
+                    if deadline is None:
+                        deadline = (
+                            time.monotonic() + self.checkpoint_interval
+                        )
+
+                if uncheckpointed and (
+                    uncheckpointed >= self.checkpoint_answers or
+                    time.monotonic() >= deadline
+                ):
+                    with metrics.timer('persister.checkpoint'):
+                        self._persist(self._checkpoint)
+                    uncheckpointed = 0
+                    deadline = None
+
+            except Exception:
+                _logger.exception(
+                    'Failed to persist answers to %s.',
+                    self._deck_filename
+                )
+
+        self._store.close()
+
+    def _persist(self, step, *args):
+        """Run a step that may change the deck file, keeping self.deck cached
+        across it.
+
+        Args:
+            step (callable): Called with args.
+        """
+        deck = self.deck
+        try:
+            key = Deck._file_key(self._deck_filename)
+        except OSError:
+            key = None
+
+        step(*args)
+
+        if deck is not None and key is not None:
+            self._cache.refresh(self._deck_filename, key, deck)
+
+    def _checkpoint(self):
+        """Fold the journal into the deck file.
+
+        The checkpoint is built from the deck file and journal on disk, not
+        the in-memory deck, so it never races the question/answer path.
+        """
+        _logger.debug('Checkpointing %s.', self._deck_filename)
+        self._store.checkpoint()
+
+    @staticmethod
+    def _merge(records):
+        """Merge answers to the same card.
+
+        Args:
+            records (list): Records, oldest first.
+
+        Returns:
+            (list): One record per card.
+        """
+        merged = {}
+        for r in records:
+            key = r.index, r.question
+            m = merged.get(key)
+            merged[key] = r if m is None else Record(
+                r.index,
+                r.question,
+                m.attempts + r.attempts,
+                m.correct + r.correct,
+                r.timestamp
+            )
+
+        return list(merged.values())
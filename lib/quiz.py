@@ -6,15 +6,29 @@ Licensed under the BSD 3-clause License. See LICENSE.txt or
 """
 from collections import namedtuple
 import logging
+import numbers
 import random
-import itertools
+import time
 from lib.data_types import Const
 from lib.deck import Deck
+from lib.deck_cache import deck_cache
+from lib.distractors import DistractorIndex
+from lib.grader import AnswerMatcher
+from lib.metrics import metrics
+from lib.persister import Persister
+from lib.sampler import Tier, TierSampler
+from lib.scheduler import Scheduler
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 _logger = logging.getLogger(__name__)
 
 
-Question = namedtuple('Question', ['question', 'answers', 'submit'])
+Question = namedtuple('Question', ['question', 'answers', 'submit', 'id'])
+Grades = namedtuple('Grades', ['results', 'correct', 'attempts'])
 Sorted = namedtuple('Sorted', ['hard', 'medium', 'easy'])
 
 
@@ -25,8 +39,26 @@ class QuizTypes(Const):
 
 
 class Quiz:
-    """Flashcard quiz model."""
-    def __init__(self, deck, hard_weight=1, medium_weight=1, easy_weight=1):
+    """Flashcard quiz model.
+
+    A quiz is a session that may be run for any number of rounds. The deck is
+    loaded once and kept in memory between rounds, and answers are persisted
+    in the background until the session is closed.
+    """
+    def __init__(
+        self,
+        deck,
+        hard_weight=1,
+        medium_weight=1,
+        easy_weight=1,
+        tiers=None,
+        randomize=False,
+        spaced=False,
+        loaded=None,
+        persister=None,
+        typos=0,
+        shared=None
+    ):
         """
         Args:
             deck (str): Path to deck file.
@@ -36,21 +68,71 @@ class Quiz:
                 to medium flashcards.
             easy_weight (int): Favor (with respect to other weights) to give to
                 easy flashcards.
+            tiers (sequence): Difficulty Tiers, hardest first, to use instead
+                of hard, medium, and easy.
+            randomize (bool): Choose tiers at random in proportion to their
+                weights, instead of in a weighted round robin.
+            spaced (bool): Deal the cards that are due for repetition,
+                instead of sampling difficulty tiers.
+            loaded (Deck): The deck file, already loaded, to share with other
+                quizzes. Defaults to the deck_cache's copy.
+            persister (Persister): Persister of the deck file to share with
+                other quizzes. Closing the quiz does not close it.
+            typos (int): Typos allowed in fill-in-the-blank answers (see
+                AnswerPattern).
+            shared (Quiz): Quiz of the same loaded deck and tiers whose
+                difficulty tiers, multiple choice answers, and compiled
+                fill-in-the-blank answers to share instead of classifying,
+                indexing, and compiling the deck again. Cards answered in
+                either quiz move tiers in both. Spaced quizzes do not share
+                tiers.
         """
-        self._hard_correct_percentage = 0.75
-        self._medium_correct_percentage = 0.90
-
-        self._hard_correct_answers = 5
-        self._medium_correct_answers = 10
+        self._tiers = tiers or self.default_tiers(
+            hard_weight,
+            medium_weight,
+            easy_weight
+        )
 
         self._deck_name = deck
-        self._deck = Deck.load(deck)
-        self._decks = Sorted(*self._sort_deck(self._deck))
-        self._weights = Sorted(hard_weight, medium_weight, easy_weight)
+        self._deck = deck_cache.load(deck) if loaded is None else loaded
+        if spaced:
+            self._scheduler = Scheduler(
+                *self._deck.stats(),
+                self._deck.timestamps()
+            )
+            self._decks = self._sampler = None
+
+        elif shared is not None:
+            self._scheduler = None
+            self._decks = shared._decks
+            self._sampler = shared._sampler
+
+        else:
+            self._scheduler = None
+            self._decks = self._sort_deck(self._deck)
+            self._sampler = TierSampler(
+                self._decks,
+                [t.weight for t in self._tiers],
+                randomize
+            )
+
+        # Session state, built as needed by the first round that uses it.
+        self._persister = persister
+        self._owns_persister = persister is None
+        self._all_answers = None if shared is None else shared._all_answers
+        self._distractor_index = (
+            None if shared is None else shared._distractor_index
+        )
+        # AnswerMatchers by typos allowed.
+        self._matchers = {} if shared is None else shared._matchers
+        self._matcher = self._matchers.get(typos)
+        if self._matcher is None:
+            self._matcher = self._matchers[typos] = AnswerMatcher(typos)
+
         self._attempts = 0
         self._correct = 0
 
-    def run(self, card_count, quiz_type, selections=None):
+    def run(self, card_count, quiz_type, selections=None, near_miss=False):
         """Run quiz.
 
         Generator of questions based on cards in the deck.
@@ -59,6 +141,8 @@ class Quiz:
             card_count (int): Number of questions in run.
             quiz_type (QuizType): Quiz type.
             selections (int): Maximum number of selections if multiple choice.
+            near_miss (bool): Offer wrong multiple choice answers that are
+                close to the correct answer, instead of random ones.
 
         Yields:
             (Question):
@@ -71,13 +155,17 @@ class Quiz:
             Returns:
                 correct, answer_set (int, str): correct answer and answer set.
             """
-            remaining_answers = [
-                a
-                for a in (all_answers - frozenset([card.answer]))
-            ]
-            answer_set = (
-                [card.answer] +
-                random.sample(remaining_answers, selections - 1)
+            answer_set = [card.answer] + (
+                self._distractor_index.distractors(
+                    card.answer,
+                    selections - 1
+                )
+                if near_miss else
+                QuizTools.sample_distractors(
+                    self._all_answers,
+                    card.answer,
+                    selections - 1
+                )
             )
             random.shuffle(answer_set)
             correct = answer_set.index(card.answer)
@@ -88,7 +176,7 @@ class Quiz:
 
             Answers to multiple choice question must be an integer corresponding
             to the list index of the selection. Answers to fill-in-the-blank
-            questions are strings.
+            questions are strings, graded ignoring case and spacing.
 
             Args:
                 answer (int or str):
@@ -99,48 +187,180 @@ class Quiz:
                     incorrect.), and the correct answer.
 
             """
-            if answer == correct_answer:
-                card.correct()
-                self._correct += 1
-                result = True
-
-            else:
-                card.incorrect()
-                result = False
-
-            self._attempts += 1
+            with metrics.timer('quiz.submit'):
+                result = (
+                    answer == correct_answer
+                    if quiz_type == QuizTypes.multiple_choice else
+                    self._matcher.match(idx, correct_answer, answer)
+                )
+                self._tally(idx, card, result)
+                self._persister.record(self._deck.key(idx), card, result)
             return result, correct_answer
 
         # Execution starts here. ###############################################
         _logger.info(
-            'Running quiz {name} as a {number} question {type}.'.format(
-                name=self._deck_name,
-                number=card_count,
-                type=quiz_type
-            )
+            'Running quiz %s as a %s question %s.',
+            self._deck_name,
+            card_count,
+            quiz_type
         )
 
+        self.reset()
+        self.prepare(quiz_type, near_miss)
+        self._open_persister()
+
+        # Question latency: dealing the card, and building the question.
+        timing = metrics.enabled
+        start = time.perf_counter() if timing else 0.0
+        for idx, card in self._deck_runner(card_count):
+            question = card.question
+            correct_answer, answers = (
+                (card.answer, None)
+                if quiz_type == QuizTypes.fill_in_the_blank else
+                multiple_choice_answers()
+            )
+
+            if timing:
+                metrics.record('quiz.question', time.perf_counter() - start)
+            yield Question(question, answers, submit, idx)
+            if timing:
+                start = time.perf_counter()
+
+    def prepare(self, quiz_type, near_miss=False):
+        """Do the whole-deck work of a round, unless it is already done.
+
+        run() prepares its rounds itself. Preparing ahead of time moves the
+        work out of the first question, e.g. to another thread.
+
+        Args:
+            quiz_type (QuizType): Quiz type.
+            near_miss (bool): as in run().
+        """
+        # Distinct answers, indexed once per session for distractor sampling.
+        if quiz_type == QuizTypes.multiple_choice:
+            if near_miss and self._distractor_index is None:
+                self._distractor_index = DistractorIndex.load(
+                    self._deck_name,
+                    self._deck.answers
+                )
+            elif not near_miss and self._all_answers is None:
+                self._all_answers = tuple(self._deck.answers())
+
+        if self._sampler is not None:
+            self._sampler.index()
+
+    def grade(self, answers):
+        """Grade a batch of fill-in-the-blank answers.
+
+        The batch is graded as one round, and all its answers are persisted
+        together.
+
+        Args:
+            answers (iterable): (question id, answer) pairs. Question ids are
+                the ids of the Questions yielded by run().
+
+        Returns:
+            (Grades): The result of each answer (True -> correct. False ->
+                incorrect. None -> no such question), and the number of
+                questions answered correctly and attempted, as in score().
+        """
+        self.reset()
+        self._open_persister()
+
+        with metrics.timer('quiz.grade'):
+            results = []
+            answered = []
+            n_cards = len(self._deck)
+            for idx, answer in answers:
+                if not (
+                    isinstance(idx, numbers.Integral) and 0 <= idx < n_cards
+                ):
+                    results.append(None)
+                    continue
+
+                idx = int(idx)
+
+                card = self._deck.card(idx)
+                result = self._matcher.match(idx, card.answer, answer)
+                self._tally(idx, card, result)
+                results.append(result)
+                answered.append((self._deck.key(idx), card, result))
+
+            self._persister.record_many(answered)
+
+        metrics.count('quiz.graded', len(results))
+        return Grades(results, self._correct, self._attempts)
+
+    def _tally(self, idx, card, result):
+        """Tally an answer to a card, and update its tier or schedule."""
+        if result:
+            card.correct()
+            self._correct += 1
+        else:
+            card.incorrect()
+
+        self._attempts += 1
+        if self._scheduler is not None:
+            self._scheduler.reschedule(idx, card)
+        else:
+            self._sampler.move(
+                idx,
+                self._tier_of(card.n_correct, card.n_attempts)
+            )
+
+    def _open_persister(self):
+        """Start persisting answers, unless the session already has."""
+        # Answers are persisted in the background, until the session closes.
+        if self._persister is None:
+            self._persister = Persister(self._deck_name, deck=self._deck)
+
+    def reset(self):
+        """Start a new round, clearing the score."""
         self._correct = self._attempts = 0
 
-        all_answers = (
-            self._deck.answers()
-            if quiz_type == QuizTypes.multiple_choice else
-            None
+    def close(self):
+        """End the session, persisting all answers."""
+        if self._persister is not None and self._owns_persister:
+            self._persister.close()
+            self._persister = None
+
+    @staticmethod
+    def default_tiers(hard_weight=1, medium_weight=1, easy_weight=1):
+        """Hard, medium, and easy difficulty tiers.
+
+        Args:
+            hard_weight (int): Favor to give to hard flashcards.
+            medium_weight (int): Favor to give to medium flashcards.
+            easy_weight (int): Favor to give to easy flashcards.
+
+        Returns:
+            (Sorted): the tiers.
+        """
+        return Sorted(
+            Tier('hard', 5, 0.75, hard_weight),
+            Tier('medium', 10, 0.90, medium_weight),
+            Tier('easy', None, None, easy_weight)
         )
 
-        try:
-            for card in self._deck_runner(card_count):
-                question = card.question
-                correct_answer, answers = (
-                    (card.answer, None)
-                    if quiz_type == QuizTypes.fill_in_the_blank else
-                    multiple_choice_answers()
-                )
+    @classmethod
+    def tier_counts(cls, attempts, correct, tiers=None):
+        """Number of cards in each difficulty tier.
 
-                yield Question(question, answers, submit)
+        Args:
+            attempts (sequence): number of attempts of each card.
+            correct (sequence): number of correct answers of each card.
+            tiers (sequence): Difficulty tiers, hardest first. Defaults to
+                hard, medium, and easy.
 
-        finally:
-            self._deck.save(self._deck_name, overwrite=True)
+        Returns:
+            (list): Number of cards in each tier.
+        """
+        tiers = tiers or cls.default_tiers()
+        counts = [0] * len(tiers)
+        for a, c in zip(attempts, correct):
+            counts[cls._classify(tiers, c, a)] += 1
+
+        return counts
 
     def name(self):
         """Quiz name"""
@@ -162,115 +382,196 @@ class Quiz:
             n_cards (int): number of cards to run through.
 
         Yields:
-            card (Flashcard): card from the deck.
+            idx, card (int, Flashcard): index of card in the deck, and the
+                card.
         """
+        if self._scheduler is not None:
+            # Deal one at a time, so answered cards are rescheduled before the
+            # next card is chosen.
+            for _ in range(
+                len(self._deck) if n_cards == 'all' else n_cards
+            ):
+                with metrics.timer('quiz.sample'):
+                    idx = self._scheduler.next()
+                if idx is None:
+                    return
+
+                yield idx, self._deck.card(idx)
+
+            return
+
         # Combine cards into quiz deck based on queue weights.
-        deck = (
-            [c for c in self._deck]
-            if n_cards == 'all' else
-            [
-                c
-                for _, c in itertools.takewhile(
-                    lambda x: x[0] < n_cards,
-                    enumerate(self._card_generator())
-                )
-            ]
-        )
+        with metrics.timer('quiz.sample'):
+            deck = (
+                list(range(len(self._deck)))
+                if n_cards == 'all' else
+                self._sampler.draw(n_cards)
+            )
 
-        random.shuffle(deck)
+            random.shuffle(deck)
 
-        # Iterate.
-        for card in deck:
-            yield card
+        # Iterate. Cards are only built as they are dealt.
+        for idx in deck:
+            yield idx, self._deck.card(idx)
 
     def _card_generator(self):
         """Card generator.
 
-        Selects cards from the deck based on the card weights (hard, medium and
-        easy). Shuffles them, then deals them.
+        Selects cards from the deck based on the tier weights (e.g. hard,
+        medium and easy), and deals them.
 
         Yields:
             card (Flashcard): card from the deck.
         """
-        def get_card(idx, deck):
-            """Get a card from the specified deck.
+        while True:
+            batch = self._sampler.draw(1)
+            if not batch:
+                return
 
-            Return the specified card from the passed in deck. If the last card
-            from the deck has been gotten, shuffle the deck and start over.
+            yield self._deck.card(batch[0])
 
-            Args:
-                idx (int): index of card to return.
-                deck (list): flashcards in the deck.
+    def _sort_deck(self, deck):
+        """Sort the deck into difficulty tiers (e.g. hard, medium, and easy).
 
-            Returns:
-                c, idx (Flashcard, int): The next card, and the index to get
-                    from next time.
-            """
-            if idx == 0:
-                random.shuffle(deck)
+        Sorting works on the deck's card statistics, so no cards are built.
+        If NumPy is available, the whole deck is classified in one vectorized
+        pass.
 
-            c = deck[idx]
-            idx += 1
-            if idx >= len(deck):
-                idx = 0
+        Args:
+            deck (Deck): deck to sort
 
-            return c, idx
+        Returns:
+            (tuple): Indices of the cards in each tier (lists, or NumPy
+                arrays).
+        """
+        with metrics.timer('quiz.classify'):
+            attempts, correct = deck.stats()
+            tiers = (
+                self._sort_stats(attempts, correct)
+                if numpy is None else
+                self._sort_stats_vectorized(attempts, correct)
+            )
 
-        # Make copies to play with.
-        hard_deck = self._decks.hard[:]
-        medium_deck = self._decks.medium[:]
-        easy_deck = self._decks.easy[:]
-        hard_idx = medium_idx = easy_idx = 0
+        for tier, cards in zip(self._tiers, tiers):
+            _logger.info('%d %s cards in deck.', len(cards), tier.name)
+        _logger.info('%d total cards in deck.', len(deck))
 
-        while True:
-            if len(hard_deck) > 0:
-                for _ in range(self._weights.hard):
-                    card, hard_idx = get_card(hard_idx, hard_deck)
-                    yield card
+        return tiers
 
-            if len(medium_deck) > 0:
-                for _ in range(self._weights.medium):
-                    card, medium_idx = get_card(medium_idx, medium_deck)
-                    yield card
+    def _sort_stats(self, attempts, correct):
+        """Sort card statistics into difficulty tiers.
 
-            if len(easy_deck) > 0:
-                for _ in range(self._weights.easy):
-                    card, easy_idx = get_card(easy_idx, easy_deck)
-                    yield card
+        Args:
+            attempts (sequence): number of attempts of each card.
+            correct (sequence): number of correct answers of each card.
 
-    def _sort_deck(self, deck):
-        """Sort the deck into hard, medium, and easy cards.
+        Returns:
+            (tuple): Lists of the indices of the cards in each tier.
+        """
+        tiers = tuple([] for _ in self._tiers)
+        for idx, (a, c) in enumerate(zip(attempts, correct)):
+            tiers[self._tier_of(c, a)].append(idx)
+
+        return tiers
+
+    def _sort_stats_vectorized(self, attempts, correct):
+        """NumPy version of _sort_stats().
 
         Args:
-            deck (Deck): deck to sort
+            attempts (sequence): number of attempts of each card.
+            correct (sequence): number of correct answers of each card.
+
+        Returns:
+            (tuple): Arrays of the indices of the cards in each tier.
+        """
+        attempts = numpy.asarray(attempts, dtype=numpy.int64)
+        correct = numpy.asarray(correct, dtype=numpy.int64)
+
+        tiers = []
+        unsorted = numpy.ones(len(attempts), dtype=bool)
+        for tier in self._tiers[:-1]:
+            in_tier = numpy.zeros(len(attempts), dtype=bool)
+            if tier.correct_answers is not None:
+                in_tier |= correct < tier.correct_answers
+            if tier.correct_percentage is not None:
+                in_tier |= QuizTools.correct_below_threshold_vectorized(
+                    correct,
+                    attempts,
+                    tier.correct_percentage
+                )
+            if self._catch_all(tier):
+                in_tier[:] = True
+            in_tier &= unsorted
+
+            tiers.append(numpy.flatnonzero(in_tier))
+            unsorted &= ~in_tier
+
+        tiers.append(numpy.flatnonzero(unsorted))
+        return tuple(tiers)
+
+    def _tier_of(self, correct, attempts):
+        """Difficulty tier of a card with these statistics.
+
+        Args:
+            correct (int): number of correct answers.
+            attempts (int): number of attempts.
 
         Returns:
-            hard, medium, easy (list, list, list): Cards sorted into three
-                sets.
+            (int): index of the card's tier. Cards that fit no tier are in the
+                last one.
         """
-        hard = []
-        medium = []
-        easy = []
-        for c in deck:
-            if self._is_hard(c):
-                hard.append(c)
-            elif self._is_medium(c):
-                medium.append(c)
-            else:
-                easy.append(c)
-
-        _logger.info('{} hard cards in deck.'.format(len(hard)))
-        _logger.info('{} medium cards in deck.'.format(len(medium)))
-        _logger.info('{} easy cards in deck.'.format(len(easy)))
-        _logger.info('{} total cards in deck.'.format(len(deck)))
-
-        return hard, medium, easy
+        return self._classify(self._tiers, correct, attempts)
+
+    @staticmethod
+    def _classify(tiers, correct, attempts):
+        """Difficulty tier of a card with these statistics, among tiers."""
+        for t, tier in enumerate(tiers[:-1]):
+            if Quiz._in_tier(tier, correct, attempts):
+                return t
+
+        return len(tiers) - 1
+
+    @staticmethod
+    def _in_tier(tier, correct, attempts):
+        """Do these card statistics meet the thresholds of a tier?
+
+        Args:
+            tier (Tier): difficulty tier.
+            correct (int): number of correct answers.
+            attempts (int): number of attempts.
+
+        Returns:
+            (boolean): True -> In tier. False -> Not in tier.
+        """
+        if Quiz._catch_all(tier):
+            return True
+
+        return (
+            (
+                tier.correct_answers is not None and
+                correct < tier.correct_answers
+            ) or
+            (
+                tier.correct_percentage is not None and
+                QuizTools.correct_below_threshold(
+                    correct,
+                    attempts,
+                    tier.correct_percentage
+                )
+            )
+        )
+
+    @staticmethod
+    def _catch_all(tier):
+        """Does a tier hold every card, having no thresholds?"""
+        return tier.correct_answers is None and tier.correct_percentage is None
 
     def _is_hard(self, card):
         """Is card of hard difficulty?
 
-        Hard difficulty is defined by having a correct percentage of no more
-        than self._hard_correct_percentage.
+        Hard difficulty is defined by meeting the thresholds of the first
+        tier: by default, having fewer than 5 correct answers, or a correct
+        percentage of no more than 75%.
 
         Args:
             card (Flashcard): card to classify.
@@ -278,21 +579,16 @@ class Quiz:
         Returns:
             (boolean): True -> Hard. False -> Not hard.
         """
-        return (
-            card.n_correct < self._hard_correct_answers or
-            QuizTools.correct_below_threshold(
-                card.n_correct,
-                card.n_attempts,
-                self._hard_correct_percentage
-            )
-        )
+        return self._in_tier(self._tiers[0], card.n_correct, card.n_attempts)
 
     def _is_medium(self, card):
         """Is card of medium difficulty?
 
-        Medium difficulty is defined by having a correct percentage of no more
-        than self._medium_correct_percentage or having fewer than
-        self._medium_correct_answers correct answers.
+        Medium difficulty is defined by meeting the thresholds of the second
+        tier: by default, having fewer than 10 correct answers, or a correct
+        percentage of no more than 90%. The age of a card since its last
+        attempt is left to spaced quizzes, which deal cards as they fall due
+        (see Scheduler).
 
         Args:
             card (Flashcard): card to classify.
@@ -300,15 +596,7 @@ class Quiz:
         Returns:
             (boolean): True -> Medium. False -> Not medium.
         """
-        return (
-            card.n_correct < self._medium_correct_answers or
-            QuizTools.correct_below_threshold(
-                card.n_correct,
-                card.n_attempts,
-                self._medium_correct_percentage
-                # TODO: Add age of card since last attempt.
-            )
-        )
+        return self._in_tier(self._tiers[1], card.n_correct, card.n_attempts)
 
 
 class QuizTools:
@@ -324,4 +612,56 @@ class QuizTools:
         Returns:
             (bool): True => at or below threshold.
         """
-        return attempts == 0 or (correct / attempts) <= threshold
\ No newline at end of file
+        return attempts == 0 or (correct / attempts) <= threshold
+
+    @staticmethod
+    def sample_distractors(answers, answer, k):
+        """Sample wrong answers for a multiple choice question.
+
+        Distractors are drawn by rejection sampling, so the cost is
+        proportional to k, not to the number of answers -- unless the answers
+        are too few for rejection sampling to be efficient, in which case
+        they are sampled directly.
+
+        Args:
+            answers (sequence): Distinct answers to sample from.
+            answer (str): Correct answer, which is never sampled.
+            k (int): Number of distractors.
+
+        Returns:
+            (list): Up to k distinct answers other than answer.
+        """
+        n = len(answers)
+        if n < 2 * (k + 1):
+            remaining = [a for a in answers if a != answer]
+            return random.sample(remaining, min(k, len(remaining)))
+
+        distractors = []
+        chosen = {answer}
+        while len(distractors) < k:
+            a = answers[random.randrange(n)]
+            if a not in chosen:
+                chosen.add(a)
+                distractors.append(a)
+
+        return distractors
+
+    @staticmethod
+    def correct_below_threshold_vectorized(correct, attempts, threshold):
+        """NumPy version of correct_below_threshold().
+
+        Args:
+             correct (ndarray): number correct of each card.
+             attempts (ndarray): number of attempts of each card.
+             threshold (float): threshold.
+
+        Returns:
+            (ndarray): Boolean array. True => at or below threshold.
+        """
+        ratio = numpy.divide(
+            correct,
+            attempts,
+            out=numpy.zeros(len(attempts)),
+            where=attempts != 0
+        )
+        return (attempts == 0) | (ratio <= threshold)
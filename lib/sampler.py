@@ -0,0 +1,215 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+from collections import namedtuple
+import array
+import random
+
+
+Tier = namedtuple(
+    'Tier',
+    ['name', 'correct_answers', 'correct_percentage', 'weight']
+)
+Tier.__doc__ = """Difficulty tier of cards.
+
+A card is in the first tier for which it has fewer than correct_answers
+correct answers, or a correct percentage of no more than correct_percentage.
+A tier whose thresholds are both None holds every remaining card.
+"""
+
+
+class AliasTable:
+    """Weighted random choice in O(1), using Vose's alias method."""
+    def __init__(self, weights):
+        """
+        Args:
+            weights (sequence): Non-negative weight of each choice. At least
+                one weight must be positive.
+
+        Raises:
+            ValueError: No positive weights.
+        """
+        n = len(weights)
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError('No positive weights.')
+
+        self._probability = [0.0] * n
+        self._alias = list(range(n))
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            g = large.pop()
+            self._probability[s] = scaled[s]
+            self._alias[s] = g
+            scaled[g] += scaled[s] - 1.0
+            (small if scaled[g] < 1.0 else large).append(g)
+
+        for i in small + large:
+            self._probability[i] = 1.0
+
+    def draw(self):
+        """Weighted random choice.
+
+        Returns:
+            (int): index of the chosen weight.
+        """
+        i = random.randrange(len(self._probability))
+        return i if random.random() < self._probability[i] else self._alias[i]
+
+
+class TierSampler:
+    """Deals card indices from tiers of cards, favoring tiers by weight.
+
+    Tiers are chosen in a weighted round robin (hard weight times from the
+    first tier, then medium weight times from the second, and so on), or at
+    random in proportion to their weights. Each tier deals its cards in a
+    random order without repeats until it runs out, then starts over, using an
+    incremental Fisher-Yates shuffle, so every draw is O(1).
+
+    Cards can be moved between tiers in O(1) with move(), once every card's
+    tier and position are indexed by index() (or the first move).
+    """
+    def __init__(self, tiers, weights, randomize=False):
+        """
+        Args:
+            tiers (sequence): Card indices of each tier. The sampler reorders
+                them in place.
+            weights (sequence): Weight of each tier. Weights must be integers,
+                unless randomize is set.
+            randomize (bool): Choose tiers at random, instead of round robin.
+        """
+        self._tiers = list(tiers)
+        self._weights = weights
+        self._cursors = [0] * len(tiers)
+        self._randomize = randomize
+
+        # Tier and position in tier of each card, built by index().
+        self._tier_of = None
+        self._position = None
+
+        self._refresh()
+
+    def __len__(self):
+        return sum(len(t) for t in self._tiers)
+
+    def tiers(self):
+        """Card indices of each tier (in no particular order)."""
+        return tuple(self._tiers)
+
+    def draw(self, k):
+        """Deal a batch of cards.
+
+        Args:
+            k (int): Number of cards.
+
+        Returns:
+            (list): k card indices, or none if there are no cards to deal.
+        """
+        if not self._schedule:
+            return []
+
+        return [self._deal(self._next_tier()) for _ in range(k)]
+
+    def move(self, idx, t):
+        """Move a card to a tier.
+
+        Args:
+            idx (int): card index.
+            t (int): index of the card's new tier.
+        """
+        self.index()
+        old = self._tier_of[idx]
+        if old == t:
+            return
+
+        self._remove(old, idx)
+        tier = self._tiers[t]
+        self._tier_of[idx] = t
+        self._position[idx] = len(tier)
+        tier.append(idx)
+
+        if len(tier) == 1 or not self._tiers[old]:
+            self._refresh()
+
+    def _refresh(self):
+        """Rebuild the tier schedule, when tiers gain or lose all cards."""
+        live = [
+            (t, w)
+            for t, w in enumerate(self._weights)
+            if w > 0 and len(self._tiers[t]) > 0
+        ]
+        self._live = [t for t, _ in live]
+        self._schedule_idx = 0
+        if self._randomize:
+            self._schedule = self._live
+            self._alias = AliasTable([w for _, w in live]) if live else None
+        else:
+            self._schedule = [t for t, w in live for _ in range(w)]
+            self._alias = None
+
+    def index(self):
+        """Index the tier and position of every card, once."""
+        if self._position is not None:
+            return
+
+        self._tiers = [
+            t.tolist() if hasattr(t, 'tolist') else list(t)
+            for t in self._tiers
+        ]
+        n = 1 + max((max(t) for t in self._tiers if t), default=-1)
+        self._tier_of = array.array('h', [-1]) * n
+        self._position = array.array('q', [0]) * n
+        for t, tier in enumerate(self._tiers):
+            for p, idx in enumerate(tier):
+                self._tier_of[idx] = t
+                self._position[idx] = p
+
+    def _next_tier(self):
+        """Choose the tier to deal from."""
+        if self._randomize:
+            return self._live[self._alias.draw()]
+
+        t = self._schedule[self._schedule_idx]
+        self._schedule_idx = (self._schedule_idx + 1) % len(self._schedule)
+        return t
+
+    def _deal(self, t):
+        """Deal the next card of a tier."""
+        tier = self._tiers[t]
+        i = self._cursors[t]
+        self._swap(tier, i, random.randrange(i, len(tier)))
+        self._cursors[t] = (i + 1) % len(tier)
+        return tier[i]
+
+    def _remove(self, t, idx):
+        """Remove a card from a tier.
+
+        Keeps the tier's dealt cards before its cursor, and the cards still to
+        be dealt in this pass after it.
+        """
+        tier = self._tiers[t]
+        p = self._position[idx]
+        if p < self._cursors[t]:
+            # Replace the card with the last dealt card, and un-deal its slot.
+            self._cursors[t] -= 1
+            self._swap(tier, p, self._cursors[t])
+            p = self._cursors[t]
+
+        self._swap(tier, p, len(tier) - 1)
+        tier.pop()
+        if self._cursors[t] >= len(tier):
+            self._cursors[t] = 0
+
+    def _swap(self, tier, i, j):
+        """Swap two cards of a tier."""
+        tier[i], tier[j] = tier[j], tier[i]
+        if self._position is not None:
+            self._position[tier[i]] = i
+            self._position[tier[j]] = j
@@ -0,0 +1,104 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import heapq
+
+
+class Scheduler:
+    """Spaced repetition scheduler.
+
+    Each card is due some time after it was last shown. The better a card is
+    known -- the more correct answers, and the higher its correct percentage
+    -- the longer until it is due again. Cards that have never been shown are
+    due first.
+
+    Cards are kept in a min-heap of due times, so the next card is found in
+    O(log n), and an answered card is rescheduled in O(log n). Superseded heap
+    entries are skipped when they surface.
+    """
+    base_interval = 60 * 1000000  # One minute, in microseconds.
+    growth = 2.0  # Interval growth per correct answer.
+    max_growth_steps = 20
+
+    def __init__(self, attempts, correct, timestamps):
+        """
+        Args:
+            attempts (sequence): number of attempts of each card.
+            correct (sequence): number of correct answers of each card.
+            timestamps (sequence): last shown time of each card, in
+                microseconds since the epoch, or None if never shown.
+        """
+        self._due = [
+            self.due(a, c, t)
+            for a, c, t in zip(attempts, correct, timestamps)
+        ]
+        self._heap = [(due, idx) for idx, due in enumerate(self._due)]
+        heapq.heapify(self._heap)
+        self._outstanding = None
+
+    def __len__(self):
+        return len(self._due)
+
+    @classmethod
+    def due(cls, attempts, correct, timestamp):
+        """Due time of a card.
+
+        Args:
+            attempts (int): number of attempts.
+            correct (int): number of correct answers.
+            timestamp (int): last shown time in microseconds since the epoch,
+                or None if never shown.
+
+        Returns:
+            (int): due time in microseconds since the epoch.
+        """
+        if timestamp is None or attempts == 0:
+            return 0
+
+        interval = (
+            cls.base_interval *
+            cls.growth ** min(correct, cls.max_growth_steps) *
+            (correct / attempts) ** 2
+        )
+        return timestamp + int(interval)
+
+    def next(self):
+        """Deal the card that is due soonest.
+
+        A card stays dealt until it is rescheduled. If it is not rescheduled
+        before the next card is dealt, it keeps its place.
+
+        Returns:
+            (int): index of card in the deck, or None if there are no cards.
+        """
+        if self._outstanding is not None:
+            heapq.heappush(
+                self._heap,
+                (self._due[self._outstanding], self._outstanding)
+            )
+            self._outstanding = None
+
+        while self._heap:
+            due, idx = heapq.heappop(self._heap)
+            if due == self._due[idx]:
+                self._outstanding = idx
+                return idx
+
+        return None
+
+    def reschedule(self, idx, card):
+        """Reschedule a card after it was answered.
+
+        Args:
+            idx (int): index of card in the deck.
+            card (Flashcard): the card.
+        """
+        if self._outstanding == idx:
+            self._outstanding = None
+
+        due = self.due(card.n_attempts, card.n_correct, card.timestamp)
+        self._due[idx] = due
+        heapq.heappush(self._heap, (due, idx))
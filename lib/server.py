@@ -0,0 +1,449 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import asyncio
+from collections import OrderedDict
+import glob
+import http
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import urllib.parse
+from lib.deck_cache import deck_cache
+from lib.persister import Persister
+from lib.quiz import Quiz, QuizTypes
+from lib.store import SqliteStore
+
+_logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    """Request failed with an HTTP status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _SharedDeck:
+    """A loaded deck, and the state that all its sessions share."""
+    def __init__(self, filename, deck, persister):
+        self.filename = filename
+        self.deck = deck
+        self.persister = persister
+        self.prepared = {}  # Quiz type: future of the prepared shared quiz.
+        self._quiz = None
+        self._lock = threading.Lock()
+
+    def prepare(self, quiz_type):
+        """Quiz whose difficulty tiers and answers the sessions share,
+        prepared for a quiz type. Runs in the executor, since it classifies
+        and indexes the whole deck.
+
+        Returns:
+            (Quiz): the shared quiz.
+        """
+        with self._lock:
+            if self._quiz is None:
+                self._quiz = Quiz(
+                    self.filename,
+                    loaded=self.deck,
+                    persister=self.persister
+                )
+            self._quiz.prepare(quiz_type)
+            return self._quiz
+
+
+class _Session:
+    """A client's quiz, and its current question."""
+    def __init__(self, quiz, quiz_type, questions):
+        self.quiz = quiz
+        self.quiz_type = quiz_type
+        self.questions = questions
+        self.question = next(questions, None)
+        self.last_used = time.monotonic()
+
+    def state(self):
+        """JSON state of the session."""
+        q = self.question
+        correct, attempts = self.quiz.score()
+        return {
+            'question': None if q is None else {
+                'id': int(q.id),
+                'question': q.question,
+                'answers': q.answers,
+            },
+            'score': [correct, attempts],
+        }
+
+
+class QuizServer:
+    """HTTP/JSON quiz server.
+
+    Serves quiz sessions over the decks in a directory, all in one asyncio
+    event loop. Sessions on the same deck share one loaded deck from the deck
+    cache, one persister that writes their answers in the background, and
+    one classification of the deck's cards into difficulty tiers (and index
+    of its answers). Decks are loaded, classified, and indexed in the default
+    executor, so file I/O and whole-deck work never block the event loop.
+
+    A session ends when its last question is answered, or when it is
+    deleted. Sessions idle for session_timeout seconds, and the least
+    recently used sessions beyond max_sessions, are ended whenever a session
+    starts.
+
+    Routes:
+        GET /decks -- Deck files that can be quizzed.
+        POST /sessions -- Start a session. Body: {"deck": deck file, "cards":
+            number of questions or "all", "type": quiz type, "selections":
+            number of multiple choice answers, "typos": typos allowed in
+            fill-in-the-blank answers}.
+        GET /sessions/<id> -- Current question, and score.
+        POST /sessions/<id>/answer -- Answer the current question. Body:
+            {"answer": answer}.
+        DELETE /sessions/<id> -- End a session.
+    """
+    deck_patterns = ('*.deck.csv', '*' + SqliteStore.extension)
+    max_body = 64 * 1024
+    session_timeout = 30 * 60.0  # seconds
+    max_sessions = 10000
+
+    def __init__(
+        self,
+        directory,
+        cache=None,
+        session_timeout=None,
+        max_sessions=None
+    ):
+        """
+        Args:
+            directory (str): Path to decks directory.
+            cache (DeckCache): Cache of loaded decks. Defaults to deck_cache.
+            session_timeout (float): Seconds before an idle session ends.
+            max_sessions (int): Maximum number of sessions.
+        """
+        self.directory = os.path.abspath(directory)
+        self._cache = deck_cache if cache is None else cache
+        if session_timeout is not None:
+            self.session_timeout = session_timeout
+        if max_sessions is not None:
+            self.max_sessions = max_sessions
+
+        self._loading = {}  # Deck filename: future of loaded Deck.
+        self._decks = {}  # Deck filename: _SharedDeck.
+        self._sessions = OrderedDict()  # Least recently used first.
+
+    async def start(self, host='127.0.0.1', port=8080):
+        """Start serving.
+
+        Returns:
+            (asyncio.Server): the server.
+        """
+        server = await asyncio.start_server(self._handle, host, port)
+        _logger.info(
+            'Serving %s on %s.',
+            self.directory,
+            ', '.join(
+                '{}:{}'.format(*s.getsockname()[:2])
+                for s in server.sockets
+            )
+        )
+        return server
+
+    async def close(self):
+        """End all sessions, and persist their answers."""
+        self._sessions.clear()
+        persisters = [shared.persister for shared in self._decks.values()]
+        self._decks.clear()
+        loop = asyncio.get_running_loop()
+        for persister in persisters:
+            await loop.run_in_executor(None, persister.close)
+
+    async def _handle(self, reader, writer):
+        """Serve the requests of one connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+
+                keep_alive = await self._respond(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def _respond(self, request_line, reader, writer):
+        """Read one request, and write its response.
+
+        Returns:
+            (bool): Keep the connection alive.
+        """
+        keep_alive = False
+        try:
+            try:
+                method, target, version = (
+                    request_line.decode('latin-1').split()
+                )
+            except ValueError:
+                raise HTTPError(400, 'Malformed request line.')
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip().lower()
+
+            connection = headers.get('connection', '')
+            keep_alive = (
+                connection != 'close'
+                if version == 'HTTP/1.1' else
+                connection == 'keep-alive'
+            )
+
+            try:
+                length = int(headers.get('content-length', 0))
+            except ValueError:
+                raise HTTPError(400, 'Bad Content-Length.')
+            if not 0 <= length <= self.max_body:
+                keep_alive = False
+                raise HTTPError(413, 'Request body too large.')
+
+            body = await reader.readexactly(length) if length else b''
+            status, payload = 200, await self._dispatch(method, target, body)
+
+        except HTTPError as e:
+            status, payload = e.status, {'error': str(e)}
+
+        except Exception:
+            _logger.exception('Failed to serve %s', request_line)
+            keep_alive = False
+            status, payload = 500, {'error': 'Internal server error.'}
+
+        data = json.dumps(payload).encode()
+        writer.write(
+            (
+                'HTTP/1.1 {} {}\r\n'
+                'Content-Type: application/json\r\n'
+                'Content-Length: {}\r\n'
+                'Connection: {}\r\n'
+                '\r\n'
+            ).format(
+                status,
+                http.HTTPStatus(status).phrase,
+                len(data),
+                'keep-alive' if keep_alive else 'close'
+            ).encode('latin-1') + data
+        )
+        return keep_alive
+
+    async def _dispatch(self, method, target, body):
+        """Route a request.
+
+        Returns:
+            (object): JSON response.
+
+        Raises:
+            HTTPError: the request failed.
+        """
+        path = urllib.parse.urlsplit(target).path.strip('/').split('/')
+        if body:
+            try:
+                body = json.loads(body.decode())
+            except ValueError:
+                raise HTTPError(400, 'Body is not JSON.')
+            if not isinstance(body, dict):
+                raise HTTPError(400, 'Body is not a JSON object.')
+        else:
+            body = {}
+
+        if path == ['decks']:
+            self._allow(method, 'GET')
+            return await asyncio.get_running_loop().run_in_executor(
+                None,
+                self._deck_files
+            )
+
+        if path == ['sessions']:
+            self._allow(method, 'POST')
+            return await self._start_session(body)
+
+        if len(path) in (2, 3) and path[0] == 'sessions':
+            session = self._sessions.get(path[1])
+            if session is None:
+                raise HTTPError(404, 'No such session.')
+
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(path[1])
+            if len(path) == 3 and path[2] == 'answer':
+                self._allow(method, 'POST')
+                state = self._answer(session, body)
+                if session.question is None:
+                    self._end(path[1])
+                return state
+
+            if len(path) == 2:
+                self._allow(method, 'GET', 'DELETE')
+                if method == 'DELETE':
+                    self._end(path[1])
+                return session.state()
+
+        raise HTTPError(404, 'No such resource.')
+
+    async def _start_session(self, body):
+        """Start a quiz session."""
+        basename = body.get('deck')
+        cards = body.get('cards', 20)
+        quiz_type = body.get('type', QuizTypes.fill_in_the_blank)
+        selections = body.get('selections', 4)
+        typos = body.get('typos', 0)
+        if not (
+            isinstance(basename, str) and
+            os.path.basename(basename) == basename and
+            any(basename.endswith(p[1:]) for p in self.deck_patterns)
+        ):
+            raise HTTPError(400, 'Name a deck file in the decks directory.')
+        if not (cards == 'all' or isinstance(cards, int) and cards >= 0):
+            raise HTTPError(400, 'cards must be a natural number, or "all".')
+        if quiz_type not in QuizTypes.all():
+            raise HTTPError(400, 'Unknown quiz type.')
+        if not (isinstance(selections, int) and selections > 1):
+            raise HTTPError(400, 'selections must be more than 1.')
+        if not (isinstance(typos, int) and typos >= 0):
+            raise HTTPError(400, 'typos must be a natural number.')
+
+        filename = os.path.join(self.directory, basename)
+        deck = await self._load(filename)
+        shared = self._decks.get(filename)
+        if shared is None or shared.deck is not deck:
+            # The deck file changed, and was loaded again.
+            persister = (
+                Persister(filename, cache=self._cache)
+                if shared is None else
+                shared.persister
+            )
+            persister.deck = deck
+            shared = self._decks[filename] = _SharedDeck(
+                filename,
+                deck,
+                persister
+            )
+
+        future = shared.prepared.get(quiz_type)
+        if future is None:
+            future = shared.prepared[quiz_type] = (
+                asyncio.get_running_loop().run_in_executor(
+                    None,
+                    shared.prepare,
+                    quiz_type
+                )
+            )
+
+        quiz = Quiz(
+            filename,
+            loaded=deck,
+            persister=shared.persister,
+            typos=typos,
+            shared=await future
+        )
+        session_id = secrets.token_hex(8)
+        session = _Session(
+            quiz,
+            quiz_type,
+            quiz.run(cards, quiz_type, selections)
+        )
+        if session.question is not None:
+            self._expire()
+            self._sessions[session_id] = session
+
+        state = session.state()
+        state.update(session=session_id, name=quiz.name())
+        return state
+
+    def _end(self, session_id):
+        """End a session."""
+        self._sessions.pop(session_id).quiz.close()
+
+    def _expire(self):
+        """End idle sessions, and least recently used sessions, to make room
+        for a new session."""
+        idle = time.monotonic() - self.session_timeout
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if (
+                session.last_used > idle and
+                len(self._sessions) < self.max_sessions
+            ):
+                break
+
+            _logger.debug('Ending idle session %s.', session_id)
+            self._end(session_id)
+
+    async def _load(self, filename):
+        """Load a deck file from the cache, once for all the sessions that
+        start while it is loading."""
+        future = self._loading.get(filename)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._loading[filename] = loop.run_in_executor(
+                None,
+                self._cache.load,
+                filename
+            )
+            future.add_done_callback(
+                lambda f: self._loading.pop(filename, None)
+            )
+
+        try:
+            return await future
+        except (OSError, ValueError) as e:
+            raise HTTPError(404, 'Cannot load {}: {}'.format(filename, e))
+
+    @staticmethod
+    def _answer(session, body):
+        """Answer a session's current question, and move to the next."""
+        if session.question is None:
+            raise HTTPError(409, 'The quiz is over.')
+
+        answer = body.get('answer')
+        if session.quiz_type == QuizTypes.multiple_choice:
+            if not (
+                isinstance(answer, int) and
+                0 <= answer < len(session.question.answers)
+            ):
+                raise HTTPError(400, 'answer must be the index of a choice.')
+        elif not isinstance(answer, str):
+            raise HTTPError(400, 'answer must be a string.')
+
+        result, correct_answer = session.question.submit(answer)
+        session.question = next(session.questions, None)
+
+        state = session.state()
+        state.update(correct=result, answer=correct_answer)
+        return state
+
+    def _deck_files(self):
+        """Deck files in the decks directory."""
+        return sorted(
+            os.path.basename(path)
+            for pattern in self.deck_patterns
+            for path in glob.glob(os.path.join(self.directory, pattern))
+        )
+
+    @staticmethod
+    def _allow(method, *methods):
+        """Reject methods that a route does not allow."""
+        if method not in methods:
+            raise HTTPError(405, 'Use {}.'.format(' or '.join(methods)))
@@ -0,0 +1,384 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import array
+import errno
+import os
+import sqlite3
+import sys
+import threading
+from lib.flashcard import Flashcard
+
+
+class DeckStore:
+    """Format of a deck file.
+
+    Deck reads and writes each deck file through the store for the file's
+    format (see Deck.store()), and Persister persists answers through it.
+    Stores are opened on first use, and hold their file open until closed.
+    """
+    extension = ''
+
+    def __init__(self, filename):
+        """
+        Args:
+            filename (str): Path to deck file.
+        """
+        self.filename = filename
+
+    @classmethod
+    def handles(cls, filename):
+        """Is filename a deck file of this format?"""
+        return filename.endswith(cls.extension)
+
+    def close(self):
+        """Close the deck file."""
+
+    def load(self, deck_class, cache=True, journal=True, correct_below=None):
+        """Load a deck. See Deck.load().
+
+        Args:
+            deck_class (type): Deck class to load.
+            cache (bool): Use (and maintain) any cache of the deck file.
+            journal (bool): Replay the deck file's journal.
+            correct_below (int): Only load cards with fewer correct answers.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        raise NotImplementedError
+
+    def read_name(self):
+        """Read the name of the deck without loading it.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        raise NotImplementedError
+
+    def iter_cards(self, journal=True):
+        """Stream the cards of the deck file. See Deck.iter_file().
+
+        Args:
+            journal (bool): Apply answers from the deck file's journal.
+
+        Yields:
+            card (Flashcard): cards of the deck, in order.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        raise NotImplementedError
+
+    def write_cards(self, name, cards):
+        """Replace the deck file with streamed cards. See Deck.write_file().
+
+        Args:
+            name (str): Deck name.
+            cards (iterable): Flashcards to write.
+        """
+        raise NotImplementedError
+
+    def save(self, deck, overwrite=False, cache=True):
+        """Save a loaded deck to the deck file. See Deck.save().
+
+        Args:
+            deck (Deck): Deck to save.
+            overwrite (bool): Overwrite existing file flag.
+            cache (bool): Refresh any cache of the saved file.
+
+        Raises:
+            ValueError: filename exists.
+        """
+        raise NotImplementedError
+
+    def journal(self):
+        """Where answers to the deck file's cards are persisted.
+
+        Returns:
+            (object): Has write(records), which persists journal Records.
+        """
+        raise NotImplementedError
+
+    def checkpoint(self):
+        """Fold answers persisted by journal() into the deck file."""
+
+
+class _StoreRows:
+    """Rows of a lazily loaded SQLite deck, read by index on demand."""
+    def __init__(self, store, keys):
+        """
+        Args:
+            store (SqliteStore): Deck file, held open by the deck.
+            keys (array): id of the card at each index.
+        """
+        self._store = store
+        self._keys = keys
+
+    def row(self, idx):
+        """Question and answer of a card."""
+        return self._store.row(self._keys[idx])
+
+    def nbytes(self):
+        """Approximate memory used by the rows, in bytes."""
+        return sys.getsizeof(self._keys)
+
+
+class SqliteStore(DeckStore):
+    """SQLite deck file.
+
+    Each card is a row keyed by its id, so an answer is persisted by updating
+    one row, and cards can be selected by their statistics without reading
+    the whole deck. Loaded decks only read the card statistics; each card's
+    question and answer are read when the card is dealt. Saving a deck over
+    the deck file it was loaded from only writes the cards that changed.
+
+    The store may be shared between threads.
+    """
+    extension = '.deck.db'
+
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS deck (
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cards (
+            id INTEGER PRIMARY KEY,
+            question TEXT,
+            answer TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            last_shown INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS cards_correct ON cards (correct);
+    '''
+
+    def __init__(self, filename):
+        """
+        Args:
+            filename (str): Path to deck file.
+        """
+        super().__init__(filename)
+        self._db = None
+        self._lock = threading.RLock()
+
+    def close(self):
+        """Close the deck file."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def name(self):
+        """Deck name.
+
+        Raises:
+            ValueError: filename is not a valid deck.
+        """
+        with self._lock:
+            row = self._connect().execute('SELECT name FROM deck').fetchone()
+        if row is None:
+            raise ValueError('{} not a deck file.'.format(self.filename))
+
+        return row[0]
+
+    read_name = name
+
+    def row(self, key):
+        """Question and answer of a card.
+
+        Args:
+            key (int): id of the card.
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT question, answer FROM cards WHERE id = ?',
+                (key,)
+            ).fetchall()
+
+        return rows[0] if rows else (None, None)
+
+    def rows(self):
+        """Read the cards.
+
+        Yields:
+            id, question, answer, attempts, correct, last_shown (int, str, str,
+                int, int, int): each card, in order. last_shown is in
+                microseconds since the epoch, or None if never shown.
+        """
+        yield from self._connect().execute(
+            'SELECT id, question, answer, attempts, correct, last_shown '
+            'FROM cards ORDER BY id'
+        )
+
+    def load(self, deck_class, cache=True, journal=True, correct_below=None):
+        """Load the card statistics, leaving the cards' rows to be read on
+        demand. See DeckStore.load()."""
+        name = self.name()
+        keys = array.array('q')
+        attempts = array.array('q')
+        correct = array.array('q')
+        last_shown = array.array('q')
+
+        query = 'SELECT id, attempts, correct, last_shown FROM cards'
+        params = ()
+        if correct_below is not None:
+            query += ' WHERE correct < ?'
+            params = (correct_below,)
+
+        with self._lock:
+            for key, a, c, t in self._connect().execute(
+                query + ' ORDER BY id',
+                params
+            ):
+                keys.append(key)
+                attempts.append(a)
+                correct.append(c)
+                last_shown.append(deck_class._never if t is None else t)
+
+        # The deck reads its rows through its own connection, which lives
+        # as long as the deck.
+        deck = deck_class._lazy(
+            name,
+            _StoreRows(SqliteStore(self.filename), keys),
+            attempts,
+            correct,
+            last_shown
+        )
+        deck._keys = array.array('q', keys)
+        deck._partial = correct_below is not None
+        deck._saved(self.filename)
+        return deck
+
+    def iter_cards(self, journal=True):
+        """Stream the cards. See DeckStore.iter_cards()."""
+        self.name()
+        for _, question, answer, attempts, correct, last_shown in self.rows():
+            card = Flashcard(question, answer, attempts, correct)
+            card.timestamp = last_shown
+            yield card
+
+    def write_cards(self, name, cards):
+        """Replace the deck, in one transaction.
+
+        Args:
+            name (str): Deck name.
+            cards (iterable): Flashcards. Each card's id is its index.
+        """
+        db = self._connect(create=True)
+        with self._lock, db:
+            db.execute('DELETE FROM deck')
+            db.execute('DELETE FROM cards')
+            db.execute('INSERT INTO deck VALUES (?)', (name,))
+            db.executemany(
+                'INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        idx,
+                        c.question,
+                        c.answer,
+                        c.n_attempts,
+                        c.n_correct,
+                        c.timestamp
+                    )
+                    for idx, c in enumerate(cards)
+                )
+            )
+
+    def save(self, deck, overwrite=False, cache=True):
+        """Save a deck. See DeckStore.save().
+
+        A deck saved over the deck file it was loaded from (or last saved to)
+        only updates the rows of its changed cards, and inserts its added
+        cards. Other decks replace the deck file.
+        """
+        if os.path.isfile(self.filename) and not overwrite:
+            raise ValueError('{} exists.'.format(self.filename))
+
+        if not deck._is_source(self.filename):
+            # Build the cards first, in case the deck reads its rows from
+            # this deck file.
+            self.write_cards(deck.name, list(deck))
+            deck._keys = array.array('q', range(len(deck)))
+            deck._saved(self.filename)
+            return
+
+        attempts, correct = deck.stats()
+        timestamps = deck.timestamps()
+        db = self._connect(create=True)
+        with self._lock, db:
+            db.execute('UPDATE deck SET name = ?', (deck.name,))
+            for idx in sorted(deck._dirty):
+                key = deck.key(idx)
+                if key < 0:
+                    card = deck.card(idx)
+                    deck._keys[idx] = db.execute(
+                        'INSERT INTO cards '
+                        '(question, answer, attempts, correct, last_shown) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (
+                            card.question,
+                            card.answer,
+                            attempts[idx],
+                            correct[idx],
+                            timestamps[idx]
+                        )
+                    ).lastrowid
+                else:
+                    db.execute(
+                        'UPDATE cards SET '
+                        'attempts = ?, correct = ?, last_shown = ? '
+                        'WHERE id = ?',
+                        (attempts[idx], correct[idx], timestamps[idx], key)
+                    )
+
+        deck._saved(self.filename)
+
+    def journal(self):
+        """Answers update the answered cards' rows (see write())."""
+        return self
+
+    def write(self, records):
+        """Apply answers, in one transaction.
+
+        Args:
+            records (iterable): Journal Records, indexed by card id.
+        """
+        db = self._connect()
+        with self._lock, db:
+            db.executemany(
+                'UPDATE cards SET '
+                'attempts = attempts + ?, '
+                'correct = correct + ?, '
+                'last_shown = ? '
+                'WHERE id = ? AND question = ?',
+                (
+                    (r.attempts, r.correct, r.timestamp, r.index, r.question)
+                    for r in records
+                )
+            )
+
+    def _connect(self, create=False):
+        """Open the deck file on first use.
+
+        Args:
+            create (bool): Create the deck file if it does not exist.
+        """
+        with self._lock:
+            if self._db is None:
+                if not create and not os.path.isfile(self.filename):
+                    raise FileNotFoundError(
+                        errno.ENOENT,
+                        os.strerror(errno.ENOENT),
+                        self.filename
+                    )
+
+                self._db = sqlite3.connect(
+                    self.filename,
+                    check_same_thread=False
+                )
+                self._db.executescript(self._schema)
+
+        return self._db
@@ -0,0 +1,98 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import json
+import os
+import tempfile
+import unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from lib import bench
+from lib.deck import Deck
+
+
+class BenchTestCase(unittest.TestCase):
+    """Unittests for the benchmark harness."""
+    def test_synthetic_cards(self):
+        """Synthetic decks are deterministic, and have valid statistics."""
+        for distribution in bench.Distributions.all():
+            cards = list(bench.synthetic_cards(200, 1, distribution))
+            self.assertEqual(
+                cards,
+                list(bench.synthetic_cards(200, 1, distribution))
+            )
+            self.assertEqual(len(cards), 200)
+            for card in cards:
+                self.assertTrue(0 <= card.n_correct <= card.n_attempts <= 20)
+                self.assertEqual(card.timestamp is None, not card.n_attempts)
+
+        self.assertNotEqual(
+            [c.answer for c in bench.synthetic_cards(50, 1)],
+            [c.answer for c in bench.synthetic_cards(50, 2)]
+        )
+        self.assertTrue(
+            all(
+                c.n_attempts == 0
+                for c in bench.synthetic_cards(50, 1, bench.Distributions.new)
+            )
+        )
+
+    def test_write_deck(self):
+        """Synthetic decks are written to deck files."""
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'synthetic.deck.csv')
+            bench.write_deck(filename, 100, seed=3)
+            deck = Deck.load(filename)
+
+        self.assertEqual(len(deck), 100)
+        self.assertEqual(list(deck), list(bench.synthetic_cards(100, 3)))
+
+    def test_run(self):
+        """Every benchmark runs, and results compare with a baseline."""
+        results = bench.run(sizes=(50,), repeat=1)
+        results = json.loads(json.dumps(results))
+
+        self.assertEqual(
+            [r['benchmark'] for r in results['results']],
+            [name for name, _, _ in bench._benchmarks(None, None)]
+        )
+        for r in results['results']:
+            self.assertEqual(r['cards'], 50)
+            self.assertGreaterEqual(r['median'], r['best'])
+
+        rows = bench.compare(results, results)
+        self.assertEqual(len(rows), len(results['results']))
+        self.assertTrue(all(ratio in (1.0, None) for *_, ratio in rows))
+
+    def test_save_writes(self):
+        """Every timed call of the Deck.save benchmark writes the deck."""
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'bench.deck.csv')
+            bench.write_deck(filename, 20)
+            _, setup, func = next(
+                b
+                for b in bench._benchmarks(
+                    filename,
+                    os.path.join(tmp, 'scratch.deck.csv')
+                )
+                if b[0] == 'Deck.save'
+            )
+            setup()
+            with patch.object(
+                Deck,
+                '_write_csv',
+                wraps=Deck._write_csv
+            ) as mock_write_csv:
+                bench.time_call(func, 3)
+
+        self.assertEqual(mock_write_csv.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
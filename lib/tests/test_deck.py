@@ -4,11 +4,19 @@ All rights reserved.
 Licensed under the BSD 3-clause License. See LICENSE.txt or
 <http://opensource.org/licenses/BSD-3-Clause>.
 """
+import csv
 import datetime
+import os
 import tempfile
 import unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
 from lib.deck import Deck, CardData
 from lib.flashcard import Flashcard
+from lib.journal import Journal
 
 
 class DeckCreationTestCase(unittest.TestCase):
@@ -105,6 +113,262 @@ Question,Answer,Attempts,Correct,Last Shown
         self.assertEqual(frozenset(self.deck.answers()), expected_answers)
 
 
+class LazyDeckTestCase(unittest.TestCase):
+    """Unittests for lazy card building in loaded decks."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'test.deck.csv')
+        self.deck = Deck('test deck')
+        self.deck.add_card(
+            Flashcard('q0', 'a0', 3, 2, str(datetime.datetime.utcnow()))
+        )
+        self.deck.add_card(Flashcard('q1', 'a1', 7, 7))
+        self.deck.save(self.filename, cache=False)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_stats_without_cards(self):
+        """stats() does not build cards."""
+        for cache in (False, True, True):
+            loaded = Deck.load(self.filename, cache=cache)
+            with patch.object(
+                Flashcard,
+                '__init__',
+                return_value=None
+            ) as mock_init:
+                attempts, correct = loaded.stats()
+                answers = loaded.answers()
+
+            mock_init.assert_not_called()
+            self.assertEqual(list(attempts), [3, 7])
+            self.assertEqual(list(correct), [2, 7])
+            self.assertEqual(answers, self.deck.answers())
+
+    def test_card(self):
+        """card() builds the requested card."""
+        for cache in (False, True, True):
+            loaded = Deck.load(self.filename, cache=cache)
+            for idx, c in enumerate(self.deck):
+                self.assertEqual(loaded.card(idx), c)
+                self.assertIs(loaded.card(idx), loaded.card(idx))
+
+    def test_stats_follow_cards(self):
+        """stats() reflects answers tallied on built cards."""
+        loaded = Deck.load(self.filename)
+        loaded.card(1).incorrect()
+        attempts, correct = loaded.stats()
+
+        self.assertEqual(list(attempts), [3, 8])
+        self.assertEqual(list(correct), [2, 7])
+
+
+class DeckStreamingTestCase(unittest.TestCase):
+    """Unittests for streaming deck files."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'test.deck.csv')
+        self.deck = Deck('test deck')
+        self.deck.add_card(
+            Flashcard('q0', 'a0', 3, 2, str(datetime.datetime.utcnow()))
+        )
+        self.deck.add_card(Flashcard('q1', 'a1'))
+        self.deck.save(self.filename)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_iter_file(self):
+        """iter_file() interface tests."""
+        self.assertEqual(list(Deck.iter_file(self.filename)), list(self.deck))
+
+    def test_iter_file_journal(self):
+        """iter_file() applies the journal."""
+        deck = Deck.load(self.filename)
+        card = deck.card(1)
+        card.correct()
+        journal = Journal(self.filename)
+        journal.append(1, card, True)
+
+        self.assertEqual(list(Deck.iter_file(self.filename)), list(deck))
+        self.assertEqual(
+            list(Deck.iter_file(self.filename, journal=False)),
+            list(self.deck)
+        )
+
+    def test_read_name(self):
+        """read_name() interface tests."""
+        self.assertEqual(Deck.read_name(self.filename), self.deck.name)
+
+    def test_write_file(self):
+        """write_file() interface tests."""
+        filename = os.path.join(self.dir.name, 'written.deck.csv')
+        Deck.write_file(filename, 'written', iter(self.deck))
+
+        written = Deck.load(filename)
+        self.assertEqual(written.name, 'written')
+        self.assertEqual(list(written), list(self.deck))
+        self.assertRaises(
+            ValueError,
+            Deck.write_file,
+            filename,
+            'written',
+            iter(self.deck)
+        )
+
+
+class DeckCacheTestCase(unittest.TestCase):
+    """Unittests for the Deck sidecar cache."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'test.deck.csv')
+        self.deck = Deck('test deck')
+        self.deck.add_card(
+            Flashcard('q0', 'a0', 3, 2, str(datetime.datetime.utcnow()))
+        )
+        self.deck.add_card(Flashcard('q1', 'a1'))
+        self.deck.save(self.filename, cache=False)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_cache_written(self):
+        """load() writes the sidecar cache."""
+        cache_filename = Deck.cache_filename(self.filename)
+        self.assertFalse(os.path.exists(cache_filename))
+        self.assertEqual(Deck.load(self.filename), self.deck)
+        self.assertTrue(os.path.exists(cache_filename))
+
+    def test_cache_hit(self):
+        """load() reads the sidecar cache of an unchanged deck file."""
+        Deck.load(self.filename)
+        with patch.object(Deck, '_load_csv') as mock_load_csv:
+            cached_deck = Deck.load(self.filename)
+
+        mock_load_csv.assert_not_called()
+        self.assertEqual(cached_deck, self.deck)
+
+    def test_cache_invalidated(self):
+        """load() reparses a deck file that changed after it was cached."""
+        Deck.load(self.filename)
+        self.deck.add_card(Flashcard('q2', 'a2'))
+        self.deck.save(self.filename, overwrite=True, cache=False)
+
+        self.assertEqual(Deck.load(self.filename), self.deck)
+
+    def test_cache_maps_rows(self):
+        """Cached loads only parse the rows of the cards that are used."""
+        Deck.load(self.filename)
+        with patch('lib.deck.csv.reader', wraps=csv.reader) as mock_reader:
+            cached_deck = Deck.load(self.filename)
+            attempts, correct = cached_deck.stats()
+            card = cached_deck.card(1)
+
+        self.assertEqual(mock_reader.call_count, 1)
+        self.assertEqual(card, self.deck.card(1))
+        self.assertEqual((list(attempts), list(correct)), ([3, 0], [2, 0]))
+        self.assertEqual(cached_deck.timestamps(), self.deck.timestamps())
+
+    def test_cache_quoted_rows(self):
+        """Cached row offsets survive quoted and non-ASCII cells."""
+        self.deck.add_card(Flashcard('q2\n"line two"', 'a2,\u00e9t\u00e9'))
+        self.deck.add_card(Flashcard('q3', 'a3'))
+        self.deck.save(self.filename, overwrite=True, cache=False)
+
+        Deck.load(self.filename)
+        self.assertEqual(Deck.load(self.filename), self.deck)
+
+        self.deck.save(self.filename, overwrite=True)
+        self.assertEqual(Deck.load(self.filename), self.deck)
+
+    def test_cache_line_separators(self):
+        """Mapped rows keep characters that str.splitlines() splits on."""
+        card = Flashcard('line\u2028sep q', 'ans\x85wer\x0cand\x1cmore')
+        self.deck.add_card(card)
+        self.deck.save(self.filename, overwrite=True)
+
+        deck = Deck.load(self.filename)
+        deck.card(2).correct()
+        deck.save(self.filename, overwrite=True)
+
+        deck = Deck.load(self.filename)
+        self.assertEqual(deck.card(2).question, card.question)
+        self.assertEqual(deck.card(2).answer, card.answer)
+        self.assertEqual(deck.card(2).n_correct, 1)
+        self.assertEqual(Deck.load(self.filename, cache=False), deck)
+
+    def test_corrupt_cache(self):
+        """load() falls back to the deck file if the cache is unreadable."""
+        with open(Deck.cache_filename(self.filename), 'wb') as f:
+            f.write(b'not a cache')
+
+        self.assertEqual(Deck.load(self.filename), self.deck)
+
+
+class DeckSaveTestCase(unittest.TestCase):
+    """Unittests for Deck.save()."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'test.deck.csv')
+        self.deck = Deck('test deck')
+        for idx in range(10):
+            self.deck.add_card(
+                Flashcard(
+                    'q{}, with a comma'.format(idx),
+                    'a{}, "quoted"'.format(idx),
+                    idx,
+                    idx // 2,
+                    '2015-01-01 00:00:{:02d}'.format(idx)
+                )
+            )
+        self.deck.save(self.filename)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_commas(self):
+        """Questions and answers with commas survive a save."""
+        self.assertEqual(Deck.load(self.filename, cache=False), self.deck)
+
+    def test_clean_save_skipped(self):
+        """Saving an unchanged deck over its deck file does not write it."""
+        deck = Deck.load(self.filename)
+        self.assertFalse(deck.is_dirty())
+        with patch.object(Deck, '_write_csv') as mock_write_csv:
+            deck.save(self.filename, overwrite=True)
+            Deck.compact(self.filename)
+
+        mock_write_csv.assert_not_called()
+
+    def test_dirty_save(self):
+        """Saving a changed deck writes it."""
+        deck = Deck.load(self.filename)
+        deck.card(3).correct()
+        self.assertTrue(deck.is_dirty())
+        deck.save(self.filename, overwrite=True)
+
+        self.assertFalse(deck.is_dirty())
+        self.assertEqual(Deck.load(self.filename, cache=False), deck)
+
+    def test_copied_rows(self):
+        """Rows copied from a mapped deck file keep the cache consistent."""
+        Deck.load(self.filename)
+        deck = Deck.load(self.filename)
+        deck.card(4).incorrect()
+        deck.add_card(Flashcard('q10', 'a10'))
+        runs = [s for s in deck._segments() if isinstance(s, tuple)]
+        self.assertEqual(len(runs), 2)
+        self.assertTrue(all(isinstance(r.data, memoryview) for r in runs))
+        deck.save(self.filename, overwrite=True)
+
+        self.assertEqual(Deck.load(self.filename, cache=False), deck)
+        self.assertEqual(Deck.load(self.filename), deck)
+        self.assertEqual(
+            Deck.load(self.filename).card(9),
+            self.deck.card(9)
+        )
+
+
 class DeckUtilsTestCase(unittest.TestCase):
     """Unittests for Deck utilities."""
     def test_starts_with_reserved_word(self):
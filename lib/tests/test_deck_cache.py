@@ -0,0 +1,124 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import os
+import tempfile
+import unittest
+from lib.deck import Deck
+from lib.deck_cache import CacheStats, DeckCache
+from lib.flashcard import Flashcard
+
+
+class DeckCacheTestCase(unittest.TestCase):
+    """Unittests for DeckCache class."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def make_deck(self, name, n_cards=3):
+        filename = os.path.join(self.dir.name, name + '.deck.csv')
+        deck = Deck(name)
+        for idx in range(n_cards):
+            deck.add_card(Flashcard('q{}'.format(idx), 'a{}'.format(idx)))
+        deck.save(filename)
+        return filename
+
+    def test_hit(self):
+        """Loading a deck again returns the cached deck."""
+        filename = self.make_deck('one')
+        cache = DeckCache()
+
+        deck = cache.load(filename)
+        self.assertIs(cache.load(filename), deck)
+        self.assertIs(cache.load(os.path.relpath(filename)), deck)
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses), (2, 1))
+        self.assertEqual(stats.entries, 1)
+        self.assertEqual(stats.nbytes, deck.nbytes())
+
+    def test_edited(self):
+        """Editing a deck file invalidates its cached deck."""
+        filename = self.make_deck('one')
+        cache = DeckCache()
+        deck = cache.load(filename)
+
+        edited = Deck('edited')
+        edited.add_card(Flashcard('q', 'a'))
+        edited.save(filename, overwrite=True)
+        st = os.stat(filename)
+        os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+        reloaded = cache.load(filename)
+        self.assertIsNot(reloaded, deck)
+        self.assertEqual(reloaded.name, 'edited')
+        self.assertEqual(
+            cache.stats(),
+            CacheStats(0, 2, 0, 1, reloaded.nbytes())
+        )
+
+    def test_evict_lru(self):
+        """The least recently used deck is evicted past max_entries."""
+        one, two, three = (
+            self.make_deck(name) for name in ('one', 'two', 'three')
+        )
+        cache = DeckCache(max_entries=2)
+        cache.load(one)
+        cache.load(two)
+        cache.load(one)
+        cache.load(three)  # Evicts two.
+
+        self.assertEqual(len(cache), 2)
+        cache.load(one)
+        cache.load(two)
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses), (2, 4))
+        self.assertEqual(stats.evictions, 2)
+
+    def test_evict_bytes(self):
+        """Decks are evicted past max_bytes, and decks that are too big to
+        cache are not cached."""
+        small = self.make_deck('small')
+        big = self.make_deck('big', 1000)
+        small_bytes = Deck.load(small).nbytes()
+
+        cache = DeckCache(max_bytes=small_bytes)
+        cache.load(small)
+        self.assertEqual(len(cache), 1)
+
+        self.assertEqual(len(cache.load(big)), 1000)
+        self.assertEqual(cache.stats().entries, 1)
+
+        cache.max_bytes = 2 * small_bytes - 1
+        cache.load(self.make_deck('other'))
+        self.assertEqual(cache.stats().entries, 1)
+        self.assertEqual(cache.stats().evictions, 1)
+
+    def test_invalidate(self):
+        """Invalidated decks are loaded again."""
+        one, two = self.make_deck('one'), self.make_deck('two')
+        cache = DeckCache()
+        cache.load(one)
+        cache.load(two)
+
+        cache.invalidate(one)
+        self.assertEqual(cache.stats().entries, 1)
+        cache.invalidate()
+        self.assertEqual(cache.stats().nbytes, 0)
+        cache.load(two)
+        self.assertEqual(cache.stats().misses, 3)
+
+    def test_missing(self):
+        """Missing deck files fail to load."""
+        cache = DeckCache()
+        with self.assertRaises(FileNotFoundError):
+            cache.load(os.path.join(self.dir.name, 'none.deck.csv'))
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,109 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import os
+import tempfile
+import unittest
+try:
+    from unittest.mock import Mock, patch
+except ImportError:
+    from mock import Mock, patch
+
+from lib.distractors import DistractorIndex
+
+
+class DistractorIndexTestCase(unittest.TestCase):
+    """Unittests for DistractorIndex class."""
+    def setUp(self):
+        self.numbers = frozenset(str(n) for n in range(100))
+        self.words = frozenset(
+            [
+                'colour', 'color', 'colon', 'collar', 'dollar',
+                'elephant', 'antelope', 'zebra', 'giraffe', 'hippo',
+            ]
+        )
+        self.index = DistractorIndex.build(self.numbers | self.words)
+
+    def test_numeric(self):
+        """Numeric answers get numerically close distractors."""
+        distractors = self.index.distractors('50', 3)
+
+        self.assertEqual(len(distractors), 3)
+        self.assertEqual(len(set(distractors)), 3)
+        for d in distractors:
+            self.assertIn(d, self.numbers)
+            self.assertLessEqual(abs(int(d) - 50), 3)
+
+    def test_numeric_edge(self):
+        """Numeric answers at the end of the range."""
+        for d in self.index.distractors('0', 3):
+            self.assertIn(d, ('1', '2', '3', '4', '5', '6'))
+
+    def test_text(self):
+        """Text answers get look-alike distractors."""
+        distractors = self.index.distractors('colour', 2)
+
+        self.assertEqual(len(distractors), 2)
+        self.assertNotIn('colour', distractors)
+        for d in distractors:
+            self.assertIn(d, ('color', 'colon', 'collar', 'dollar'))
+
+    def test_padding(self):
+        """Too few near misses are padded with other answers."""
+        distractors = self.index.distractors('zebra', 3)
+
+        self.assertEqual(len(distractors), 3)
+        self.assertEqual(len(set(distractors)), 3)
+        self.assertNotIn('zebra', distractors)
+
+    def test_few_answers(self):
+        """No more distractors than there are other answers."""
+        index = DistractorIndex.build(['1', '2', 'three'])
+        self.assertEqual(sorted(index.distractors('1', 5)), ['2', 'three'])
+
+    def test_load(self):
+        """load() persists the index, and rebuilds it for new answers."""
+        with tempfile.TemporaryDirectory() as d:
+            deck_filename = os.path.join(d, 'test.deck.csv')
+            answers = self.numbers | self.words
+            DistractorIndex.load(deck_filename, lambda: answers)
+            self.assertTrue(
+                os.path.exists(DistractorIndex.index_filename(deck_filename))
+            )
+
+            with patch.object(DistractorIndex, 'build') as mock_build:
+                index = DistractorIndex.load(deck_filename, lambda: answers)
+
+            mock_build.assert_not_called()
+            self.assertEqual(frozenset(index.answers), answers)
+
+            index = DistractorIndex.load(deck_filename, lambda: self.words)
+            self.assertEqual(frozenset(index.answers), self.words)
+
+    def test_load_unchanged_deck(self):
+        """load() does not scan the answers of an unchanged deck file."""
+        with tempfile.TemporaryDirectory() as d:
+            deck_filename = os.path.join(d, 'test.deck.csv')
+            with open(deck_filename, 'w') as f:
+                f.write('deck')
+
+            DistractorIndex.load(deck_filename, lambda: self.words)
+            answers = Mock(return_value=self.words)
+            index = DistractorIndex.load(deck_filename, answers)
+
+            answers.assert_not_called()
+            self.assertEqual(frozenset(index.answers), self.words)
+
+            with open(deck_filename, 'a') as f:
+                f.write(' changed')
+
+            index = DistractorIndex.load(deck_filename, answers)
+            answers.assert_called_once_with()
+            self.assertEqual(frozenset(index.answers), self.words)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
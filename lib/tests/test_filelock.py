@@ -0,0 +1,46 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import os
+import tempfile
+import unittest
+from lib.filelock import FileLock
+
+
+class FileLockTestCase(unittest.TestCase):
+    """Unittests for FileLock class."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.filename = os.path.join(self.dir.name, 'test.deck.csv')
+
+    def test_reentrant(self):
+        """A thread can take a lock it holds again."""
+        with FileLock(self.filename):
+            with FileLock(self.filename, shared=True):
+                with FileLock(self.filename):
+                    pass
+
+            self.assertIn(
+                os.path.abspath(self.filename + FileLock.extension),
+                FileLock._held_locks()
+            )
+
+        self.assertEqual(FileLock._held_locks(), {})
+        self.assertTrue(os.path.exists(self.filename + FileLock.extension))
+
+    def test_upgrade(self):
+        """A shared lock cannot be upgraded."""
+        with FileLock(self.filename, shared=True):
+            with self.assertRaises(RuntimeError):
+                with FileLock(self.filename):
+                    pass
+
+        self.assertEqual(FileLock._held_locks(), {})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
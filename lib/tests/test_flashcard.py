@@ -5,10 +5,42 @@ Licensed under the BSD 3-clause License. See LICENSE.txt or
 <http://opensource.org/licenses/BSD-3-Clause>.
 """
 from datetime import datetime
+import os
+import tracemalloc
 import unittest
 from lib.flashcard import Flashcard
 
 
+class DictFlashcard:
+    """Flashcard layout before slots: instance dict, and datetime."""
+    def __init__(self, question, answer, attempts, correct, last_shown):
+        self.question = question
+        self.answer = answer
+        self.n_attempts = attempts
+        self.n_correct = correct
+        self.last_shown = last_shown
+
+
+def bytes_per_card(factory, n_cards):
+    """Average memory allocated per card for a deck of n_cards cards.
+
+    Args:
+        factory (callable): Builds the card with the given index.
+        n_cards (int): Number of cards in the deck.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        deck = [factory(idx) for idx in range(n_cards)]
+        after = tracemalloc.get_traced_memory()[0]
+
+    finally:
+        tracemalloc.stop()
+
+    assert len(deck) == n_cards
+    return (after - before) / n_cards
+
+
 class FlashcardTestCase(unittest.TestCase):
     """Unittests for Flashcard class."""
     def test_construction_defaults(self):
@@ -48,6 +80,27 @@ class FlashcardTestCase(unittest.TestCase):
         )
         verify(card)
 
+    def test_timestamps(self):
+        """Timestamps survive formatting, with or without microseconds."""
+        for last_shown in (
+            '2015-06-01 12:30:00',
+            '2015-06-01 12:30:00.5',
+            '2015-06-01 12:30:00.000000',
+            '2015-06-01 12:30:00.123456',
+        ):
+            timestamp = Flashcard.parse_timestamp(last_shown)
+            self.assertEqual(
+                Flashcard.parse_timestamp(
+                    Flashcard.format_timestamp(timestamp)
+                ),
+                timestamp
+            )
+
+        self.assertEqual(Flashcard.format_timestamp(None), '')
+        for last_shown in ('2015-06-01 12:30:00+00:00', 'yesterday'):
+            with self.assertRaises(ValueError):
+                Flashcard.parse_timestamp(last_shown)
+
     def test_correct(self):
         """correct interface tests."""
         card = Flashcard('question', 'answer')
@@ -97,5 +150,61 @@ class FlashcardTestCase(unittest.TestCase):
         self.assertNotEqual(hash(card), hash(card_prime))
 
 
+class FlashcardFootprintTestCase(unittest.TestCase):
+    """Memory footprint of Flashcards."""
+    n_cards = 10000
+
+    def test_slots(self):
+        """Flashcards have no instance dict."""
+        self.assertFalse(hasattr(Flashcard('q', 'a'), '__dict__'))
+
+    def test_footprint(self):
+        """Per-card bytes of a small deck, before and after slots."""
+        self.check_footprint(self.n_cards)
+
+    @unittest.skipUnless(
+        os.environ.get('FLASHCARDS_SLOW_TESTS'),
+        'Set FLASHCARDS_SLOW_TESTS to measure a 1M card deck.'
+    )
+    def test_footprint_1m(self):
+        """Per-card bytes of a 1M card deck, before and after slots."""
+        self.check_footprint(1000000)
+
+    def check_footprint(self, n_cards):
+        """Slotted cards take less than 3/4 the memory of dict cards."""
+        # Every card was shown at a different time.
+        def dict_card(idx):
+            return DictFlashcard(
+                'q',
+                'a',
+                12,
+                10,
+                datetime(2015, 4, 25, 21, 12, 23, idx % 1000000)
+            )
+
+        timestamp = Flashcard(
+            'q',
+            'a',
+            last_shown='2015-04-25 21:12:23.0'
+        ).timestamp
+
+        def slotted_card(idx):
+            card = Flashcard('q', 'a', 12, 10)
+            card.timestamp = timestamp + idx % 1000000
+            return card
+
+        before = bytes_per_card(dict_card, n_cards)
+        after = bytes_per_card(slotted_card, n_cards)
+
+        self.assertLess(
+            after,
+            0.75 * before,
+            'Bytes per card: {before:.0f} before, {after:.0f} after.'.format(
+                before=before,
+                after=after
+            )
+        )
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,88 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import random
+import unittest
+from lib.grader import AnswerMatcher, AnswerPattern, normalize
+
+
+def levenshtein(a, b):
+    """Edit distance, by dynamic programming."""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (ca != cb)
+                )
+            )
+        previous = current
+
+    return previous[-1]
+
+
+class GraderTestCase(unittest.TestCase):
+    """Unittests for answer grading."""
+    def test_normalize(self):
+        """Answers are normalized for case, spacing, and Unicode forms."""
+        self.assertEqual(normalize('  New\tYork  City '), 'new york city')
+        self.assertEqual(normalize('STRASSE'), normalize('straße'))
+        self.assertEqual(normalize('ﬁsh'), 'fish')
+        self.assertEqual(normalize('é'), 'é')
+        self.assertEqual(normalize(None), '')
+
+    def test_match(self):
+        """Answers match when normalized, or within the allowed typos."""
+        exact = AnswerPattern('Photosynthesis')
+        self.assertTrue(exact.match('photosynthesis '))
+        self.assertFalse(exact.match('photosynthsis'))
+        self.assertFalse(exact.match(None))
+
+        fuzzy = AnswerPattern('Photosynthesis', max_typos=2)
+        self.assertEqual(fuzzy.typos, 2)
+        self.assertTrue(fuzzy.match('photosynthsis'))
+        self.assertTrue(fuzzy.match('fotosynthesis'))
+        self.assertTrue(fuzzy.match('photosinthesys'))
+        self.assertFalse(fuzzy.match('fotosinthesys'))
+        self.assertFalse(fuzzy.match('photo'))
+
+    def test_short_answers(self):
+        """Short answers allow fewer typos."""
+        self.assertEqual(AnswerPattern('42', max_typos=3).typos, 0)
+        self.assertFalse(AnswerPattern('42', max_typos=3).match('43'))
+        self.assertEqual(AnswerPattern('Paris', max_typos=3).typos, 1)
+        self.assertTrue(AnswerPattern('Paris', max_typos=3).match('pari'))
+        self.assertFalse(AnswerPattern('', max_typos=3).match('a'))
+
+    def test_distance(self):
+        """The bit-parallel edit distance is the Levenshtein distance."""
+        rng = random.Random(0)
+        for _ in range(500):
+            a = ''.join(rng.choice('abc') for _ in range(rng.randint(1, 70)))
+            b = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 70)))
+            pattern = AnswerPattern(a)
+            expected = levenshtein(a, b)
+            self.assertEqual(pattern.distance(b), expected)
+            for bound in range(3):
+                self.assertEqual(
+                    pattern.distance(b, bound) <= bound,
+                    expected <= bound
+                )
+
+    def test_matcher(self):
+        """Matchers compile each card's answer once."""
+        matcher = AnswerMatcher(max_typos=1)
+        self.assertTrue(matcher.match(0, 'Berlin', 'berlim'))
+        pattern = matcher._patterns[0]
+        self.assertFalse(matcher.match(0, 'Berlin', 'bern'))
+        self.assertIs(matcher._patterns[0], pattern)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,139 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from lib.deck import Deck
+from lib.flashcard import Flashcard
+from lib.journal import Journal, Record
+
+
+class JournalTestCase(unittest.TestCase):
+    """Unittests for Journal class."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'test.deck.csv')
+        self.deck = Deck('test deck')
+        for idx in range(3):
+            self.deck.add_card(Flashcard('q{}'.format(idx), 'a'))
+
+        self.deck.save(self.filename)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def answer(self, idx, correct):
+        """Answer a card of a freshly loaded deck, and journal it."""
+        deck = Deck.load(self.filename)
+        card = deck.card(idx)
+        card.correct() if correct else card.incorrect()
+        journal = Journal(self.filename)
+        journal.append(idx, card, correct)
+        return card
+
+    def test_records(self):
+        """append() and records() interface tests."""
+        card = self.answer(1, True)
+
+        self.assertEqual(
+            list(Journal(self.filename).records()),
+            [Record(1, 'q1', 1, 1, card.timestamp)]
+        )
+
+    def test_no_journal(self):
+        """records() of a deck without a journal."""
+        self.assertEqual(list(Journal(self.filename).records()), [])
+
+    def test_replay(self):
+        """Deck.load() replays the journal."""
+        self.answer(0, True)
+        self.answer(0, False)
+        expected = self.answer(2, True)
+
+        deck = Deck.load(self.filename)
+        self.assertEqual(list(deck.stats()[0]), [2, 0, 1])
+        self.assertEqual(list(deck.stats()[1]), [1, 0, 1])
+        self.assertEqual(deck.card(2), expected)
+
+    def test_replay_mismatch(self):
+        """Deck.load() ignores records that do not match the deck."""
+        card = Flashcard('not in deck', 'a')
+        card.correct()
+        journal = Journal(self.filename)
+        journal.append(1, card, True)
+        journal.append(7, card, True)
+
+        self.assertEqual(Deck.load(self.filename), self.deck)
+
+    def test_compact(self):
+        """Deck.compact() folds the journal into the deck file."""
+        self.answer(1, True)
+        expected = Deck.load(self.filename)
+
+        Deck.compact(self.filename)
+
+        self.assertFalse(os.path.exists(Journal(self.filename).filename))
+        self.assertEqual(Deck.load(self.filename), expected)
+
+
+    def test_compact_concurrent_answers(self):
+        """Answers journaled while a compaction builds the deck file stay in
+        the journal."""
+        self.answer(0, True)
+        write_temp = Deck._write_temp
+
+        def answer_while_building(*args, **kwargs):
+            self.answer(2, False)
+            return write_temp(*args, **kwargs)
+
+        with patch.object(
+            Deck,
+            '_write_temp',
+            side_effect=answer_while_building
+        ):
+            Deck.compact(self.filename)
+
+        records = list(Journal(self.filename).records())
+        self.assertEqual([(r.index, r.correct) for r in records], [(2, 0)])
+        deck = Deck.load(self.filename)
+        self.assertEqual(
+            [(c.n_attempts, c.n_correct) for c in deck],
+            [(1, 1), (0, 0), (1, 0)]
+        )
+
+    def test_compact_replaced(self):
+        """A compaction is dropped if the deck file is replaced while it
+        builds the deck file."""
+        self.answer(0, True)
+        write_temp = Deck._write_temp
+
+        def save_while_building(*args, **kwargs):
+            mock_write_temp.side_effect = write_temp
+            Deck.load(self.filename).save(self.filename, overwrite=True)
+            self.answer(1, True)
+            return write_temp(*args, **kwargs)
+
+        with patch.object(
+            Deck,
+            '_write_temp',
+            side_effect=save_while_building
+        ) as mock_write_temp:
+            Deck.compact(self.filename)
+
+        self.assertEqual(len(list(Journal(self.filename).records())), 1)
+        self.assertEqual(
+            [c.n_correct for c in Deck.load(self.filename)],
+            [1, 1, 0]
+        )
+        self.assertEqual(
+            [p for p in os.listdir(self.dir.name) if p.startswith('.')],
+            []
+        )
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,155 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import os
+import tempfile
+import unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from lib import library
+from lib.deck import Deck
+from lib.flashcard import Flashcard
+from lib.journal import Journal
+
+
+class LibraryTestCase(unittest.TestCase):
+    """Unittests for Library class."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+        self.save_deck('birds', [(0, 0), (10, 10), (20, 20)])
+        self.save_deck('animals', [(0, 0), (6, 5)])
+        with open(self.path('notes.txt'), mode='w') as f:
+            f.write('Not a deck.')
+
+        self.library = library.Library(self.dir.name)
+        self.addCleanup(self.library.close)
+
+    def path(self, basename):
+        return os.path.join(self.dir.name, basename)
+
+    def save_deck(self, name, stats):
+        deck = Deck(name.title())
+        for i, (attempts, correct) in enumerate(stats):
+            deck.add_card(
+                Flashcard('q{}'.format(i), 'a', attempts, correct)
+            )
+        deck.save(self.path('{}.deck.csv'.format(name)), overwrite=True)
+
+    def test_refresh(self):
+        """refresh() indexes every deck's name and tier counts."""
+        self.assertEqual(self.library.refresh(), 2)
+        self.assertEqual(
+            self.library.decks(),
+            [
+                library.DeckEntry(
+                    'Animals',
+                    self.path('animals.deck.csv'),
+                    os.stat(self.path('animals.deck.csv')).st_mtime_ns,
+                    2, 1, 1, 0
+                ),
+                library.DeckEntry(
+                    'Birds',
+                    self.path('birds.deck.csv'),
+                    os.stat(self.path('birds.deck.csv')).st_mtime_ns,
+                    3, 1, 0, 2
+                ),
+            ]
+        )
+        self.assertEqual(
+            [e.name for e in self.library.decks('IRD')],
+            ['Birds']
+        )
+        self.assertEqual(self.library.decks('%'), [])
+
+    def test_incremental(self):
+        """refresh() only re-parses changed decks."""
+        self.library.refresh()
+        with patch.object(library.Deck, 'load', wraps=Deck.load) as load:
+            self.assertEqual(self.library.refresh(), 0)
+            load.assert_not_called()
+
+            # A changed deck, a journaled answer, and a deleted deck.
+            self.save_deck('birds', [(0, 0)])
+            Journal(self.path('animals.deck.csv')).append(
+                1,
+                Flashcard('q1', 'a', 7, 5),
+                False
+            )
+            self.assertEqual(self.library.refresh(), 2)
+            self.assertEqual(load.call_count, 2)
+
+            os.remove(self.path('birds.deck.csv'))
+            self.assertEqual(self.library.refresh(), 0)
+
+        entries = self.library.decks()
+        self.assertEqual([e.name for e in entries], ['Animals'])
+        self.assertEqual((entries[0].hard, entries[0].medium), (2, 0))
+
+    def test_import(self):
+        """import_decks() validates, normalizes, and indexes decks."""
+        source = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        decks = {
+            'messy.deck.csv': (
+                'Name: Messy\r\nQuiz:\r\n'
+                'Question,Answer,Attempts,Correct,Last Shown\r\n'
+                ' q0 , a0 ,x,5,bad\r\n'
+                ',,,\r\n'
+                'q1,a1,3,7,2015-04-25 21:12:23.676495\r\n'
+                'q2,a2,-1\r\n'
+                'q3,a3,1,1,2015-04-25 21:12:23+02:00\r\n'
+            ),
+            'unnamed.deck.csv': (
+                'Quiz:\r\nQuestion,Answer,Attempts,Correct,Last Shown\r\n'
+            ),
+            'columns.deck.csv': (
+                'Name: Columns\r\nQuiz:\r\nAnswer,Question\r\n'
+            ),
+            'birds.deck.csv': 'Name: Not Birds\r\nQuiz:\r\n',
+        }
+        for basename, text in decks.items():
+            with open(
+                os.path.join(source.name, basename),
+                mode='w',
+                newline=''
+            ) as f:
+                f.write(text)
+
+        result = self.library.import_decks(source.name, workers=2)
+
+        self.assertEqual(result.imported, 1)
+        self.assertEqual(len(result.errors), 3)
+        self.assertEqual(
+            [e.name for e in self.library.decks()],
+            ['Messy']
+        )
+        self.assertEqual(
+            [
+                (c.question, c.answer, c.n_attempts, c.n_correct, c.timestamp)
+                for c in Deck.load(self.path('messy.deck.csv'))
+            ],
+            [
+                ('q0', 'a0', 0, 0, None),
+                ('q1', 'a1', 3, 3, 1429996343676495),
+                ('q2', 'a2', 0, 0, None),
+                ('q3', 'a3', 1, 1, None),
+            ]
+        )
+        self.assertEqual(Deck.read_name(self.path('birds.deck.csv')), 'Birds')
+        self.assertRaises(
+            ValueError,
+            self.library.import_decks,
+            self.dir.name
+        )
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
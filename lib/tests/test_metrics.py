@@ -0,0 +1,104 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import os
+import tempfile
+import unittest
+import flashcards
+from lib.deck import Deck
+from lib.flashcard import Flashcard
+from lib.metrics import Metrics, metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Unittests for Metrics class."""
+    def test_disabled(self):
+        """Disabled metrics record nothing."""
+        m = Metrics()
+        m.count('counter')
+        m.record('timer', 1.0)
+        with m.timer('timer'):
+            pass
+
+        self.assertIs(m.timer('timer'), m.timer('other'))
+        self.assertEqual(m.report(), {'counters': {}, 'timers': {}})
+
+    def test_enabled(self):
+        """Enabled metrics count, and time."""
+        m = Metrics()
+        m.enable()
+        m.count('counter')
+        m.count('counter', 2)
+        m.record('timer', 0.001)
+        m.record('timer', 0.003)
+        with m.timer('block'):
+            pass
+
+        report = m.report()
+        self.assertEqual(report['counters'], {'counter': 3})
+        self.assertEqual(
+            report['timers']['timer'],
+            {
+                'count': 2,
+                'total_s': 0.004,
+                'mean_ms': 2.0,
+                'min_ms': 1.0,
+                'max_ms': 3.0,
+            }
+        )
+        self.assertEqual(report['timers']['block']['count'], 1)
+
+        m.reset()
+        self.assertEqual(m.report(), {'counters': {}, 'timers': {}})
+
+    def test_deck(self):
+        """Deck loads and saves are timed."""
+        self.addCleanup(metrics.reset)
+        self.addCleanup(metrics.enable, False)
+        metrics.enable()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'test.deck.csv')
+            deck = Deck('test deck')
+            deck.add_card(Flashcard('q', 'a'))
+            deck.save(filename)
+            Deck.load(filename)
+
+        report = metrics.report()
+        self.assertEqual(report['timers']['deck.save']['count'], 1)
+        self.assertEqual(report['timers']['deck.load']['count'], 1)
+        self.assertEqual(report['counters']['deck.cards_loaded'], 1)
+
+
+
+class ProfileCommandLineTestCase(unittest.TestCase):
+    """Unittests for the --profile command line options."""
+    def test_profile_before_command(self):
+        """--profile does not take the command as its output file."""
+        args = flashcards.parse_command_line(
+            ['--profile', 'stats', 'x.deck.csv']
+        )
+        self.assertTrue(args.profile)
+        self.assertEqual(args.profile_output, '-')
+        self.assertEqual(args.func, flashcards.stats)
+
+        args = flashcards.parse_command_line(
+            [
+                '--profile',
+                '--profile-output',
+                'out.json',
+                'stats',
+                'x.deck.csv'
+            ]
+        )
+        self.assertEqual(args.profile_output, 'out.json')
+
+        args = flashcards.parse_command_line(['stats', 'x.deck.csv'])
+        self.assertFalse(args.profile)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
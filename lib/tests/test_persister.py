@@ -0,0 +1,169 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from lib.deck import Deck
+from lib.deck_cache import DeckCache
+from lib.flashcard import Flashcard
+from lib.journal import Journal, Record
+from lib.persister import Persister
+
+
+def _answer_cards(filename, n_answers):
+    """Answer the cards of a deck correctly, in turn. Runs in a worker
+    process."""
+    deck = Deck.load(filename)
+    persister = Persister(filename, checkpoint_answers=3)
+    for i in range(n_answers):
+        idx = i % len(deck)
+        card = deck.card(idx)
+        card.correct()
+        persister.record(deck.key(idx), card, True)
+        time.sleep(0.001)
+    persister.close()
+
+
+class PersisterTestCase(unittest.TestCase):
+    """Unittests for Persister class."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'test.deck.csv')
+        deck = Deck('test deck')
+        for idx in range(3):
+            deck.add_card(Flashcard('q{}'.format(idx), 'a'))
+
+        deck.save(self.filename)
+        self.deck = Deck.load(self.filename)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def answer(self, persister, idx, correct):
+        card = self.deck.card(idx)
+        card.correct() if correct else card.incorrect()
+        persister.record(idx, card, correct)
+
+    def test_close(self):
+        """close() journals all answers, without checkpointing."""
+        original = Deck.load(self.filename)
+        persister = Persister(self.filename, 100, 100.0)
+        self.answer(persister, 0, True)
+        self.answer(persister, 2, False)
+        self.answer(persister, 0, True)
+        persister.close()
+
+        self.assertTrue(os.path.exists(Journal(self.filename).filename))
+        self.assertEqual(Deck.load(self.filename, journal=False), original)
+        self.assertEqual(Deck.load(self.filename), self.deck)
+
+    def wait_for_checkpoint(self):
+        """Wait for the deck file to hold every answer, without a journal."""
+        journal = Journal(self.filename)
+        for _ in range(100):
+            if (
+                not os.path.exists(journal.filename) and
+                Deck.load(self.filename) == self.deck
+            ):
+                return
+
+            time.sleep(0.02)
+
+        self.fail('No checkpoint.')
+
+    def test_checkpoint_answers(self):
+        """Checkpoints every checkpoint_answers answers."""
+        persister = Persister(self.filename, 2, 100.0)
+        self.answer(persister, 1, True)
+        self.answer(persister, 2, True)
+        self.wait_for_checkpoint()
+        persister.close()
+
+    def test_checkpoint_interval(self):
+        """Checkpoints checkpoint_interval seconds after an answer."""
+        persister = Persister(self.filename, 100, 0.05)
+        self.answer(persister, 1, False)
+        self.wait_for_checkpoint()
+        persister.close()
+
+    def test_checkpoint_keeps_cached_deck(self):
+        """Checkpoints do not evict the deck whose answers they persist from
+        the deck cache."""
+        cache = DeckCache()
+        self.deck = cache.load(self.filename)
+        key = Deck._file_key(self.filename)
+
+        persister = Persister(self.filename, 2, 100.0, self.deck, cache)
+        for _ in range(2):
+            self.answer(persister, 1, True)
+            self.answer(persister, 2, False)
+            self.wait_for_checkpoint()
+            self.assertIs(cache.load(self.filename), self.deck)
+        persister.close()
+
+        self.assertNotEqual(Deck._file_key(self.filename), key)
+        self.assertEqual(cache.stats()[:2], (2, 1))
+
+        # A deck not cached for the version of the file it was checkpointed
+        # from is loaded again.
+        persister = Persister(self.filename, 1, 100.0, Deck('other'), cache)
+        self.answer(persister, 0, True)
+        self.wait_for_checkpoint()
+        persister.close()
+        self.assertIsNot(cache.load(self.filename), self.deck)
+
+    def test_record_many(self):
+        """record_many() persists a batch of answers."""
+        persister = Persister(self.filename, 100, 100.0)
+        answers = []
+        for idx, correct in ((0, True), (2, False), (0, False)):
+            card = self.deck.card(idx)
+            card.correct() if correct else card.incorrect()
+            answers.append((idx, card, correct))
+        persister.record_many(answers)
+        persister.record_many([])
+        persister.close()
+
+        self.assertEqual(Deck.load(self.filename), self.deck)
+
+    def test_concurrent_processes(self):
+        """Processes persisting answers to one deck do not lose each other's
+        answers."""
+        n_processes, n_answers = 4, 30
+        with multiprocessing.Pool(n_processes) as pool:
+            pool.starmap(
+                _answer_cards,
+                [(self.filename, n_answers)] * n_processes
+            )
+
+        deck = Deck.load(self.filename)
+        self.assertEqual(
+            sum(c.n_attempts for c in deck),
+            n_processes * n_answers
+        )
+        self.assertEqual(
+            sum(c.n_correct for c in deck),
+            n_processes * n_answers
+        )
+
+    def test_merge(self):
+        """_merge() combines answers to the same card."""
+        records = [
+            Record(0, 'q0', 1, 1, 1),
+            Record(1, 'q1', 1, 0, 2),
+            Record(0, 'q0', 1, 0, 3),
+        ]
+        self.assertEqual(
+            sorted(Persister._merge(records)),
+            [Record(0, 'q0', 2, 1, 3), Record(1, 'q1', 1, 0, 2)]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -4,6 +4,7 @@ All rights reserved.
 Licensed under the BSD 3-clause License. See LICENSE.txt or
 <http://opensource.org/licenses/BSD-3-Clause>.
 """
+import random
 import unittest
 try:
     from unittest.mock import patch, MagicMock
@@ -20,16 +21,34 @@ def mocked_card(question, answer, correct=0, attempts=0):
     card.answer = answer
     card.n_correct = correct
     card.n_attempts = attempts
+    card.timestamp = None
     return card
 
 
+def mocked_deck(cards):
+    deck = MagicMock(spec=quiz.Deck)
+    deck.__iter__.return_value = cards
+    deck.__len__.return_value = len(cards)
+    deck.stats.return_value = (
+        [c.n_attempts for c in cards],
+        [c.n_correct for c in cards]
+    )
+    deck.card.side_effect = lambda idx: cards[idx]
+    deck.timestamps.return_value = [c.timestamp for c in cards]
+    return deck
+
+
 class QuizTestCase(unittest.TestCase):
     """Unittests for Quiz class."""
     def test_initialization(self):
         """Initialization tests."""
         deck_filename = 'filename'
 
-        with patch.object(quiz.Deck, 'load') as mock_load:
+        with patch.object(
+            quiz.Deck,
+            'load',
+            return_value=mocked_deck([])
+        ) as mock_load:
             q = quiz.Quiz(deck_filename)
 
         mock_load.assert_called_with(deck_filename)
@@ -42,11 +61,10 @@ class QuizTestCase(unittest.TestCase):
         card2 = mocked_card('q2', 'a')
         cards = [card1, card2]
         card_questions = [c.question for c in cards]
-        mocked_deck = MagicMock(spec=quiz.Deck)
-        mocked_deck.__iter__.return_value = cards
-        mocked_deck.__len__.return_value = len(cards)
+        deck = mocked_deck(cards)
 
-        with patch.object(quiz.Deck, 'load', return_value=mocked_deck):
+        with patch.object(quiz.Deck, 'load', return_value=deck), \
+                patch.object(quiz, 'Persister') as mock_persister:
             q = quiz.Quiz(deck_filename)
             for idx, question in enumerate(
                 q.run(
@@ -57,7 +75,15 @@ class QuizTestCase(unittest.TestCase):
                 self.assertTrue(question.question in card_questions)
                 question.submit('a')
 
-            mocked_deck.answers.assert_not_called()
+            deck.answers.assert_not_called()
+            mock_persister.assert_called_with(deck_filename, deck=deck)
+            self.assertEqual(
+                mock_persister.return_value.record.call_count,
+                len(cards)
+            )
+            mock_persister.return_value.close.assert_not_called()
+            q.close()
+            mock_persister.return_value.close.assert_called_with()
             self.assertEqual(idx, len(cards) - 1)
             self.assertEqual(q.score()[0], len(cards))
             self.assertEqual(q.score()[1], len(cards))
@@ -69,11 +95,10 @@ class QuizTestCase(unittest.TestCase):
         card2 = mocked_card('q2', 'a')
         cards = [card1, card2]
         card_questions = [c.question for c in cards]
-        mocked_deck = MagicMock(spec=quiz.Deck)
-        mocked_deck.__iter__.return_value = cards
-        mocked_deck.__len__.return_value = len(cards)
+        deck = mocked_deck(cards)
 
-        with patch.object(quiz.Deck, 'load', return_value=mocked_deck):
+        with patch.object(quiz.Deck, 'load', return_value=deck), \
+                patch.object(quiz, 'Persister') as mock_persister:
             q = quiz.Quiz(deck_filename)
             for idx, question in enumerate(
                 q.run(
@@ -84,16 +109,211 @@ class QuizTestCase(unittest.TestCase):
                 self.assertTrue(question.question in card_questions)
                 question.submit('b')
 
-            mocked_deck.answers.assert_not_called()
+            deck.answers.assert_not_called()
+            mock_persister.assert_called_with(deck_filename, deck=deck)
+            self.assertEqual(
+                mock_persister.return_value.record.call_count,
+                len(cards)
+            )
+            mock_persister.return_value.close.assert_not_called()
+            q.close()
+            mock_persister.return_value.close.assert_called_with()
             self.assertEqual(idx, len(cards) - 1)
             self.assertEqual(q.score()[0], 0)
             self.assertEqual(q.score()[1], len(cards))
 
+    def test_shared_matcher(self):
+        """Quizzes that share a quiz share its compiled answers."""
+        deck = mocked_deck([mocked_card('q1', 'answer')])
+        first = quiz.Quiz('filename', loaded=deck, typos=1)
+        second = quiz.Quiz('filename', loaded=deck, typos=1, shared=first)
+        third = quiz.Quiz('filename', loaded=deck, shared=first)
+
+        self.assertIs(second._matcher, first._matcher)
+        self.assertIsNot(third._matcher, first._matcher)
+        self.assertEqual(third._matcher.max_typos, 0)
+
+    def test_rounds(self):
+        """A session runs many rounds from one load of the deck."""
+        cards = [mocked_card('q1', 'a'), mocked_card('q2', 'a')]
+        deck = mocked_deck(cards)
+        with patch.object(quiz.Deck, 'load', return_value=deck) as mock_load, \
+                patch.object(quiz, 'Persister') as mock_persister:
+            q = quiz.Quiz('filename')
+            for answer in ('a', 'b'):
+                for question in q.run(
+                    'all',
+                    quiz.QuizTypes.fill_in_the_blank
+                ):
+                    question.submit(answer)
+
+                self.assertEqual(
+                    q.score(),
+                    (len(cards) if answer == 'a' else 0, len(cards))
+                )
+
+            q.reset()
+            self.assertEqual(q.score(), (0, 0))
+            q.close()
+            q.close()
+
+        mock_load.assert_called_once_with('filename')
+        mock_persister.assert_called_once_with('filename', deck=deck)
+        mock_persister.return_value.close.assert_called_once_with()
+
+    def test_grade(self):
+        """grade() grades a batch of answers as a round."""
+        cards = [Flashcard('q{}'.format(i), 'a{}'.format(i)) for i in range(3)]
+        deck = mocked_deck(cards)
+        with patch.object(quiz.Deck, 'load', return_value=deck), \
+                patch.object(quiz, 'Persister') as mock_persister:
+            q = quiz.Quiz('filename')
+            ids = {
+                question.question: question.id
+                for question in q.run('all', quiz.QuizTypes.fill_in_the_blank)
+            }
+            grades = q.grade(
+                [
+                    (ids['q0'], 'a0'),
+                    (ids['q1'], 'wrong'),
+                    (ids['q0'], 'a0'),
+                    (len(cards), 'a3'),
+                    ('q2', 'a2'),
+                ]
+            )
+
+        self.assertEqual(
+            grades,
+            quiz.Grades([True, False, True, None, None], 2, 3)
+        )
+        self.assertEqual(q.score(), (2, 3))
+        self.assertEqual(
+            [(c.n_correct, c.n_attempts) for c in cards],
+            [(2, 2), (0, 1), (0, 0)]
+        )
+        mock_persister.return_value.record.assert_not_called()
+        answers = mock_persister.return_value.record_many.call_args[0][0]
+        self.assertEqual(
+            [(c.question, result) for _, c, result in answers],
+            [('q0', True), ('q1', False), ('q0', True)]
+        )
+
+    def test_fuzzy_answers(self):
+        """Fill in the blank answers ignore case and spacing, and may have
+        typos if the quiz allows them."""
+        cards = [Flashcard('q0', 'Mitochondria'), Flashcard('q1', '42')]
+        deck = mocked_deck(cards)
+        with patch.object(quiz.Deck, 'load', return_value=deck), \
+                patch.object(quiz, 'Persister'):
+            exact = quiz.Quiz('filename')
+            fuzzy = quiz.Quiz('filename', typos=2)
+            answers = [
+                (0, '  MITOCHONDRIA '),
+                (0, 'mitochondira'),
+                (0, 'mitokondria'),
+                (1, '43'),
+            ]
+            self.assertEqual(
+                exact.grade(answers).results,
+                [True, False, False, False]
+            )
+            self.assertEqual(
+                fuzzy.grade(answers).results,
+                [True, True, True, False]
+            )
+
+            q = next(exact.run(1, quiz.QuizTypes.fill_in_the_blank))
+            self.assertEqual(
+                q.submit(cards[q.id].answer.upper()),
+                (True, cards[q.id].answer)
+            )
+
+    def test_spaced(self):
+        """Spaced repetition quiz tests."""
+        cards = [Flashcard('q{}'.format(i), 'a', i, i) for i in range(3)]
+        for c in cards[1:]:
+            c.timestamp = 1000000000 * 1000000
+
+        deck = mocked_deck(cards)
+        with patch.object(quiz.Deck, 'load', return_value=deck), \
+                patch.object(quiz, 'Persister'):
+            q = quiz.Quiz('filename', spaced=True)
+            questions = []
+            for question in q.run(5, quiz.QuizTypes.fill_in_the_blank):
+                questions.append(question.question)
+                question.submit('a')
+
+        # Never shown first, then the least known. Answered cards go to the
+        # back of the queue.
+        self.assertEqual(questions, ['q0', 'q1', 'q2', 'q0', 'q1'])
+        self.assertEqual(q.score(), (5, 5))
+
+    def test_rebucketing(self):
+        """Answered cards move between tiers as their statistics change."""
+        # A card one correct answer short of medium, and a medium card.
+        cards = [Flashcard('q0', 'a', 4, 4), Flashcard('q1', 'a', 6, 5)]
+        deck = mocked_deck(cards)
+        with patch.object(quiz.Deck, 'load', return_value=deck), \
+                patch.object(quiz, 'Persister'):
+            q = quiz.Quiz('filename')
+            self.assertEqual(
+                [sorted(t) for t in q._sampler.tiers()],
+                [[0], [1], []]
+            )
+
+            for question in q.run('all', quiz.QuizTypes.fill_in_the_blank):
+                question.submit('a' if question.question == 'q0' else 'b')
+
+        self.assertEqual(
+            [sorted(t) for t in q._sampler.tiers()],
+            [[1], [0], []]
+        )
+
+    def run_multiple_choice(self, correct):
+        """Run a multiple choice quiz, answering every question correctly or
+        incorrectly."""
+        deck_filename = 'filename'
+        cards = [
+            mocked_card('q{}'.format(i), 'a{}'.format(i))
+            for i in range(6)
+        ]
+        card_answers = {c.question: c.answer for c in cards}
+        deck = mocked_deck(cards)
+        deck.answers.return_value = frozenset(card_answers.values())
+        selections = 4
+
+        with patch.object(quiz.Deck, 'load', return_value=deck), \
+                patch.object(quiz, 'Persister'):
+            q = quiz.Quiz(deck_filename)
+            for question in q.run(
+                'all',
+                quiz.QuizTypes.multiple_choice,
+                selections
+            ):
+                self.assertEqual(len(question.answers), selections)
+                self.assertEqual(
+                    len(set(question.answers)),
+                    len(question.answers)
+                )
+                right = question.answers.index(card_answers[question.question])
+                result, correct_answer = question.submit(
+                    right if correct else (right + 1) % selections
+                )
+                self.assertEqual(result, correct)
+                self.assertEqual(correct_answer, right)
+
+        deck.answers.assert_called_once_with()
+        return q, cards
+
     def test_multiple_choice_correct(self):
         """Multiple choice, correct answer tests."""
+        q, cards = self.run_multiple_choice(True)
+        self.assertEqual(q.score(), (len(cards), len(cards)))
 
     def test_multiple_choice_incorrect(self):
         """Multiple choice, incorrect answer tests."""
+        q, cards = self.run_multiple_choice(False)
+        self.assertEqual(q.score(), (0, len(cards)))
 
 
 class CardComparatorsTestCase(unittest.TestCase):
@@ -102,11 +322,9 @@ class CardComparatorsTestCase(unittest.TestCase):
         card1 = mocked_card('q1', 'a')
         card2 = mocked_card('q2', 'a')
         cards = [card1, card2]
-        mocked_deck = MagicMock(spec=quiz.Deck)
-        mocked_deck.__iter__.return_value = cards
-        mocked_deck.__len__.return_value = len(cards)
+        deck = mocked_deck(cards)
 
-        with patch.object(quiz.Deck, 'load', return_value=mocked_deck):
+        with patch.object(quiz.Deck, 'load', return_value=deck):
             self.quiz = quiz.Quiz(deck_filename)
 
     def test_is_hard(self):
@@ -157,9 +375,7 @@ class DeckIteratorTestCase(unittest.TestCase):
             mocked_card('easy question', 'easy answer', 100, 100),
         ]
         self.cards = self.hard_cards + self.medium_cards + self.easy_cards
-        self.mocked_deck = MagicMock(spec=quiz.Deck)
-        self.mocked_deck.__iter__.return_value = self.cards
-        self.mocked_deck.__len__.return_value = len(self.cards)
+        self.mocked_deck = mocked_deck(self.cards)
 
     def test_sort_deck(self):
         """Quiz._sort_deck() method test."""
@@ -171,9 +387,57 @@ class DeckIteratorTestCase(unittest.TestCase):
         self.assertEqual(len(h), len(self.hard_cards))
         self.assertEqual(len(m), len(self.medium_cards))
         self.assertEqual(len(e), len(self.easy_cards))
-        self.assertEqual(frozenset(h), frozenset(self.hard_cards))
-        self.assertEqual(frozenset(m), frozenset(self.medium_cards))
-        self.assertEqual(frozenset(e), frozenset(self.easy_cards))
+        self.assertEqual(
+            frozenset(self.cards[i] for i in h),
+            frozenset(self.hard_cards)
+        )
+        self.assertEqual(
+            frozenset(self.cards[i] for i in m),
+            frozenset(self.medium_cards)
+        )
+        self.assertEqual(
+            frozenset(self.cards[i] for i in e),
+            frozenset(self.easy_cards)
+        )
+
+    @unittest.skipUnless(quiz.numpy, 'NumPy is not installed.')
+    def test_sort_stats_vectorized(self):
+        """Quiz._sort_stats_vectorized() method test."""
+        with patch.object(quiz.Deck, 'load', return_value=self.mocked_deck):
+            q = quiz.Quiz('mocked deck')
+
+        attempts = [random.randint(0, 30) for _ in range(1000)]
+        correct = [random.randint(0, a) for a in attempts]
+
+        for expected, actual in zip(
+            q._sort_stats(attempts, correct),
+            q._sort_stats_vectorized(attempts, correct)
+        ):
+            self.assertEqual(expected, list(actual))
+
+    def test_custom_tiers(self):
+        """Quiz with tiers other than hard, medium, and easy."""
+        tiers = [
+            quiz.Tier('new', 1, None, 1),
+            quiz.Tier('hard', None, 0.55, 1),
+            quiz.Tier('medium', None, 0.9, 1),
+            quiz.Tier('easy', None, None, 1),
+        ]
+        with patch.object(quiz.Deck, 'load', return_value=self.mocked_deck):
+            q = quiz.Quiz('mocked deck', tiers=tiers)
+
+        attempts = [0, 10, 10, 10, 10]
+        correct = [0, 5, 6, 9, 10]
+        expected = ([0], [1], [2, 3], [4])
+        self.assertEqual(q._sort_stats(attempts, correct), expected)
+        if quiz.numpy:
+            self.assertEqual(
+                tuple(
+                    list(t)
+                    for t in q._sort_stats_vectorized(attempts, correct)
+                ),
+                expected
+            )
 
     def test_card_generator(self):
         """Quiz._card_generator() method test."""
@@ -229,7 +493,7 @@ class DeckIteratorTestCase(unittest.TestCase):
         h = []
         m = []
         e = []
-        for c in q._deck_runner(mult * n_cards):
+        for _, c in q._deck_runner(mult * n_cards):
             if c.question.startswith('hard'):
                 h.append(c)
             elif c.question.startswith('medium'):
@@ -5,6 +5,7 @@ Licensed under the BSD 3-clause License. See LICENSE.txt or
 <http://opensource.org/licenses/BSD-3-Clause>.
 """
 import unittest
+from lib import quiz
 from lib.quiz import QuizTools
 
 
@@ -20,6 +21,36 @@ class QuizToolsTestCase(unittest.TestCase):
             QuizTools.correct_below_threshold(2, 3, 0.5)
         )
 
+    def test_sample_distractors(self):
+        for n_answers in (3, 5, 100):
+            answers = tuple('a{}'.format(i) for i in range(n_answers))
+            for k in (0, 1, 2, 3):
+                distractors = QuizTools.sample_distractors(answers, 'a1', k)
+                self.assertEqual(len(distractors), min(k, n_answers - 1))
+                self.assertEqual(len(set(distractors)), len(distractors))
+                self.assertNotIn('a1', distractors)
+                self.assertTrue(set(distractors) <= set(answers))
+
+    @unittest.skipUnless(quiz.numpy, 'NumPy is not installed.')
+    def test_correct_below_threshold_vectorized(self):
+        stats = [(0, 0, 0.0), (1, 2, 0.5), (2, 3, 0.5), (9, 10, 0.9)]
+        correct, attempts, _ = zip(*stats)
+        for threshold in (0.0, 0.5, 0.9):
+            expected = [
+                QuizTools.correct_below_threshold(c, a, threshold)
+                for c, a, _ in stats
+            ]
+            self.assertEqual(
+                list(
+                    QuizTools.correct_below_threshold_vectorized(
+                        quiz.numpy.array(correct),
+                        quiz.numpy.array(attempts),
+                        threshold
+                    )
+                ),
+                expected
+            )
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,124 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import collections
+import random
+import unittest
+from lib.sampler import AliasTable, TierSampler
+
+
+class AliasTableTestCase(unittest.TestCase):
+    """Unittests for AliasTable class."""
+    def test_distribution(self):
+        """draw() follows the weights."""
+        random.seed(42)
+        weights = [5, 0, 3, 2]
+        table = AliasTable(weights)
+        n = 100000
+        counts = collections.Counter(table.draw() for _ in range(n))
+
+        self.assertEqual(counts[1], 0)
+        for i, w in enumerate(weights):
+            self.assertAlmostEqual(counts[i] / n, w / sum(weights), delta=0.01)
+
+    def test_no_weights(self):
+        """Constructor rejects weights that are all zero."""
+        self.assertRaises(ValueError, AliasTable, [0, 0])
+
+
+class TierSamplerTestCase(unittest.TestCase):
+    """Unittests for TierSampler class."""
+    def setUp(self):
+        self.tiers = [
+            list(range(0, 4)),
+            list(range(10, 13)),
+            [],
+            list(range(20, 22)),
+        ]
+
+    @staticmethod
+    def tier_of(idx):
+        return idx // 10
+
+    def test_round_robin(self):
+        """draw() deals from the tiers in proportion to their weights."""
+        sampler = TierSampler(self.tiers, [3, 2, 5, 1])
+        cards = sampler.draw(12)
+        counts = collections.Counter(self.tier_of(c) for c in cards)
+
+        self.assertEqual(counts, {0: 6, 1: 4, 2: 2})
+        self.assertEqual(
+            [self.tier_of(c) for c in cards[:6]],
+            [0, 0, 0, 1, 1, 2]
+        )
+
+    def test_no_repeats(self):
+        """Each tier deals all its cards before repeating any."""
+        sampler = TierSampler(self.tiers, [1, 0, 0, 0])
+        cards = sampler.draw(8)
+
+        self.assertEqual(sorted(cards[:4]), list(range(0, 4)))
+        self.assertEqual(sorted(cards[4:]), list(range(0, 4)))
+
+    def test_randomize(self):
+        """draw() chooses tiers at random in proportion to their weights."""
+        random.seed(42)
+        sampler = TierSampler(self.tiers, [3, 1, 5, 0], randomize=True)
+        counts = collections.Counter(
+            self.tier_of(c) for c in sampler.draw(40000)
+        )
+
+        self.assertEqual(set(counts), {0, 1})
+        self.assertAlmostEqual(counts[0] / 40000, 0.75, delta=0.02)
+
+    def test_nothing_to_deal(self):
+        """draw() deals nothing if no tier has cards and weight."""
+        self.assertEqual(TierSampler(self.tiers, [0, 0, 1, 0]).draw(3), [])
+        self.assertEqual(TierSampler([[], []], [1, 1]).draw(3), [])
+
+    def test_move(self):
+        """move() moves cards between tiers, keeping the deal without repeats.
+        """
+        random.seed(42)
+        sampler = TierSampler(self.tiers, [1, 1, 1, 1])
+        sampler.move(1, 2)
+        sampler.move(20, 2)
+        sampler.move(21, 0)
+        sampler.move(1, 2)  # Already there.
+
+        self.assertEqual(
+            [sorted(t) for t in sampler.tiers()],
+            [[0, 2, 3, 21], [10, 11, 12], [1, 20], []]
+        )
+
+        # The emptied tier is no longer dealt, and the filled one is.
+        cards = sampler.draw(12)
+        self.assertEqual(
+            sorted(cards[0::3]),
+            [0, 2, 3, 21]
+        )
+        self.assertEqual(sorted(cards[2::3]), [1, 1, 20, 20])
+
+    def test_move_dealt(self):
+        """move() keeps the cards still to be dealt in a pass."""
+        random.seed(42)
+        for _ in range(100):
+            sampler = TierSampler([list(range(10)), []], [1, 0])
+            dealt = sampler.draw(4)
+            moved = random.randrange(10)
+            sampler.move(moved, 1)
+            rest = sampler.draw(6 if moved in dealt else 5)
+
+            self.assertNotIn(moved, rest)
+            self.assertFalse(set(dealt) & set(rest))
+            self.assertEqual(
+                set(dealt) | set(rest) | {moved},
+                set(range(10))
+            )
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
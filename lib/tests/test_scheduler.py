@@ -0,0 +1,80 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import unittest
+from lib.flashcard import Flashcard
+from lib.scheduler import Scheduler
+
+
+class SchedulerTestCase(unittest.TestCase):
+    """Unittests for Scheduler class."""
+    def setUp(self):
+        self.now = 1500000000 * 1000000
+        self.minute = 60 * 1000000
+        self.cards = [
+            Flashcard('known', 'a', 20, 20),
+            Flashcard('new', 'a'),
+            Flashcard('missed', 'a', 4, 1),
+            Flashcard('learning', 'a', 6, 5),
+        ]
+        for c in self.cards:
+            if c.n_attempts:
+                c.timestamp = self.now
+
+        self.scheduler = Scheduler(
+            [c.n_attempts for c in self.cards],
+            [c.n_correct for c in self.cards],
+            [c.timestamp for c in self.cards]
+        )
+
+    def test_due(self):
+        """due() interface tests."""
+        self.assertEqual(Scheduler.due(0, 0, None), 0)
+        self.assertEqual(Scheduler.due(1, 0, self.now), self.now)
+        self.assertLess(
+            Scheduler.due(4, 2, self.now),
+            Scheduler.due(4, 3, self.now)
+        )
+        self.assertLess(
+            Scheduler.due(10, 9, self.now),
+            Scheduler.due(9, 9, self.now)
+        )
+
+    def test_order(self):
+        """next() deals cards in due order."""
+        order = []
+        for _ in self.cards:
+            idx = self.scheduler.next()
+            order.append(idx)
+            self.cards[idx].correct()
+            self.scheduler.reschedule(idx, self.cards[idx])
+
+        # New, then least known.
+        self.assertEqual(order, [1, 2, 3, 0])
+
+    def test_reschedule(self):
+        """reschedule() moves an answered card back in the queue."""
+        idx = self.scheduler.next()
+        self.assertEqual(idx, 1)
+
+        card = self.cards[idx]
+        card.correct()
+        self.scheduler.reschedule(idx, card)
+
+        self.assertEqual(self.scheduler.next(), 2)
+
+    def test_unanswered(self):
+        """A card that was not answered keeps its place."""
+        self.assertEqual(self.scheduler.next(), 1)
+        self.assertEqual(self.scheduler.next(), 1)
+
+    def test_empty(self):
+        """next() of an empty scheduler."""
+        self.assertEqual(Scheduler([], [], []).next(), None)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,257 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import asyncio
+import os
+import tempfile
+import unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from lib.deck import Deck
+from lib.deck_cache import DeckCache
+from lib.flashcard import Flashcard
+from lib.loadgen import Client, run_load
+from lib.quiz import Quiz, QuizTypes
+from lib.server import QuizServer
+
+
+class QuizServerTestCase(unittest.TestCase):
+    """Unittests for QuizServer class."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.filename = os.path.join(self.dir.name, 'test.deck.csv')
+        deck = Deck('test deck')
+        for idx in range(3):
+            deck.add_card(Flashcard('q{}'.format(idx), 'a{}'.format(idx)))
+        deck.save(self.filename)
+
+    def serve(self, test, cache=None, **kwargs):
+        """Run test(client, port) against a server on an ephemeral port, as
+        self.quiz_server."""
+        async def run():
+            quiz_server = self.quiz_server = QuizServer(
+                self.dir.name,
+                cache,
+                **kwargs
+            )
+            s = await quiz_server.start(port=0)
+            port = s.sockets[0].getsockname()[1]
+            client = Client('127.0.0.1', port)
+            try:
+                async with s:
+                    await test(client, port)
+            finally:
+                client.close()
+                await quiz_server.close()
+
+        asyncio.run(run())
+
+    def test_session(self):
+        """A session deals questions, grades answers, and keeps score."""
+        async def test(client, port):
+            status, decks = await client.request('GET', '/decks')
+            self.assertEqual((status, decks), (200, ['test.deck.csv']))
+
+            status, state = await client.request(
+                'POST',
+                '/sessions',
+                {'deck': 'test.deck.csv', 'cards': 'all'}
+            )
+            self.assertEqual(status, 200)
+            self.assertEqual(state['name'], 'test deck')
+            session = '/sessions/{}'.format(state['session'])
+
+            questions = []
+            while state['question'] is not None:
+                question = state['question']
+                questions.append(question['question'])
+                answer = 'a' + question['question'][1:]
+                status, state = await client.request(
+                    'POST',
+                    session + '/answer',
+                    {'answer': answer}
+                )
+                self.assertEqual(status, 200)
+                self.assertTrue(state['correct'])
+                self.assertEqual(state['answer'], answer)
+
+            self.assertEqual(sorted(questions), ['q0', 'q1', 'q2'])
+            self.assertEqual(state['score'], [3, 3])
+
+            # The last answer ended the session.
+            status, _ = await client.request('GET', session)
+            self.assertEqual(status, 404)
+
+            status, state = await client.request(
+                'POST',
+                '/sessions',
+                {'deck': 'test.deck.csv', 'cards': 2}
+            )
+            session = '/sessions/{}'.format(state['session'])
+            status, state = await client.request('DELETE', session)
+            self.assertEqual((status, state['score']), (200, [0, 0]))
+            status, _ = await client.request('GET', session)
+            self.assertEqual(status, 404)
+
+        self.serve(test)
+        self.assertEqual(
+            [c.n_correct for c in Deck.load(self.filename)],
+            [1, 1, 1]
+        )
+
+    def test_sqlite_deck(self):
+        """SQLite deck files are listed and served."""
+        filename = os.path.join(self.dir.name, 'test.deck.db')
+        Deck.load(self.filename).save(filename)
+
+        async def test(client, port):
+            status, decks = await client.request('GET', '/decks')
+            self.assertEqual(
+                (status, decks),
+                (200, ['test.deck.csv', 'test.deck.db'])
+            )
+
+            status, state = await client.request(
+                'POST',
+                '/sessions',
+                {'deck': 'test.deck.db', 'cards': 'all'}
+            )
+            self.assertEqual(status, 200)
+            session = '/sessions/{}'.format(state['session'])
+            while state['question'] is not None:
+                status, state = await client.request(
+                    'POST',
+                    session + '/answer',
+                    {'answer': 'a' + state['question']['question'][1:]}
+                )
+                self.assertTrue(state['correct'])
+
+        self.serve(test)
+        self.assertEqual(
+            [c.n_correct for c in Deck.load(filename)],
+            [1, 1, 1]
+        )
+
+    def test_shared_deck(self):
+        """Sessions on a deck share one load of it."""
+        async def test(client, port):
+            clients = [Client('127.0.0.1', port) for _ in range(5)]
+            try:
+                responses = await asyncio.gather(
+                    *(
+                        c.request(
+                            'POST',
+                            '/sessions',
+                            {
+                                'deck': 'test.deck.csv',
+                                'type': QuizTypes.multiple_choice,
+                                'selections': 2
+                            }
+                        )
+                        for c in clients
+                    )
+                )
+            finally:
+                for c in clients:
+                    c.close()
+
+            self.assertEqual([status for status, _ in responses], [200] * 5)
+            self.assertEqual(
+                len(responses[0][1]['question']['answers']),
+                2
+            )
+
+        cache = DeckCache()
+        with patch.object(
+            Quiz,
+            '_sort_deck',
+            autospec=True,
+            side_effect=Quiz._sort_deck
+        ) as mock_sort_deck:
+            self.serve(test, cache)
+
+        self.assertEqual(cache.stats().misses, 1)
+        self.assertEqual(mock_sort_deck.call_count, 1)
+
+    def test_session_expiry(self):
+        """Idle sessions, and sessions over the limit, are ended."""
+        async def start(client):
+            status, state = await client.request(
+                'POST',
+                '/sessions',
+                {'deck': 'test.deck.csv'}
+            )
+            self.assertEqual(status, 200)
+            return '/sessions/{}'.format(state['session'])
+
+        async def test(client, port):
+            first = await start(client)
+            second = await start(client)
+            status, _ = await client.request('GET', first)
+            self.assertEqual(status, 200)
+
+            # The least recently used session makes way.
+            third = await start(client)
+            statuses = [
+                (await client.request('GET', s))[0]
+                for s in (first, second, third)
+            ]
+            self.assertEqual(statuses, [200, 404, 200])
+
+            self.quiz_server.session_timeout = 0.0
+            await start(client)
+            status, _ = await client.request('GET', first)
+            self.assertEqual(status, 404)
+
+        self.serve(test, max_sessions=2)
+
+    def test_errors(self):
+        """Bad requests fail with an HTTP status and an error message."""
+        async def test(client, port):
+            for method, path, body, expected in (
+                ('GET', '/nowhere', None, 404),
+                ('GET', '/sessions', None, 405),
+                ('POST', '/sessions', {'deck': '../test.deck.csv'}, 400),
+                ('POST', '/sessions', {'deck': 'none.deck.csv'}, 404),
+                (
+                    'POST',
+                    '/sessions',
+                    {'deck': 'test.deck.csv', 'type': 'essay'},
+                    400
+                ),
+                ('POST', '/sessions', [1], 400),
+                ('GET', '/sessions/unknown', None, 404),
+            ):
+                status, payload = await client.request(method, path, body)
+                self.assertEqual(status, expected, path)
+                self.assertIn('error', payload)
+
+        self.serve(test)
+
+    def test_load(self):
+        """run_load() measures sessions against the server."""
+        async def test(client, port):
+            results = await run_load(
+                '127.0.0.1',
+                port,
+                'test.deck.csv',
+                sessions=4,
+                duration=0.1,
+                cards=2
+            )
+            self.assertEqual(results['errors'], 0)
+            self.assertGreater(results['questions_per_second'], 0)
+            self.assertGreaterEqual(results['p99_ms'], results['p50_ms'])
+
+        self.serve(test)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
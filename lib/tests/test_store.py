@@ -0,0 +1,153 @@
+"""
+Copyright 2015, Andrew Lin.
+All rights reserved.
+Licensed under the BSD 3-clause License. See LICENSE.txt or
+<http://opensource.org/licenses/BSD-3-Clause>.
+"""
+import os
+import tempfile
+import unittest
+from lib.deck import Deck
+from lib.flashcard import Flashcard
+from lib.journal import Record
+from lib.persister import Persister
+from lib.store import SqliteStore
+
+
+class SqliteStoreTestCase(unittest.TestCase):
+    """Unittests for SqliteStore class, and SQLite deck files."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.filename = os.path.join(self.dir.name, 'test.deck.db')
+
+        self.deck = Deck('test deck')
+        for idx in range(4):
+            card = Flashcard('q{}'.format(idx), 'a{}'.format(idx), idx, idx)
+            self.deck.add_card(card)
+        self.deck.card(3).timestamp = 1429996343676495
+
+        self.deck.save(self.filename)
+
+    def test_round_trip(self):
+        """Decks saved to SQLite deck files load unchanged."""
+        self.assertEqual(Deck.load(self.filename), self.deck)
+        self.assertEqual(Deck.read_name(self.filename), 'test deck')
+        self.assertEqual(list(Deck.iter_file(self.filename)), list(self.deck))
+        self.assertRaises(ValueError, self.deck.save, self.filename)
+
+    def test_missing(self):
+        """Loading a missing SQLite deck file fails without creating it."""
+        filename = os.path.join(self.dir.name, 'missing.deck.db')
+        self.assertRaises(FileNotFoundError, Deck.load, filename)
+        self.assertFalse(os.path.exists(filename))
+
+    def test_convert(self):
+        """Decks convert between csv and SQLite deck files."""
+        csv_filename = os.path.join(self.dir.name, 'test.deck.csv')
+        Deck.write_file(
+            csv_filename,
+            Deck.read_name(self.filename),
+            Deck.iter_file(self.filename)
+        )
+        self.assertEqual(Deck.load(csv_filename), self.deck)
+
+    def test_correct_below(self):
+        """Partial loads select cards by their correct answers."""
+        for filename in (
+            self.filename,
+            os.path.join(self.dir.name, 'test.deck.csv')
+        ):
+            self.deck.save(filename, overwrite=True)
+            deck = Deck.load(filename, correct_below=2)
+
+            self.assertEqual(
+                [c.question for c in deck],
+                ['q0', 'q1']
+            )
+            self.assertEqual([deck.key(idx) for idx in range(2)], [0, 1])
+            self.assertRaises(ValueError, deck.save, filename, True)
+
+    def test_write(self):
+        """write() updates the answered cards in place."""
+        store = SqliteStore(self.filename)
+        store.write(
+            [
+                Record(1, 'q1', 1, 1, 1000),
+                Record(2, 'q2', 2, 0, 2000),
+                Record(3, 'wrong question', 1, 1, 3000),
+            ]
+        )
+        store.close()
+
+        self.assertEqual(
+            [
+                (c.n_attempts, c.n_correct, c.timestamp)
+                for c in Deck.load(self.filename)
+            ],
+            [
+                (0, 0, None),
+                (2, 2, 1000),
+                (4, 2, 2000),
+                (3, 3, 1429996343676495),
+            ]
+        )
+
+    def test_lazy_rows(self):
+        """Loads only read the card statistics, and rows on demand."""
+        deck = Deck.load(self.filename)
+        self.assertEqual(deck._cards, [None] * 4)
+        self.assertEqual(
+            [list(a) for a in deck.stats()],
+            [[0, 1, 2, 3], [0, 1, 2, 3]]
+        )
+        self.assertEqual(deck.timestamps(), [None] * 3 + [1429996343676495])
+        self.assertEqual(deck.card(3), self.deck.card(3))
+        self.assertEqual(deck._cards[:3], [None] * 3)
+
+    def test_save_changed_rows(self):
+        """Saving a deck over its deck file only writes the changed cards."""
+        deck = Deck.load(self.filename)
+        deck.card(1).correct()
+        deck.add_card(Flashcard('q4', 'a4'))
+
+        # An answer persisted by another quiz, to a card this deck has not
+        # changed.
+        store = SqliteStore(self.filename)
+        store.write([Record(2, 'q2', 1, 1, 1000)])
+        store.close()
+
+        deck.save(self.filename, overwrite=True)
+        self.assertEqual(deck.key(4), 4)
+        self.assertEqual(
+            [
+                (c.question, c.n_attempts, c.n_correct)
+                for c in Deck.load(self.filename)
+            ],
+            [
+                ('q0', 0, 0),
+                ('q1', 2, 2),
+                ('q2', 3, 3),
+                ('q3', 3, 3),
+                ('q4', 0, 0),
+            ]
+        )
+
+    def test_persister(self):
+        """Answers to SQLite decks are persisted without a journal."""
+        deck = Deck.load(self.filename, correct_below=3)
+        persister = Persister(self.filename)
+        card = deck.card(2)
+        card.correct()
+        persister.record(deck.key(2), card, True)
+        persister.close()
+
+        self.assertEqual(os.listdir(self.dir.name), ['test.deck.db'])
+        self.assertEqual(
+            Deck.load(self.filename, correct_below=4).card(2),
+            card
+        )
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)